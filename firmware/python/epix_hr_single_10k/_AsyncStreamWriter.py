@@ -0,0 +1,170 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'epix-hr-single-10k'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'epix-hr-single-10k', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+# Asynchronous replacement of pyrogue.utilities.fileio.StreamWriter for long
+# runs.
+#
+#   self.add(AsyncStreamWriter(name='dataWriter', maxFileSize=4*1024**3))
+#   pyrogue.streamConnect(self.dmaStreams[lane], self.dataWriter.getChannel(0x10*lane + 0x01))
+#
+# The stream threads only copy the frames into large buffers, the files are
+# written, opened and closed by a background thread (see
+# ePixViewer.segmentWriter), so open.set(), close and a new dataFile never
+# stall the streams. Setting dataFile while the writer is open switches to
+# the new file at the next frame. The run is split in segments at
+# maxFileSize bytes or maxFileTime seconds, listed in <dataFile>.manifest.json.
+#-----------------------------------------------------------------------------
+import pyrogue as pr
+import rogue.interfaces.stream as ris
+
+try :
+    from ePixViewer.segmentWriter import SegmentedFileWriter
+except ImportError:
+    # the ePixViewer of software/python is needed for the segmented writer
+    SegmentedFileWriter = None
+
+class _AsyncWriterChannel(ris.Slave):
+    """Input of one channel of the asynchronous writer."""
+
+    def __init__(self, writer, channel):
+        ris.Slave.__init__(self)
+        self._writer  = writer
+        self._channel = channel
+
+    def _acceptFrame(self, frame):
+        self._writer._writeFrame(self._channel, frame)
+
+
+class AsyncStreamWriter(pr.Device):
+    """Writes the frames of its channels to segmented .dat files from a
+    background thread. bufferSize is the size of a write buffer, at most
+    maxBuffers buffers wait for the disk (frames are dropped and counted
+    beyond). maxFileSize (bytes) and maxFileTime (seconds), 0 for no limit,
+    can be changed at run time.
+    """
+    def __init__(self, bufferSize=16*1024*1024, numBuffers=4, maxBuffers=64, maxFileSize=0, maxFileTime=0, **kwargs):
+        super().__init__(**kwargs)
+
+        if SegmentedFileWriter is None:
+            raise ImportError("ePixViewer.segmentWriter not found, add software/python to the library path")
+
+        self._writer   = SegmentedFileWriter(bufferSize=bufferSize, numBuffers=numBuffers, maxBuffers=maxBuffers,
+                                             maxFileSize=maxFileSize, maxFileTime=maxFileTime)
+        self._channels = {}
+
+        self.add(pr.LocalVariable(
+            name        = 'dataFile',
+            description = 'Data file name, a new name switches files while open',
+            mode        = 'RW',
+            value       = '',
+            localSet    = lambda value: self._setDataFile(value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'open',
+            description = 'Data file open state',
+            mode        = 'RW',
+            value       = False,
+            localSet    = lambda value: self._setOpen(value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'maxFileSize',
+            description = 'Size of a segment, 0 for no limit',
+            mode        = 'RW',
+            value       = maxFileSize,
+            units       = 'bytes',
+            localSet    = lambda value: setattr(self._writer, 'maxFileSize', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'maxFileTime',
+            description = 'Duration of a segment, 0 for no limit',
+            mode        = 'RW',
+            value       = maxFileTime,
+            units       = 's',
+            localSet    = lambda value: setattr(self._writer, 'maxFileTime', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'frameCount',
+            description = 'Number of frames written',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._writer.numRecords,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'totalSize',
+            description = 'Number of bytes written',
+            mode        = 'RO',
+            value       = 0,
+            units       = 'bytes',
+            pollInterval= 1,
+            localGet    = lambda: self._writer.numBytes,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'segmentCount',
+            description = 'Number of segments opened',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._writer.segmentCount,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'dropCount',
+            description = 'Frames dropped, writer closed or disk too slow',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._writer.droppedRecords,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'extraBuffers',
+            description = 'Buffers allocated because all the others were waiting for the disk',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._writer.extraBuffers,
+        ))
+
+        @self.command(description='Starts a new segment at the next frame')
+        def rollover():
+            self._writer.rollover()
+
+    def getChannel(self, channel):
+        """Returns the stream slave writing its frames as channel."""
+        if channel not in self._channels:
+            self._channels[channel] = _AsyncWriterChannel(self, channel)
+        return self._channels[channel]
+
+    def _setDataFile(self, value):
+        if self._writer.isOpen and value:
+            self._writer.open(value)
+
+    def _setOpen(self, value):
+        if value:
+            self._writer.open(self.dataFile.value())
+        else:
+            self._writer.close()
+
+    def _writeFrame(self, channel, frame):
+        with frame.lock():
+            payload = bytearray(frame.getPayload())
+            frame.read(payload, 0)
+            flags = ((channel & 0xFF) << 24) | ((frame.getError() & 0xFF) << 16) | (frame.getFlags() & 0xFFFF)
+        self._writer.addRecord(flags, payload)
+
+    def _stop(self):
+        self._writer.stop()
+        super()._stop()
@@ -0,0 +1,248 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'epix-hr-single-10k'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'epix-hr-single-10k', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+# Compressed replacement of pyrogue.utilities.fileio.StreamWriter.
+#
+# The streams are connected to the channels of the writer as for the rogue
+# file writer:
+#
+#   self.add(CompressedStreamWriter(name='dataWriter', codec='zlib'))
+#   pyrogue.streamConnect(self.dmaStreams[lane], self.dataWriter.getChannel(0x10*lane + 0x01))
+#
+# and the variables used by the scan routines (dataFile, open) have the same
+# names. The records are the rogue file records, grouped in blocks that are
+# compressed by a pool of threads and indexed, see ePixViewer.compressedFile
+# for the format and the reader (CompressedDataFile). The stream threads
+# never wait for the compression: when it falls behind, the blocks that do
+# not fit are dropped and counted in dropCount (the first drop of a file is
+# logged). The default level is 1, zlib at its default level 6 compresses
+# about 32 MB/s per thread. A write error is counted in errorCount and
+# closes the file.
+#-----------------------------------------------------------------------------
+import threading
+
+import pyrogue as pr
+import rogue.interfaces.stream as ris
+
+try :
+    from ePixViewer.compressedFile import CompressedFileWriter, CODECS
+except ImportError:
+    # the ePixViewer of software/python is needed to write compressed files
+    CompressedFileWriter = None
+    CODECS = {}
+
+class _CompressedWriterChannel(ris.Slave):
+    """Input of one channel of the compressed writer."""
+
+    def __init__(self, writer, channel):
+        ris.Slave.__init__(self)
+        self._writer  = writer
+        self._channel = channel
+
+    def _acceptFrame(self, frame):
+        self._writer._writeFrame(self._channel, frame)
+
+
+class CompressedStreamWriter(pr.Device):
+    """Writes the frames of its channels to a compressed data file.
+
+    codec is one of ePixViewer.compressedFile.CODECS (zlib, lzma, none or a
+    registered codec), level the codec level (1, fast zlib, by default, -1
+    for the codec default),
+    shuffle splits the low and high bytes of the uint16 words before
+    compression, blockSize is the raw size of a compressed block and
+    threads the number of compression threads. The settings are taken
+    when the file is opened.
+    """
+    def __init__(self, codec='zlib', level=1, shuffle=True, blockSize=4*1024*1024, threads=4, **kwargs):
+        super().__init__(**kwargs)
+
+        if CompressedFileWriter is None:
+            raise ImportError("ePixViewer.compressedFile not found, add software/python to the library path")
+
+        self._lock     = threading.Lock()
+        self._writer   = None
+        self._channels = {}
+        self._dropLogged = False
+        self._errorCount = 0
+        self._settings = {'codec': codec, 'level': level, 'shuffle': shuffle, 'blockSize': blockSize, 'threads': threads}
+
+        self.add(pr.LocalVariable(
+            name        = 'dataFile',
+            description = 'Data file name',
+            mode        = 'RW',
+            value       = '',
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'open',
+            description = 'Data file open state',
+            mode        = 'RW',
+            value       = False,
+            localSet    = lambda value: self._setOpen(value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'codec',
+            description = 'Compression codec',
+            mode        = 'RW',
+            value       = codec,
+            enum        = {name: name for name in CODECS},
+            localSet    = lambda value: self._settings.__setitem__('codec', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'level',
+            description = 'Compression level, -1 for the codec default',
+            mode        = 'RW',
+            value       = level,
+            localSet    = lambda value: self._settings.__setitem__('level', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'shuffle',
+            description = 'Split the low and high bytes of the 16 bit words before compression',
+            mode        = 'RW',
+            value       = shuffle,
+            localSet    = lambda value: self._settings.__setitem__('shuffle', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'blockSize',
+            description = 'Raw size of a compressed block',
+            mode        = 'RW',
+            value       = blockSize,
+            units       = 'bytes',
+            localSet    = lambda value: self._settings.__setitem__('blockSize', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'threads',
+            description = 'Number of compression threads',
+            mode        = 'RW',
+            value       = threads,
+            localSet    = lambda value: self._settings.__setitem__('threads', max(1, value)),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'frameCount',
+            description = 'Number of frames written to the current file',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: 0 if self._writer is None else self._writer.numRecords,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'fileSize',
+            description = 'Compressed bytes written to the current file',
+            mode        = 'RO',
+            value       = 0,
+            units       = 'bytes',
+            pollInterval= 1,
+            localGet    = lambda: 0 if self._writer is None else self._writer.writtenBytes,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'dropCount',
+            description = 'Frames dropped because the compression did not keep up',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: 0 if self._writer is None else self._writer.droppedRecords,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'errorCount',
+            description = 'Write errors of the current file, the file is closed on the first one',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._errorCount,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'compressionRatio',
+            description = 'Raw bytes over compressed bytes of the current file',
+            mode        = 'RO',
+            value       = 0.0,
+            pollInterval= 1,
+            localGet    = lambda: 0.0 if self._writer is None else self._writer.compressionRatio(),
+        ))
+
+    def getChannel(self, channel):
+        """Returns the stream slave writing its frames as channel."""
+        if channel not in self._channels:
+            self._channels[channel] = _CompressedWriterChannel(self, channel)
+        return self._channels[channel]
+
+    def _setOpen(self, value):
+        if value:
+            self._openFile()
+        else:
+            self._closeFile()
+
+    def _openFile(self):
+        self._closeFile()
+        level = self._settings['level']
+        writer = CompressedFileWriter(self.dataFile.value(),
+                                      codec     = self._settings['codec'],
+                                      level     = None if level < 0 else level,
+                                      shuffle   = self._settings['shuffle'],
+                                      blockSize = self._settings['blockSize'],
+                                      threads   = self._settings['threads'],
+                                      blocking  = False)
+        with self._lock:
+            self._writer = writer
+            self._dropLogged = False
+            self._errorCount = 0
+
+    def _closeFile(self):
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        # the pending blocks are written outside the lock, new frames are dropped
+        if writer is not None:
+            writer.close()
+
+    def _failFile(self, error):
+        """closes the file after a write error, called from a stream thread"""
+        self._log.error('Closing {} after a write error: {}'.format(self.dataFile.value(), error))
+        try:
+            self._closeFile()
+        except Exception:
+            # the error raised again by close, already reported
+            pass
+        self.open.set(False)
+
+    def _writeFrame(self, channel, frame):
+        with frame.lock():
+            payload = bytearray(frame.getPayload())
+            frame.read(payload, 0)
+            flags = ((channel & 0xFF) << 24) | ((frame.getError() & 0xFF) << 16) | (frame.getFlags() & 0xFFFF)
+        with self._lock:
+            if self._writer is None:
+                return
+            try:
+                written = self._writer.addRecord(flags, payload)
+                error = None
+            except Exception as e:
+                # the stream thread must not raise, the file is closed below
+                written = True
+                error = e
+                self._errorCount += 1
+            if not written and not self._dropLogged:
+                self._dropLogged = True
+                self._log.warning('Compression of {} does not keep up, dropping blocks (see dropCount)'.format(self.dataFile.value()))
+        if error is not None:
+            self._failFile(error)
+
+    def _stop(self):
+        self._closeFile()
+        super()._stop()
@@ -0,0 +1,311 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'epix-hr-single-10k'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'epix-hr-single-10k', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+# Software event builder aligning the per ASIC (per lane) data streams.
+#
+# Each lane is connected to one of the builder inputs (after the batcher
+# splitter). Camera frames are placed in an event slot keyed either by the
+# acquisition number found in the camera header (DW1) or by the pulse id
+# of the timing sub frame that precedes the camera frame in the batch.
+# Once every lane has contributed to a slot the event is sent downstream,
+# one frame per lane, on the matching builder output, in lane order.
+#
+# builder.lane[n] : rogue stream slave, input of lane n
+# builder.out[n]  : rogue stream master, output of lane n
+#
+# Channels of the batcher sub frames of a lane (LCLS-II timing firmware),
+# used by the Root, the DAQ scripts and the viewer (VIEW_DATA_CHANNEL_ID of
+# setDataDisplayParameters(2, ...)):
+#   LCLSII_TIMING_CHANNEL (0) : timing event header, pulse id in the first 8 bytes
+#   LCLSII_DATA_CHANNEL   (2) : camera data
+# Only the camera data frames are sent downstream.
+#-----------------------------------------------------------------------------
+import threading
+
+import pyrogue as pr
+import rogue.interfaces.stream as ris
+
+LCLSII_TIMING_CHANNEL = 0
+LCLSII_DATA_CHANNEL   = 2
+
+class _EventBuilderInput(ris.Slave):
+    """Input port of the event builder for a single lane."""
+
+    def __init__(self, builder, lane):
+        ris.Slave.__init__(self)
+        self._builder = builder
+        self._lane    = lane
+        # preallocated header buffer, the key is read from here
+        self._header  = bytearray(8)
+        self._pulseId = None
+
+    def _acceptFrame(self, frame):
+        self._builder._laneFrame(self, frame)
+
+
+class EventBuilder(pr.Device):
+    """Collects the frames of numLanes ASIC streams into events.
+
+    keyMode is 'acqNum' to align on the camera header acquisition number or
+    'pulseId' to align on the LCLS-II timing header. dataChannel and
+    timingChannel select the batcher sub frames (None accepts any channel
+    as camera data). Frames from other channels are ignored.
+
+    Events are held in a pool of depth slots allocated once. When an event
+    completes every older pending event can no longer complete (streams are
+    in order) and is released as incomplete; frames arriving for an already
+    released event are counted as late. Incomplete events are forwarded only
+    if sendIncomplete is set.
+    """
+    def __init__(self,
+                 numLanes       = 3,
+                 depth          = 8,
+                 keyMode        = 'acqNum',
+                 dataChannel    = None,
+                 timingChannel  = LCLSII_TIMING_CHANNEL,
+                 sendIncomplete = False,
+                 **kwargs):
+        super().__init__(**kwargs)
+
+        if keyMode not in ('acqNum', 'pulseId'):
+            raise ValueError("Invalid keyMode (%s)" % (keyMode))
+
+        self._numLanes      = numLanes
+        self._depth         = depth
+        self._keyMode       = keyMode
+        self._dataChannel   = dataChannel
+        self._timingChannel = timingChannel
+        # acqNum is 32 bits, pulseId is 56 bits. Keys are compared modulo
+        # this mask so that the acquisition counter can wrap around.
+        self._keyMask       = 0xFFFFFFFF if keyMode == 'acqNum' else 0xFFFFFFFFFFFFFF
+        self._allLanes      = (1 << numLanes) - 1
+        self._lock          = threading.Lock()
+
+        self.lane = [_EventBuilderInput(self, lane) for lane in range(numLanes)]
+        self.out  = [ris.Master() for lane in range(numLanes)]
+
+        # slot pool
+        self._slotUsed   = [False] * depth
+        self._slotKey    = [0] * depth
+        self._slotMask   = [0] * depth
+        self._slotFrames = [[None] * numLanes for slot in range(depth)]
+        self._lastKey    = None
+
+        # counters
+        self._completeCount   = 0
+        self._incompleteCount = 0
+        self._overflowCount   = 0
+        self._laneFrames      = [0] * numLanes
+        self._laneLate        = [0] * numLanes
+        self._laneMissing     = [0] * numLanes
+        self._laneDuplicate   = [0] * numLanes
+
+        self.add(pr.LocalVariable(
+            name        = 'SendIncomplete',
+            description = 'Forward events missing one or more lanes',
+            mode        = 'RW',
+            value       = sendIncomplete,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'CompleteCount',
+            description = 'Number of complete events sent downstream',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._completeCount,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'IncompleteCount',
+            description = 'Number of events released with missing lanes',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._incompleteCount,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'OverflowCount',
+            description = 'Number of events released because the slot pool was full',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._overflowCount,
+        ))
+
+        for lane in range(numLanes):
+            self.add(pr.LocalVariable(
+                name        = f'FrameCount[{lane}]',
+                description = 'Number of camera frames received on the lane',
+                mode        = 'RO',
+                value       = 0,
+                pollInterval= 1,
+                localGet    = lambda lane=lane: self._laneFrames[lane],
+            ))
+            self.add(pr.LocalVariable(
+                name        = f'LateCount[{lane}]',
+                description = 'Number of frames received after their event was released',
+                mode        = 'RO',
+                value       = 0,
+                pollInterval= 1,
+                localGet    = lambda lane=lane: self._laneLate[lane],
+            ))
+            self.add(pr.LocalVariable(
+                name        = f'MissingCount[{lane}]',
+                description = 'Number of released events without a frame from the lane',
+                mode        = 'RO',
+                value       = 0,
+                pollInterval= 1,
+                localGet    = lambda lane=lane: self._laneMissing[lane],
+            ))
+            self.add(pr.LocalVariable(
+                name        = f'DuplicateCount[{lane}]',
+                description = 'Number of frames dropped because the lane already filled the event',
+                mode        = 'RO',
+                value       = 0,
+                pollInterval= 1,
+                localGet    = lambda lane=lane: self._laneDuplicate[lane],
+            ))
+
+        @self.command(description='Clears the counters and drops all pending events')
+        def CountReset():
+            with self._lock:
+                for slot in range(self._depth):
+                    self._freeSlot(slot)
+                self._lastKey         = None
+                self._completeCount   = 0
+                self._incompleteCount = 0
+                self._overflowCount   = 0
+                for lane in range(self._numLanes):
+                    self._laneFrames[lane]    = 0
+                    self._laneLate[lane]      = 0
+                    self._laneMissing[lane]   = 0
+                    self._laneDuplicate[lane] = 0
+                    self.lane[lane]._pulseId  = None
+
+    def _older(self, a, b):
+        """True if key a was taken before key b (modulo the key width)."""
+        diff = (b - a) & self._keyMask
+        return diff != 0 and diff <= (self._keyMask >> 1)
+
+    def _frameKey(self, port, frame):
+        """Returns the event key of a frame, None if it is not camera data."""
+        channel = frame.getChannel()
+
+        if self._keyMode == 'pulseId' and channel == self._timingChannel:
+            if frame.getPayload() >= 8:
+                frame.read(port._header, 0)
+                port._pulseId = int.from_bytes(port._header, 'little') & self._keyMask
+            return None
+
+        if self._dataChannel is not None and channel != self._dataChannel:
+            return None
+
+        if self._keyMode == 'pulseId':
+            key = port._pulseId
+            port._pulseId = None
+            return key
+
+        if frame.getPayload() < 8:
+            return None
+        frame.read(port._header, 0)
+        return int.from_bytes(port._header[4:8], 'little')
+
+    def _laneFrame(self, port, frame):
+        lane = port._lane
+        with frame.lock():
+            key = self._frameKey(port, frame)
+        if key is None:
+            return
+
+        with self._lock:
+            self._laneFrames[lane] += 1
+
+            if self._lastKey is not None and not self._older(self._lastKey, key):
+                self._laneLate[lane] += 1
+                return
+
+            slot = self._findSlot(key)
+            if slot is None:
+                slot = self._allocSlot(key)
+
+            if self._slotMask[slot] & (1 << lane):
+                self._laneDuplicate[lane] += 1
+                return
+
+            self._slotFrames[slot][lane] = frame
+            self._slotMask[slot] |= (1 << lane)
+
+            if self._slotMask[slot] == self._allLanes:
+                # every pending event older than this one is lost,
+                # release them oldest first to keep the output in order
+                other = self._oldestSlot()
+                while other != slot:
+                    self._releaseSlot(other)
+                    other = self._oldestSlot()
+                self._releaseSlot(slot)
+
+    def _findSlot(self, key):
+        for slot in range(self._depth):
+            if self._slotUsed[slot] and self._slotKey[slot] == key:
+                return slot
+        return None
+
+    def _oldestSlot(self):
+        oldest = None
+        for slot in range(self._depth):
+            if self._slotUsed[slot] and (oldest is None or self._older(self._slotKey[slot], self._slotKey[oldest])):
+                oldest = slot
+        return oldest
+
+    def _allocSlot(self, key):
+        for slot in range(self._depth):
+            if not self._slotUsed[slot]:
+                break
+        else:
+            # pool is full, give up on the oldest pending event
+            self._overflowCount += 1
+            slot = self._oldestSlot()
+            self._releaseSlot(slot)
+
+        self._slotUsed[slot] = True
+        self._slotKey[slot]  = key
+        self._slotMask[slot] = 0
+        return slot
+
+    def _releaseSlot(self, slot):
+        """Sends (or drops) the event held in slot and returns it to the pool."""
+        mask     = self._slotMask[slot]
+        complete = (mask == self._allLanes)
+
+        if complete:
+            self._completeCount += 1
+        else:
+            self._incompleteCount += 1
+            for lane in range(self._numLanes):
+                if not mask & (1 << lane):
+                    self._laneMissing[lane] += 1
+
+        if complete or self.SendIncomplete.value():
+            frames = self._slotFrames[slot]
+            for lane in range(self._numLanes):
+                if frames[lane] is not None:
+                    self.out[lane]._sendFrame(frames[lane])
+
+        if self._lastKey is None or self._older(self._lastKey, self._slotKey[slot]):
+            self._lastKey = self._slotKey[slot]
+        self._freeSlot(slot)
+
+    def _freeSlot(self, slot):
+        frames = self._slotFrames[slot]
+        for lane in range(self._numLanes):
+            frames[lane] = None
+        self._slotUsed[slot] = False
+        self._slotMask[slot] = 0
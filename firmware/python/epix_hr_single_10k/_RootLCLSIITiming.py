@@ -11,6 +11,10 @@ import surf.axi
 import surf.protocols.ssi
 import epix_hr_single_10k as epixHrRoot
 import epix_hr_core as epixHrCore
+from epix_hr_single_10k._EventBuilder import EventBuilder, LCLSII_DATA_CHANNEL
+from epix_hr_single_10k._StreamFanout import StreamFanout
+from epix_hr_single_10k._CompressedStreamWriter import CompressedStreamWriter
+from epix_hr_single_10k._AsyncStreamWriter import AsyncStreamWriter
 
 
 import subprocess
@@ -41,7 +45,14 @@ class Root(pr.Root):
                  zmqSrvEn = True,  # Flag to include the ZMQ server
                  pollEn   = True,  # Enable automatic polling registers
                  justCtrl = False, # Enable if you only require Root for accessing AXI registers (no data)
+                 displayPeriod = 0.1, # Minimum time between frames sent to the data receivers
+                 eventBuilder = False, # Align the lanes by acquisition number before the data receivers
+                 compressData = None,  # Codec of the compressed file writer (None for the rogue StreamWriter)
+                 asyncWriter  = False, # Buffered writer with segment rollover (maxFileSize/maxFileTime) and manifest
                  **kwargs):
+        if compressData is not None and asyncWriter:
+            raise ValueError("compressData and asyncWriter select different data writers, set only one")
+
         super().__init__(name='ePixHr10kT',description='ePixHrGen1 board', **kwargs)
 
         self.top_level = top_level
@@ -51,6 +62,8 @@ class Root(pr.Root):
         self._tcpPort = simPort
         self._pollEn = pollEn
         self._justCtrl = justCtrl 
+        self._eventBuilder = eventBuilder
+        self._displayPeriod = displayPeriod
 
         print("Simulation mode :", self._sim)
         print("justCtrl mode :", self._justCtrl)
@@ -67,8 +80,10 @@ class Root(pr.Root):
             # Create arrays to be filled
             self.dmaStreams     = [None for lane in range(3)]
             self.unbatchers     = [rogue.protocols.batcher.SplitterV1() for lane in range(3)]
-            self.dataFilter     = [rogue.interfaces.stream.Filter(False, 2) for dataCh in range(3)]
-            self.rate           = [rogue.interfaces.stream.RateDrop(True, 0.1) for lane in range(3)]
+            self.fanout         = [StreamFanout(name=f'Fanout{lane}', expand=False) for lane in range(3)]
+            self.add(self.fanout)
+            if self._eventBuilder:
+                self.add(EventBuilder(name='EventBuilder', numLanes=3, keyMode='acqNum', dataChannel=LCLSII_DATA_CHANNEL))
 
         self.dmaCtrlStreams = [None for lane in range(3)]
 
@@ -79,7 +94,7 @@ class Root(pr.Root):
                 for lane in range(3):
                     self.dmaStreams[lane] = rogue.hardware.axi.AxiStreamDma(self._dev,(0x100*lane)+1,1)
                     self.add(ePixHrDuo10kT.DataReceiverEpixHrDuo10kT(name = f"DataReceiver{lane}"))
-                    self.dmaStreams[lane] >> self.rate[lane] >> self.unbatchers[lane] >>  self.dataFilter[lane] >> getattr(self, f"DataReceiver{lane}")
+                    self._connectLane(lane)
 
             # connect
             self.dmaCtrlStreams[0] = rogue.hardware.axi.AxiStreamDma(self._dev,(0x100*0)+0,1)# Registers  
@@ -90,7 +105,7 @@ class Root(pr.Root):
                 for lane in range(3):
                     self.dmaStreams[lane] = rogue.interfaces.stream.TcpClient('localhost',self._tcpPort+(34*lane)+2*1)
                     self.add(ePixHrDuo10kT.DataReceiverEpixHrDuo10kT(name = f"DataReceiver{lane}"))
-                    self.dmaStreams[lane] >> self.rate[lane] >> self.unbatchers[lane] >>  self.dataFilter[lane] >> getattr(self, f"DataReceiver{lane}")
+                    self._connectLane(lane)
 
             # connect
             self.dmaCtrlStreams[0] = rogue.interfaces.stream.TcpClient('localhost',self._tcpPort+(34*0)+2*0)# Registers  
@@ -106,7 +121,12 @@ class Root(pr.Root):
 
         
         # Add data stream to file as channel 1 File writer
-        self.add(pyrogue.utilities.fileio.StreamWriter(name='dataWriter'))
+        if compressData is not None:
+            self.add(CompressedStreamWriter(name='dataWriter', codec=compressData))
+        elif asyncWriter:
+            self.add(AsyncStreamWriter(name='dataWriter'))
+        else:
+            self.add(pyrogue.utilities.fileio.StreamWriter(name='dataWriter'))
         if (self._justCtrl == False) :        
             for lane in range(3):
                 pyrogue.streamConnect(self.dmaStreams[lane], self.dataWriter.getChannel(0x10*lane + 0x01))
@@ -139,6 +159,18 @@ class Root(pr.Root):
             subprocess.Popen(["python", self.top_level+"/../firmware/submodules/ePixViewer/python/ePixViewer/runLiveDisplay.py", "--dataReceiver", "rogue://0/root.DataReceiver1", "image", "--title", "DataReceiver1",  "--sizeX", "384", "--serverList","localhost:{}".format(self.zmqServer.port()) ], shell=False)
 
 
+    def _connectLane(self, lane):
+        # The stream is unbatched once and shared through the fan out, each
+        # consumer sets its own rate (Fanout{lane}.<consumer>.Mode/Period/Nth).
+        # The event builder needs every acquisition so it goes before the fan out.
+        if self._eventBuilder:
+            self.dmaStreams[lane] >> self.unbatchers[lane] >> self.EventBuilder.lane[lane]
+            self.EventBuilder.out[lane] >> self.fanout[lane].input
+        else:
+            self.dmaStreams[lane] >> self.unbatchers[lane] >> self.fanout[lane].input
+        self.fanout[lane].addConsumer('DataReceiver', mode='Period', period=self._displayPeriod, channel=LCLSII_DATA_CHANNEL) >> getattr(self, f"DataReceiver{lane}")
+
+
 def start (self,**kwargs):
         super(Root, self).start(**kwargs)
 
@@ -0,0 +1,162 @@
+#-----------------------------------------------------------------------------
+# This file is part of the 'epix-hr-single-10k'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'epix-hr-single-10k', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+# Stream fan out with a per consumer subscription rate.
+#
+# The stream is connected once to fanout.input (typically after the batcher
+# splitter) and every consumer gets its own master port:
+#
+#   self.unbatchers[lane] >> self.fanout.input
+#   self.fanout.addConsumer('Display', mode='Period', period=0.2) >> viewer
+#   self.fanout.addConsumer('Monitor', mode='Nth', nth=100)       >> monitor
+#
+# Each consumer is a sub device whose Mode, Period, Nth and Channel can be
+# changed at run time. Frames are not copied, all consumers share them.
+#-----------------------------------------------------------------------------
+import threading
+import time
+
+import pyrogue as pr
+import rogue.interfaces.stream as ris
+
+class _StreamFanoutInput(ris.Slave):
+
+    def __init__(self, fanout):
+        ris.Slave.__init__(self)
+        self._fanout = fanout
+
+    def _acceptFrame(self, frame):
+        channel = frame.getChannel()
+        for consumer in self._fanout._consumers:
+            consumer._offer(frame, channel)
+
+
+class StreamFanoutConsumer(pr.Device):
+    """One subscriber of a StreamFanout.
+
+    Mode 'All' forwards every frame, 'Period' at most one frame every Period
+    seconds and 'Nth' one frame out of Nth. Channel selects the frame channel
+    (-1 for any channel), frames of other channels are not counted. Disabled
+    consumers get nothing.
+    """
+    def __init__(self, mode='All', period=0.1, nth=1, channel=-1, **kwargs):
+        super().__init__(**kwargs)
+
+        self.port = ris.Master()
+
+        self._lock     = threading.Lock()
+        self._mode     = mode
+        self._period   = period
+        self._nth      = nth
+        self._channel  = channel
+        self._lastTime = 0.0
+        self._count    = 0
+        self._frames   = 0
+        self._dropped  = 0
+
+        self.add(pr.LocalVariable(
+            name        = 'Mode',
+            description = 'Subscription policy',
+            mode        = 'RW',
+            value       = mode,
+            enum        = {'All':'All', 'Period':'Period', 'Nth':'Nth'},
+            localSet    = lambda value: setattr(self, '_mode', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'Period',
+            description = 'Minimum time between frames in Period mode',
+            mode        = 'RW',
+            value       = period,
+            units       = 's',
+            localSet    = lambda value: setattr(self, '_period', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'Nth',
+            description = 'Forward one frame out of Nth in Nth mode',
+            mode        = 'RW',
+            value       = nth,
+            localSet    = lambda value: setattr(self, '_nth', max(1, value)),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'Channel',
+            description = 'Frame channel forwarded to the consumer, -1 for all',
+            mode        = 'RW',
+            value       = channel,
+            localSet    = lambda value: setattr(self, '_channel', value),
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'FrameCount',
+            description = 'Number of frames forwarded',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._frames,
+        ))
+
+        self.add(pr.LocalVariable(
+            name        = 'DropCount',
+            description = 'Number of frames skipped by the subscription policy',
+            mode        = 'RO',
+            value       = 0,
+            pollInterval= 1,
+            localGet    = lambda: self._dropped,
+        ))
+
+        @self.command(description='Clears the frame counters')
+        def CountReset():
+            with self._lock:
+                self._frames  = 0
+                self._dropped = 0
+
+    def _offer(self, frame, channel):
+        if self._channel >= 0 and channel != self._channel:
+            return
+
+        # the counters are shared by the stream threads of the fan out
+        with self._lock:
+            if not self.enable.value():
+                send = False
+            elif self._mode == 'Period':
+                now = time.monotonic()
+                send = (now - self._lastTime) >= self._period
+                if send:
+                    self._lastTime = now
+            elif self._mode == 'Nth':
+                send = (self._count % self._nth) == 0
+                self._count += 1
+            else:
+                send = True
+            if send:
+                self._frames += 1
+            else:
+                self._dropped += 1
+
+        # sent outside the lock, the consumer may be slow
+        if send:
+            self.port._sendFrame(frame)
+
+
+class StreamFanout(pr.Device):
+    """Shares one decoded stream between several consumers, each with its
+    own subscription rate (see StreamFanoutConsumer)."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.input      = _StreamFanoutInput(self)
+        self._consumers = []
+
+    def addConsumer(self, name, mode='All', period=0.1, nth=1, channel=-1, **kwargs):
+        """Adds a consumer sub device and returns its stream master."""
+        consumer = StreamFanoutConsumer(name=name, mode=mode, period=period, nth=nth, channel=channel, **kwargs)
+        self.add(consumer)
+        self._consumers.append(consumer)
+        return consumer.port
@@ -19,3 +19,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 from epix_hr_single_10k._RootLCLSIITiming     import *
+from epix_hr_single_10k._EventBuilder         import *
+from epix_hr_single_10k._StreamFanout         import *
+from epix_hr_single_10k._CompressedStreamWriter import *
+from epix_hr_single_10k._AsyncStreamWriter     import *
@@ -173,6 +173,13 @@ class EpixHR10kT(pr.Device):
             value       = False,
         ))
 
+        self.add(pr.LocalVariable(
+            name        = 'InitAsicRoutine',
+            description = 'Routine of the last InitASIC command, 0 if none. Set once the yml files are loaded',
+            mode        = 'RO',
+            value       = 0,
+        ))
+
         @self.command(description  = 'Stops the triggers and blows off data in the pipeline')
         def StopRun():
             print (f'{self.path}.StopRun() executed')
@@ -440,6 +447,7 @@ class EpixHR10kT(pr.Device):
         
         if arguments[0] != 0:
             self.fnInitAsicScript(dev,cmd,arg)
+            self.InitAsicRoutine.set(int(arguments[0]))
 
     def fnInitAsicScript(self, dev,cmd,arg):
         """SetTestBitmap command function"""       
@@ -70,6 +70,8 @@ class Camera():
     sensorWidth = 0
     sensorHeight = 0
     pixelDepth = 0
+    _rowOrder = None
+    _rowOrderKey = None
     availableCameras = {  'ePix100a':  EPIX100A, 'ePix100p' : EPIX100P, 'Tixel48x48' : TIXEL48X48, 'ePix10ka' : EPIX10KA,  'Cpix2' : CPIX2, 'ePixM32Array' : EPIXM32, 'HrAdc32x32': HRADC32x32, 'cryo64xN':  CRYO64XN, 'ePixHrePixM' : EPIXMNX64, 'ePixHr10kT': EPIXHR10kT, 'ePixHr10kTBatcher': EPIXHR10KTBATCHER }
     
 
@@ -910,63 +912,56 @@ class Camera():
     # define all camera specific descrabler functions
     ##########################################################
 
-    def _descrambleEPix100pImage(self, rawData):
-        """performs the ePix100p image descrambling"""
-        
-        #removes header before displying the image
-        for j in range(0,32):
-            rawData.pop(0)
-        
-        #get the first superline
-        imgBot = rawData[(0*self._superRowSizeInBytes):(1*self._superRowSizeInBytes)] 
-        imgTop = rawData[(1*self._superRowSizeInBytes):(2*self._superRowSizeInBytes)] 
-        for j in range(2,self.sensorHeight):
-            if (j%2):
-                imgBot.extend(rawData[(j*self._superRowSizeInBytes):((j+1)*self._superRowSizeInBytes)])
+    def _ePix100RowView(self, rawData):
+        """views the ePix100 payload, single frame or (N, ...) batch, as (..., sensorHeight, sensorWidth)
+        int16 super rows after the 32 byte header. Returns None if the payload is too short."""
+        if isinstance(rawData, np.ndarray):
+            data = rawData.view(np.uint8)
+        else:
+            data = np.frombuffer(rawData, dtype=np.uint8)
+        imgBytes = self.sensorHeight * self._superRowSizeInBytes
+        payload = data[..., 32:32+imgBytes]
+        if payload.shape[-1] != imgBytes:
+            print("Got wrong pixel number ", payload.shape[-1]//2)
+            return None
+        return payload.view(np.int16).reshape(payload.shape[:-1] + (self.sensorHeight, -1))
+
+    def _ePix100RowOrder(self, cameraType):
+        """returns the precomputed super row permutation of the ePix100a/p descramblers"""
+        if self._rowOrderKey != (cameraType, self.sensorHeight):
+            H = self.sensorHeight
+            if cameraType == EPIX100P:
+                # rows 0, 3, 5, 7, ... then 1, 2, 4, 6, ...
+                self._rowOrder = np.concatenate(([0], np.arange(3, H, 2), [1], np.arange(2, H, 2)))
             else:
-                imgTop.extend(rawData[(j*self._superRowSizeInBytes):((j+1)*self._superRowSizeInBytes)]) 
-        imgDesc = imgBot
-        imgDesc.extend(imgTop)
-
-        # convert to numpy array
-        imgDesc = np.array(imgDesc,dtype='uint8')
+                # odd rows from the last one up, then even rows
+                self._rowOrder = np.concatenate((np.arange(H-1, 0, -2), np.arange(0, H, 2)))
+            self._rowOrderKey = (cameraType, H)
+        return self._rowOrder
 
+    def _descrambleEPix100pImage(self, rawData):
+        """performs the ePix100p image descrambling, returns the image bytes (uint8)"""
+        rows = self._ePix100RowView(rawData)
+        if rows is None:
+            return np.zeros(0, dtype='uint8')
+        imgDesc = np.take(rows, self._ePix100RowOrder(EPIX100P), axis=-2)
         # returns final image
-        return imgDesc
+        return imgDesc.view(np.uint8).reshape(imgDesc.shape[:-2] + (-1,))
 
 
     def _descrambleEPix100aImageAsByteArray(self, rawData):
         """performs the ePix100a image descrambling (this is a place holder only)"""
-        
-        #removes header before displying the image
-        for j in range(0,32):
-            rawData.pop(0)
-        
-        #get the first superline
-        imgBot = bytearray()
-        imgTop = bytearray()
-        for j in range(0,self.sensorHeight):
-            if (j%2):
-                imgTop.extend(rawData[((self.sensorHeight-j)*self._superRowSizeInBytes):((self.sensorHeight-j+1)*self._superRowSizeInBytes)])
-            else:
-                imgBot.extend(rawData[(j*self._superRowSizeInBytes):((j+1)*self._superRowSizeInBytes)]) 
-        imgDesc = imgTop
-        imgDesc.extend(imgBot)
-
+        imgDesc = self._descrambleEPix100aImage(rawData)
         # returns final image
-        return imgDesc
+        return bytearray(imgDesc.tobytes())
 
     def _descrambleEPix100aImage(self, rawData):
-        """performs the ePix100a image descrambling """
-        
-        imgDescBA = self._descrambleEPix100aImageAsByteArray(rawData)
-
-        imgDesc = np.frombuffer(imgDescBA,dtype='int16')
-        if self.sensorHeight*self.sensorWidth != len(imgDesc):
-           print("Got wrong pixel number ", len(imgDesc))
-        else:
-           if (self.Verbose): print("Got pixel number ", len(imgDesc))
-           imgDesc = imgDesc.reshape(self.sensorHeight, self.sensorWidth)
+        """performs the ePix100a image descrambling, accepts a single frame or a (N, ...) batch"""
+        rows = self._ePix100RowView(rawData)
+        if rows is None:
+            return np.zeros((self.sensorHeight, self.sensorWidth), dtype='int16')
+        # single gather: odd super rows bottom up go on top, even super rows below
+        imgDesc = np.take(rows, self._ePix100RowOrder(EPIX100A), axis=-2)
         # returns final image
         return imgDesc
 
@@ -977,26 +972,21 @@ class Camera():
             if (self.Verbose): print('raw data 1:', rawData[1,0:10])
             if (self.Verbose): print('raw data 2:', rawData[2,0:10])
             if (self.Verbose): print('raw data 3:', rawData[3,0:10])
-            
-            quadrant0 = np.frombuffer(rawData[0,4:],dtype='uint16')
-            quadrant0sq = quadrant0.reshape(48,48)
-            quadrant1 = np.frombuffer(rawData[1,4:],dtype='uint16')
-            quadrant1sq = quadrant1.reshape(48,48)
-            quadrant2 = np.frombuffer(rawData[2,4:],dtype='uint16')
-            quadrant2sq = quadrant2.reshape(48,48)
-            quadrant3 = np.frombuffer(rawData[3,4:],dtype='uint16')
-            quadrant3sq = quadrant3.reshape(48,48)
-        
-            imgTop = np.concatenate((quadrant0sq, quadrant1sq),1)
-            imgBot = np.concatenate((quadrant2sq, quadrant3sq),1)
-
-            imgDesc = np.concatenate((imgTop, imgBot),0)
+            imgDesc = self._descrambleTixel48x48ImageBatch(np.asarray(rawData)[np.newaxis])[0]
         else:
             imgDesc = np.zeros((48*2,48*2), dtype='uint16')
         # returns final image
-        imgDesc = np.where((imgDesc & 0x1) == 1 , imgDesc, 0)
         return imgDesc
 
+    def _descrambleTixel48x48ImageBatch(self, rawStack, out=None):
+        """descrambles a (N, 4, words) stack of assembled Tixel frames (uint32, 4 words of
+        extended header per quadrant) into out, a preallocated (N, 96, 96) uint16 array.
+        Pixels with the parity bit (bit 0) cleared are set to zero."""
+        out = self._quadrantsToImages(rawStack, 48, 48, out)
+        # parity mask in place
+        out *= (out & 0x1)
+        return out
+
     def _descrambleCpix2Image(self, rawData):
         """performs the Tixel image descrambling """
         if (len(rawData)==4):
@@ -1004,46 +994,51 @@ class Camera():
             ##if (self.Verbose): print('raw data 1:', rawData[1,0:10])
             ##if (self.Verbose): print('raw data 2:', rawData[2,0:10])
             ##if (self.Verbose): print('raw data 3:', rawData[3,0:10])
-            
-            quadrant0 = np.frombuffer(rawData[0,4:],dtype='uint16')
-            quadrant0sq = quadrant0.reshape(48,48)
-            quadrant1 = np.frombuffer(rawData[1,4:],dtype='uint16')
-            quadrant1sq = quadrant1.reshape(48,48)
-            quadrant2 = np.frombuffer(rawData[2,4:],dtype='uint16')
-            quadrant2sq = quadrant2.reshape(48,48)
-            quadrant3 = np.frombuffer(rawData[3,4:],dtype='uint16')
-            quadrant3sq = quadrant3.reshape(48,48)
-        
-            imgTop = np.concatenate((quadrant0sq, quadrant1sq),1)
-            imgBot = np.concatenate((quadrant2sq, quadrant3sq),1)
-
-            imgDesc = np.concatenate((imgTop, imgBot),0)
+            imgDesc = self._descrambleCpix2ImageBatch(np.asarray(rawData)[np.newaxis])[0]
         else:
             imgDesc = np.zeros((48*2,48*2), dtype='uint16')
         # returns final image
         
         return imgDesc
+
+    def _descrambleCpix2ImageBatch(self, rawStack, out=None):
+        """descrambles a (N, 4, words) stack of assembled Cpix2 frames into out, a
+        preallocated (N, 96, 96) uint16 array"""
+        return self._quadrantsToImages(rawStack, 48, 48, out)
         
     def _descrambleEpixM32Image(self, rawData):
         """performs the EpixM32 image descrambling """
         if (len(rawData)==2):
             #if (self.Verbose): print('raw data 0:', rawData[0,0:10])
             #if (self.Verbose): print('raw data 1:', rawData[1,0:10])
-            
-            quadrant0 = np.frombuffer(rawData[0,4:],dtype='uint16')
-            quadrant0sq = quadrant0.reshape(64,32)
-            quadrant1 = np.frombuffer(rawData[1,4:],dtype='uint16')
-            quadrant1sq = quadrant1.reshape(64,32)
-        
-            imgTop = quadrant0sq
-            imgBot = quadrant1sq
-
-            imgDesc = np.concatenate((imgTop, imgBot),1)
+            imgDesc = self._descrambleEpixM32ImageBatch(np.asarray(rawData)[np.newaxis])[0]
         else:
             imgDesc = np.zeros((64,64), dtype='uint16')
         # returns final image
         return imgDesc
 
+    def _descrambleEpixM32ImageBatch(self, rawStack, out=None):
+        """descrambles a (N, 2, words) stack of assembled EpixM32 frames into out, a
+        preallocated (N, 64, 64) uint16 array"""
+        return self._quadrantsToImages(rawStack, 64, 32, out)
+
+    def _quadrantsToImages(self, rawStack, rows, cols, out=None):
+        """places the quadrants of a (N, numQuadrants, words) uint32 stack, each one a
+        (rows, cols) uint16 image after 4 words of extended header, side by side
+        (two per row of quadrants) into out through strided views, without concatenation"""
+        rawStack = np.asarray(rawStack, dtype='uint32')
+        numFrames, numQuadrants = rawStack.shape[0], rawStack.shape[1]
+        quadRows = numQuadrants // 2
+        if out is None:
+            out = np.empty((numFrames, quadRows*rows, 2*cols), dtype='uint16')
+        elif not out.flags.c_contiguous:
+            # the reshape below would write into a copy
+            raise ValueError("out must be C contiguous")
+        quadrants = rawStack[:, :, 4:].view('uint16').reshape(numFrames, quadRows, 2, rows, cols)
+        # out[n, r*rows+i, c*cols+j] = quadrant[2*r+c][i, j]
+        out.reshape(numFrames, quadRows, rows, 2, cols)[...] = quadrants.transpose(0, 1, 3, 2, 4)
+        return out
+
     def _descrambleEpixHRADC32x32Image(self, rawData):
         """performs the EpixM32 image descrambling """
         if (len(rawData)==2):
@@ -1121,31 +1116,30 @@ class Camera():
         if (len(rawData)==56076):
              if (type(rawData != 'numpy.ndarray')):
                 img = np.frombuffer(rawData,dtype='uint16')
-             if (self.Verbose):print("shape", img.shape)          
-             #Select data payload
-             quadrant0 = np.frombuffer(img[6:28038],dtype='uint16')
-             #descramble image
-             #get data for each bank
-             adcImg = quadrant0.reshape(-1,6)
-             for i in range(0,6):
-                 #reshape data into 2D array per bank
-                 adcImg2 = adcImg[0:adcImg.shape[0],i].reshape(-1,32)
-                 #apply row-shift patch
-                 adcImg2[1:,30] = adcImg2[0:adcImg2.shape[0]-1,30]
-                 adcImg2[1:,31] = adcImg2[0:adcImg2.shape[0]-1,31]
-                 #concatenate bank data into a single image per asic
-                 if i == 0:
-                     quadrant0sq = adcImg2
-                 else:
-                     quadrant0sq = np.concatenate((quadrant0sq,adcImg2),1)
-             imgDesc = quadrant0sq
+             if (self.Verbose):print("shape", img.shape)
+             imgDesc = np.empty((self.sensorHeight, self.sensorWidth), dtype='uint16')
+             self._descrambleEpixHR10kTImageInto(img[6:28038], imgDesc)
         else:
             print("descramble error")
             imgDesc = np.zeros((144,384), dtype='uint16')
-            
+
         # returns final image
         return imgDesc
 
+    def _descrambleEpixHR10kTImageInto(self, payload, out):
+        """descrambles Epix10kT payloads (header removed) directly into out.
+           payload is (..., 28032) uint16 and out is (..., 146, 192), so the
+           same call handles a single frame, a batch of frames or a tile of a
+           larger preallocated image (e.g. the 4 ASIC mosaic)."""
+        #data comes interleaved from the 6 banks, 32 columns per bank
+        adcImg = payload.reshape(payload.shape[:-1] + (out.shape[-2], 32, 6))
+        for i in range(0,6):
+            out[..., i*32:(i+1)*32] = adcImg[..., i]
+        #apply row-shift patch to the last two columns of every bank
+        out[..., 1:, 30::32] = out[..., :-1, 30::32]
+        out[..., 1:, 31::32] = out[..., :-1, 31::32]
+        return out
+
 
     def _descrambleEpixHR10kTImageBatcher(self, rawData):
         """performs the Epix10kT with  batcher image descrambling """
@@ -1244,11 +1238,15 @@ class Camera():
             except Exception: 
                 e = sys.exc_info()[0]
                 #print ("Message\n", e)
-                print ('\r', 'numberOfFrames read:', numberOfFrames, 'Size Error, currnt size', file_header, 'previous size', previousSize)
-                return [0]
+                if (len(file_header)>0):
+                    print ('\r', 'numberOfFrames read:', numberOfFrames, 'Size Error, currnt size', file_header, 'previous size', previousSize)
+                # keeps the frames read before the end of the file or a bad record
+                if (numberOfFrames == 0):
+                    return [0]
+                return np.asarray(allFrames)
 
 
-        return allFrames
+        return np.asarray(allFrames)
 
 
     def getDescImaData(self, localAllFrames):
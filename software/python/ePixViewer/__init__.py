@@ -10,5 +10,23 @@
 from ePixViewer._ePixViewer import *
 from ePixViewer.imgProcessing import *
 from ePixViewer.Cameras import *
+from ePixViewer.dataFile import *
+from ePixViewer.batcher import *
+from ePixViewer.timingIndex import *
+from ePixViewer.frameCache import *
+from ePixViewer.headers import *
+from ePixViewer.assembler import *
+from ePixViewer.runCheck import *
+from ePixViewer.correction import *
+from ePixViewer.calibStore import *
+from ePixViewer.pixelHistogram import *
+from ePixViewer.rampAnalysis import *
+from ePixViewer.noiseSpectrum import *
+from ePixViewer.clusterFinder import *
+from ePixViewer.sparseFrames import *
+from ePixViewer.compressedFile import *
+from ePixViewer.segmentWriter import *
+from ePixViewer.dataSet import *
+from ePixViewer.scanAnalysis import *
 
 
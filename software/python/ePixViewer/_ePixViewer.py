@@ -23,6 +23,7 @@
 
 import sys
 import os
+import threading
 import rogue.utilities
 import rogue.utilities.fileio
 import rogue.interfaces.stream
@@ -30,6 +31,9 @@ import pyrogue
 import time
 import ePixViewer.imgProcessing as imgPr
 import ePixViewer.Cameras as cameras
+from ePixViewer.dataFile import DataFile
+from ePixViewer.frameCache import FrameCache, FramePrefetcher
+from ePixViewer.calibStore import CalibStore
 import numpy as np
 from matplotlib.figure import Figure
 
@@ -45,6 +49,9 @@ except ImportError:
     from PyQt4.QtGui     import *
     from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 
+# file channels of the camera data, lane n is written as 0x10*n + 1 by the dataWriter
+FILE_DATA_CHANNELS = (0x01, 0x11, 0x21, 0x31)
+
 
 ################################################################################
 ################################################################################
@@ -65,7 +72,7 @@ class Window(QMainWindow, QObject):
     processMonitoringFrameTrigger = pyqtSignal()
 
 
-    def __init__(self, cameraType = 'ePix100a', verbose = False):
+    def __init__(self, cameraType = 'ePix100a', verbose = False, calibDir = None, calibFingerprint = None, calibAsic = 0):
         super(Window, self).__init__()    
         self.Verbose = verbose
         # window init
@@ -126,10 +133,25 @@ class Window(QMainWindow, QObject):
         # weak way to sync frame reader and display
         self.readFileDelay = 0.1
 
+        # indexed data file used to browse the frames of a .dat file
+        self.dataFile = None
+        self.fileFrames = np.zeros(0, dtype=np.int64)
+
+        # decoded frames of the file around the current one, filled in the background
+        self.frameCache = FrameCache()
+        self.prefetcher = None
+        self.playTimer = QTimer(self)
+        self.playTimer.timeout.connect(self.playStep)
+
         # initialize image processing objects
         self.rawImgFrame = []
         self.imgDesc = []
         self.imgTool = imgPr.ImageProcessing(self)
+        # dark images matching the configuration are reused across sessions
+        self.calibStore = None if calibDir is None else CalibStore(calibDir)
+        self.calibAsic = calibAsic
+        if (calibFingerprint is not None):
+            self.setCalibFingerprint(calibFingerprint)
 
         #init mouse variables
         self.mouseX = 0
@@ -154,6 +176,7 @@ class Window(QMainWindow, QObject):
         # Center UI
         self.imageScaleMax = int(10000)
         self.imageScaleMin = int(-10000)
+        self._8bitImg = None
         screen = QDesktopWidget().screenGeometry(self)
         size = self.geometry()
         self.buildUi()
@@ -211,13 +234,24 @@ class Window(QMainWindow, QObject):
         self.eventReaderScope.readFileDelay = delay
         self.eventReaderMonitoring.readFileDelay = delay
         self.readFileDelay = delay
+
+
+    def setCalibFingerprint(self, fingerprint):
+        """uses the constants of the calibration store (calibDir) taken with the
+        configuration fingerprint (see calibStore.deviceFingerprint)"""
+        if (self.calibStore is not None):
+            self.imgTool.setCalibStore(self.calibStore, fingerprint, self.calibAsic)
         
 
     def file_open(self):
         self.eventReader.frameIndex = 1
         self.eventReader.VIEW_DATA_CHANNEL_ID = 1
-        self.setReadDelay(0.1)
+        # frames are read from the file index, no need to wait for the reader
+        self.setReadDelay(0)
         self.filename = QFileDialog.getOpenFileName(self, 'Open File', '', 'Rogue Images (*.dat);; GenDAQ Images (*.bin);;Any (*.*)')  
+        if isinstance(self.filename, tuple):
+            self.filename = self.filename[0]
+        self.dataFile = None
         if (os.path.splitext(self.filename)[1] == '.dat'): 
             self.displayImagDat(self.filename)
         else:
@@ -235,6 +269,9 @@ class Window(QMainWindow, QObject):
             pixelBitMask = int(textInput,16)
             if (pixelBitMask>0):
                 self.currentCam.bitMask = pixelBitMask
+                self.frameCache.clear()
+                if self.prefetcher is not None:
+                    self.prefetcher.refill()
                 print("Pixel Bit Mask Set.")
         except ValueError:
             pixelBitMask = self.currentCam.bitMask
@@ -261,20 +298,52 @@ class Window(QMainWindow, QObject):
 
     # display the previous frame from the current file
     def prevFrame(self):
-        self.eventReader.frameIndex = int(self.frameNumberLine.text()) - 1
-        if (self.eventReader.frameIndex<1):
-            self.eventReader.frameIndex = 1
-        self.frameNumberLine.setText(str(self.eventReader.frameIndex))
-        print('Selected frame ', self.eventReader.frameIndex)
-        self.displayImagDat(self.filename)
+        self.showFileFrame(self.eventReader.frameIndex - 1)
 
 
     # display the next frame from the current file
     def nextFrame(self):
-        self.eventReader.frameIndex = int(self.frameNumberLine.text()) + 1
-        self.frameNumberLine.setText(str(self.eventReader.frameIndex))
-        print('Selected frame ', self.eventReader.frameIndex)
-        self.displayImagDat(self.filename)
+        self.showFileFrame(self.eventReader.frameIndex + 1)
+
+
+    # display the frame typed in the frame number box
+    def jumpToFrame(self):
+        try:
+            frameIndex = int(self.frameNumberLine.text())
+        except ValueError:
+            print("Error: invalid frame number. Got: ", self.frameNumberLine.text())
+            return
+        self.showFileFrame(frameIndex)
+
+
+    # display the frame selected with the slider
+    def sliderFrame(self, value):
+        if value != self.eventReader.frameIndex:
+            self.showFileFrame(value)
+
+
+    # starts or stops stepping through the file at the selected rate
+    def playFrames(self):
+        if self.playTimer.isActive():
+            self.playTimer.stop()
+            self.btnPlayFrames.setText("Play")
+            return
+        try:
+            fps = float(self.playFpsLine.text())
+        except ValueError:
+            fps = 10.0
+            self.playFpsLine.setText(str(fps))
+        if fps <= 0:
+            return
+        self.playTimer.start(int(1000/fps))
+        self.btnPlayFrames.setText("Stop")
+
+
+    def playStep(self):
+        if self.eventReader.frameIndex >= len(self.fileFrames):
+            self.playFrames()
+        else:
+            self.nextFrame()
 
 
     # checks if the user really wants to exit
@@ -303,20 +372,68 @@ class Window(QMainWindow, QObject):
 #                    QtCore.Qt.SmoothTransformation))
 
 
-    # if the image is a rogue type, calls the file reader object to read all frames
+    # if the image is a rogue type, indexes the file once and displays the current frame
     def displayImagDat(self, filename):
 
         print('File name: ', filename)
-        self.eventReader.readDataDone = False
-        self.eventReader.numAcceptedFrames = 0
-        self.fileReader.open(filename)
-
-        # waits until data is found
-        timeoutCnt = 0
-        while ((self.eventReader.readDataDone == False) and (timeoutCnt < 10)):
-             timeoutCnt += 1
-             print('Loading image...', self.eventReader.frameIndex, 'atempt',  timeoutCnt)
-             time.sleep(0.1)
+        if (self.dataFile is None) or (self.dataFile.filename != filename):
+            if self.prefetcher is not None:
+                self.prefetcher.stop()
+            # new cache, a prefetcher still finishing a frame of the old file cannot pollute it
+            self.frameCache = FrameCache()
+            self.dataFile = DataFile(filename)
+            # the data records of every lane, in file order
+            self.fileFrames = np.nonzero(np.isin(self.dataFile.channels, FILE_DATA_CHANNELS))[0]
+            print('Number of frames in file: ', len(self.fileFrames))
+            self.frameSlider.setRange(1, max(1, len(self.fileFrames)))
+            # the prefetcher gets its own camera object so it never shares state with the display
+            prefetchCam = cameras.Camera(cameraType = self.currentCam.cameraType)
+            dataFile, fileFrames = self.dataFile, self.fileFrames
+            self.prefetcher = FramePrefetcher(self.frameCache, lambda index: self._decodeFileFrame(index, prefetchCam, dataFile, fileFrames), len(self.fileFrames))
+            self.prefetcher.start()
+        self.showFileFrame(self.eventReader.frameIndex)
+
+
+    # returns the descrambled image of a file frame, None if the record is not a complete image
+    def _decodeFileFrame(self, frameIndex, camera, dataFile = None, fileFrames = None):
+        if dataFile is None:
+            dataFile, fileFrames = self.dataFile, self.fileFrames
+        rawData = bytearray(dataFile.record(fileFrames[frameIndex-1]))
+        [frameComplete, readyForDisplay, rawImgFrame] = camera.buildImageFrame(currentRawData = [], newRawData = rawData)
+        if not readyForDisplay:
+            return None
+        camera.bitMask = self.currentCam.bitMask
+        return camera.descrambleImage(rawImgFrame)
+
+
+    # reads a single frame (1 based index) from the file index and displays it
+    def showFileFrame(self, frameIndex):
+        if (self.dataFile is None) or (len(self.fileFrames) == 0):
+            return
+        frameIndex = min(max(frameIndex, 1), len(self.fileFrames))
+        self.eventReader.frameIndex = frameIndex
+        self.eventReader.numAcceptedFrames = len(self.fileFrames)
+        self.frameNumberLine.setText(str(frameIndex))
+        self.frameSlider.blockSignals(True)
+        self.frameSlider.setValue(frameIndex)
+        self.frameSlider.blockSignals(False)
+        self.gridVbox2.labelFrameNum.setText('Frame {} of {}'.format(frameIndex, len(self.fileFrames)))
+
+        imgDesc = self.frameCache.get(frameIndex)
+        if imgDesc is None:
+            imgDesc = self._decodeFileFrame(frameIndex, self.currentCam)
+            if imgDesc is not None:
+                self.frameCache.put(frameIndex, imgDesc)
+        self.prefetcher.setCursor(frameIndex)
+
+        if imgDesc is not None:
+            self.displayDescrambledImage(imgDesc)
+        else:
+            # image split over several records, build it through the reader path
+            self.eventReader.frameData = bytearray(self.dataFile.record(self.fileFrames[frameIndex-1]))
+            self.eventReader.readDataDone = True
+            self.rawImgFrame = []
+            self.buildImageFrame()
     
     # build image frame. 
     # If image frame is completed calls displayImageFromReader
@@ -340,30 +457,39 @@ class Window(QMainWindow, QObject):
 
     # core code for displaying the image
     def displayImageFromReader(self, imageData):
+        #get descrambled image com camera
+        self.displayDescrambledImage(self.currentCam.descrambleImage(imageData))
+
+
+    def displayDescrambledImage(self, imgDesc):
         #init variables
         self.imgTool.imgWidth = self.currentCam.sensorWidth
         self.imgTool.imgHeight = self.currentCam.sensorHeight
-        #get descrambled image com camera
-        self.imgDesc = self.currentCam.descrambleImage(imageData)
+        self.imgDesc = imgDesc
                     
         arrayLen = len(self.imgDesc)
 
         self._updateImageScales()
 
+        # display buffer reused from frame to frame
+        if (self._8bitImg is None or self._8bitImg.shape != np.shape(self.imgDesc)):
+            self._8bitImg = np.empty(np.shape(self.imgDesc), dtype='uint8')
+        scaleMax = max(self.imageScaleMax, self.imageScaleMin)
+        scaleMin = min(self.imageScaleMax, self.imageScaleMin)
+
         if (self.imgTool.imgDark_isSet):
             self.ImgDarkSub = self.imgTool.getDarkSubtractedImg(self.imgDesc)
-            _8bitImg = self.ImgDarkSub#self.imgTool.reScaleImgTo8bit(self.ImgDarkSub, self.imageScaleMax, self.imageScaleMin)
+            _8bitImg = self.imgTool.reScaleImgTo8bit(self.ImgDarkSub, scaleMax, scaleMin)
         else:
-            # get the data into the image object
-            _8bitImg = self.imgDesc#self.imgTool.reScaleImgTo8bit(self.imgDesc, self.imageScaleMax, self.imageScaleMin)
+            # 16 bit images go through the display lookup table
+            _8bitImg = self.imgTool.reScaleImgTo8bit(self.imgDesc, scaleMax, scaleMin, out = self._8bitImg)
 
         #self.image = QtGui.QImage(_8bitImg.repeat(4), self.imgTool.imgWidth, self.imgTool.imgHeight, QtGui.QImage.Format_RGB32)
         
         #pp = QtGui.QPixmap.fromImage(self.image)
-        if self.imageScaleMax > self.imageScaleMin:
-            self.mainImageDisp.update_figure(_8bitImg, contrast=[self.imageScaleMax, self.imageScaleMin], autoScale = False)
-        else:
-            self.mainImageDisp.update_figure(_8bitImg, contrast=[self.imageScaleMin, self.imageScaleMax], autoScale = False)
+        # the 8 bit image is shown, the cursor reads the pixel values
+        self.mainImageDisp.update_figure(_8bitImg, contrast=[255, 0], autoScale = False,
+                                         values = self.ImgDarkSub if self.imgTool.imgDark_isSet else self.imgDesc)
         #self.label.setPixmap(pp.scaled(self.label.size(),QtCore.Qt.KeepAspectRatio,QtCore.Qt.SmoothTransformation))
         #self.label.adjustSize()
         # updates the frame number
@@ -462,9 +588,10 @@ class Window(QMainWindow, QObject):
         #saves dark image set, if requested
         if (self.imgTool.imgDark_isRequested):
             self.imgTool.setDarkImg(self.imgDesc)
-        #if the image gets done, saves it for other processes
-        if (self.imgTool.imgDark_isSet):
-            self.ImgDarkSub = self.imgTool.getDarkSubtractedImg(self.imgDesc)
+            #the dark image may have been set by this frame, ImgDarkSub is
+            #otherwise already computed by displayDescrambledImage
+            if (self.imgTool.imgDark_isSet):
+                self.ImgDarkSub = self.imgTool.getDarkSubtractedImg(self.imgDesc)
             
         #check horizontal line display
         if ((self.cbHorizontalLineEnabled.isChecked()) or (self.cbVerticalLineEnabled.isChecked()) or (self.cbpixelTimeSeriesEnabled.isChecked())):
@@ -772,6 +899,242 @@ class EventReader(rogue.interfaces.stream.Slave):
 
 
 
+################################################################################
+################################################################################
+#   Mosaic window class
+#   Displays all ASICs (one per PGP lane) of the detector as a single image.
+#   Frames from the lanes are matched by acquisition number and descrambled
+#   into their tile of a preallocated full detector image.
+################################################################################
+class MosaicWindow(QMainWindow, QObject):
+    """Class that defines the mosaic window for the viewer."""
+
+    mosaicTrigger = pyqtSignal()
+
+    def __init__(self, cameraType = 'ePixHr10kT', numLanes = 4, verbose = False):
+        super(MosaicWindow, self).__init__()
+        self.Verbose = verbose
+        # window init
+        self.mainWdGeom = [50, 50, 900, 700] # x, y, width, height
+        self.setGeometry(self.mainWdGeom[0], self.mainWdGeom[1], self.mainWdGeom[2],self.mainWdGeom[3])
+        self.setWindowTitle("ePix mosaic viewer")
+
+        # creates a camera object and the assembler that owns the mosaic buffers
+        self.currentCam = cameras.Camera(cameraType = cameraType, verbose=self.Verbose)
+        self.assembler = MosaicAssembler(self.currentCam, numLanes = numLanes)
+
+        # one stream slave per lane, each one should be tapped to the lane data VC
+        self.laneReaders = [MosaicLaneReader(self, lane) for lane in range(numLanes)]
+
+        # screen is updated at most once per displayPeriod (in seconds)
+        self.displayPeriod = 1.0
+        self.lastTime = time.clock_gettime(0)
+
+        self.imageScaleMax = int(10000)
+        self.imageScaleMin = int(-10000)
+        self.buildUi()
+
+        self.mosaicTrigger.connect(self.displayMosaic)
+
+        self.show()
+
+
+    #creates the main display element of the user interface
+    def buildUi(self):
+        self.mainImageDisp = MplCanvas(MyTitle = "Detector Mosaic")
+
+        # contrast
+        imageScaleLabel = QLabel("Contrast (max, min)")
+        self.imageScaleMaxLine = QLineEdit()
+        self.imageScaleMaxLine.setMaximumWidth(100)
+        self.imageScaleMaxLine.setText(str(self.imageScaleMax))
+        self.imageScaleMinLine = QLineEdit()
+        self.imageScaleMinLine.setMaximumWidth(100)
+        self.imageScaleMinLine.setText(str(self.imageScaleMin))
+
+        # lane synchronization status
+        self.laneStatus = QLabel('')
+
+        hbox = QHBoxLayout()
+        hbox.addWidget(imageScaleLabel)
+        hbox.addWidget(self.imageScaleMaxLine)
+        hbox.addWidget(self.imageScaleMinLine)
+        hbox.addStretch()
+
+        self.mainWidget = QWidget(self)
+        vbox = QVBoxLayout(self.mainWidget)
+        vbox.addWidget(self.mainImageDisp)
+        vbox.addLayout(hbox)
+        vbox.addWidget(self.laneStatus)
+
+        self.mainWidget.setFocus()
+        self.setCentralWidget(self.mainWidget)
+
+
+    # called from the stream threads every time a detector image is completed
+    def requestDisplay(self):
+        if (time.clock_gettime(0)-self.lastTime) > self.displayPeriod:
+            self.lastTime = time.clock_gettime(0)
+            # only the window thread can access the screen
+            self.mosaicTrigger.emit()
+
+
+    """Checks the value on the user interface, if valid update them"""
+    def _updateImageScales(self):
+        try:
+            self.imageScaleMax = int(self.imageScaleMaxLine.text())
+            self.imageScaleMin = int(self.imageScaleMinLine.text())
+        except ValueError:
+            pass
+
+
+    def displayMosaic(self):
+        [acqNum, image] = self.assembler.getImage()
+        self._updateImageScales()
+        contrast = [max(self.imageScaleMax, self.imageScaleMin), min(self.imageScaleMax, self.imageScaleMin)]
+        self.mainImageDisp.update_figure(image, contrast=contrast, autoScale = False)
+        self.laneStatus.setText('AcqNum {}\n{}'.format(acqNum, self.assembler.statusString()))
+
+
+
+################################################################################
+################################################################################
+#   Mosaic assembler class
+#
+################################################################################
+class MosaicAssembler():
+    """matches the frames of all lanes by acquisition number and descrambles
+       each of them into its tile of a preallocated full detector image"""
+
+    def __init__(self, camera, numLanes = 4, tilesPerRow = 2, depth = 4):
+        self.camera = camera
+        self.numLanes = numLanes
+        self.tileHeight = camera.sensorHeight
+        self.tileWidth  = camera.sensorWidth
+        numRows = (numLanes + tilesPerRow - 1) // tilesPerRow
+        mosaicShape = (numRows * self.tileHeight, tilesPerRow * self.tileWidth)
+
+        # (row, col) of the top left pixel of each lane in the mosaic
+        self.tileOrigin = [((lane // tilesPerRow) * self.tileHeight, (lane % tilesPerRow) * self.tileWidth) for lane in range(numLanes)]
+
+        # pool of event slots, each one holding a full detector image
+        self._slotImages  = np.zeros((depth,) + mosaicShape, dtype='uint16')
+        self._slotAcqNum  = np.full(depth, -1, dtype='int64')
+        self._slotLanes   = np.zeros(depth, dtype='uint32')
+        self._completeMask = (1 << numLanes) - 1
+
+        # last complete detector image
+        self.image = np.zeros(mosaicShape, dtype='uint16')
+        self.imageAcqNum = -1
+        self.numCompleteImages = 0
+
+        # per lane statistics
+        self.laneAcqNum      = np.full(numLanes, -1, dtype='int64')
+        self.laneFrames      = np.zeros(numLanes, dtype='uint64')
+        self.laneMissing     = np.zeros(numLanes, dtype='uint64')
+        self.laneSizeErrors  = np.zeros(numLanes, dtype='uint64')
+
+        # the lanes are received by different stream threads
+        self._lock = threading.Lock()
+
+    def tile(self, image, lane):
+        row, col = self.tileOrigin[lane]
+        return image[row:row+self.tileHeight, col:col+self.tileWidth]
+
+    def addLaneFrame(self, lane, rawData):
+        """adds one lane frame (header + payload). Returns True when it
+           completes a detector image"""
+        header  = np.frombuffer(rawData, dtype='uint32', count=3)
+        acqNum  = int(header[1])
+        payload = np.frombuffer(rawData, dtype='uint16', offset=12, count=self.tileHeight*self.tileWidth)
+
+        with self._lock:
+            self.laneFrames[lane] += 1
+            self.laneAcqNum[lane] = acqNum
+            slot = self._getSlot(acqNum)
+            self.camera._descrambleEpixHR10kTImageInto(payload, self.tile(self._slotImages[slot], lane))
+            self._slotLanes[slot] |= (1 << lane)
+            if (self._slotLanes[slot] != self._completeMask):
+                return False
+
+            np.copyto(self.image, self._slotImages[slot])
+            self.imageAcqNum = acqNum
+            self.numCompleteImages += 1
+            self._releaseSlot(slot)
+            # older events can no longer be completed
+            for older in np.flatnonzero((self._slotAcqNum >= 0) & (self._slotAcqNum < acqNum)):
+                self._dropSlot(older)
+            return True
+
+    def addSizeError(self, lane):
+        """counts a lane frame of unexpected size"""
+        with self._lock:
+            self.laneSizeErrors[lane] += 1
+
+    def getImage(self):
+        with self._lock:
+            return [self.imageAcqNum, self.image.copy()]
+
+    def statusString(self):
+        with self._lock:
+            lag = self.laneAcqNum.max() - self.laneAcqNum
+            return '\n'.join('Lane {}: acqNum {} (lag {}), frames {}, missing {}, size errors {}'.format(
+                lane, self.laneAcqNum[lane], lag[lane], self.laneFrames[lane], self.laneMissing[lane], self.laneSizeErrors[lane])
+                for lane in range(self.numLanes))
+
+    def _getSlot(self, acqNum):
+        slots = np.flatnonzero(self._slotAcqNum == acqNum)
+        if len(slots) > 0:
+            return slots[0]
+        free = np.flatnonzero(self._slotAcqNum < 0)
+        if len(free) > 0:
+            slot = free[0]
+        else:
+            # all slots busy, the oldest event is dropped
+            slot = np.argmin(self._slotAcqNum)
+            self._dropSlot(slot)
+        self._slotAcqNum[slot] = acqNum
+        return slot
+
+    def _dropSlot(self, slot):
+        for lane in range(self.numLanes):
+            if not ((self._slotLanes[slot] >> lane) & 1):
+                self.laneMissing[lane] += 1
+        self._releaseSlot(slot)
+
+    def _releaseSlot(self, slot):
+        self._slotAcqNum[slot] = -1
+        self._slotLanes[slot]  = 0
+
+
+
+################################################################################
+################################################################################
+#   Mosaic lane reader class
+#
+################################################################################
+class MosaicLaneReader(rogue.interfaces.stream.Slave):
+    """feeds the data frames of one lane into the mosaic assembler"""
+
+    def __init__(self, parent, lane, frameSize = 56076):
+        rogue.interfaces.stream.Slave.__init__(self)
+        self.parent = parent
+        self.lane = lane
+        # frames are read into a preallocated buffer
+        self._frameData = bytearray(frameSize)
+
+    def _acceptFrame(self, frame):
+        if self.parent.isHidden():
+            return
+        if frame.getPayload() != len(self._frameData):
+            self.parent.assembler.addSizeError(self.lane)
+            return
+        frame.read(self._frameData, 0)
+        if self.parent.assembler.addLaneFrame(self.lane, self._frameData):
+            self.parent.requestDisplay()
+
+
+
 ################################################################################
 ################################################################################
 #   Matplotlib class
@@ -840,7 +1203,9 @@ class MplCanvas(FigureCanvas):
         self.axes.set_title(self.MyTitle)        
         self.draw()
 
-    def update_figure(self, image=None, contrast=None, autoScale = True):
+    def update_figure(self, image=None, contrast=None, autoScale = True, values = None):
+        # values, when given, are the pixel values read by the cursor
+        # (the ADC values of an image displayed as 8 bit)
         self.axes.cla()
         self.axes.autoscale = autoScale
 
@@ -850,6 +1215,8 @@ class MplCanvas(FigureCanvas):
                 self.cax = self.axes.imshow(image, interpolation='nearest', cmap='gray',vmin=contrast[1], vmax=contrast[0])
             else:
                 self.cax = self.axes.imshow(image, interpolation='nearest', cmap='gray')
+            if values is not None:
+                self.cax.get_cursor_data = lambda event: self._cursorValue(values, event)
 
 #            if (self.fig.cbar==None):              
 #                self.fig.cbar = self.fig.colorbar(self.cax)
@@ -858,6 +1225,15 @@ class MplCanvas(FigureCanvas):
 #                self.fig.cbar = self.fig.colorbar(self.cax)
         self.draw()
 
+    def _cursorValue(self, values, event):
+        # pixel centers are on the integer coordinates of imshow
+        if event.xdata is None or event.ydata is None:
+            return None
+        row, col = int(event.ydata + 0.5), int(event.xdata + 0.5)
+        if 0 <= row < values.shape[0] and 0 <= col < values.shape[1]:
+            return values[row, col]
+        return None
+
         
 
 
@@ -985,6 +1361,30 @@ class TabbedCtrlCanvas(QTabWidget):
         myParent.frameNumberLine.setMaximumWidth(100)
         myParent.frameNumberLine.setMinimumWidth(50)
         myParent.frameNumberLine.setText(str(1))
+        myParent.frameNumberLine.returnPressed.connect(myParent.jumpToFrame)
+
+        # button go to frame
+        btnGoToFrame = QPushButton("Go")
+        btnGoToFrame.setMaximumWidth(150)
+        btnGoToFrame.clicked.connect(myParent.jumpToFrame)
+        btnGoToFrame.resize(btnGoToFrame.minimumSizeHint())
+
+        # frame slider, only moves to the frame when released
+        myParent.frameSlider = QSlider(Qt.Horizontal)
+        myParent.frameSlider.setRange(1, 1)
+        myParent.frameSlider.setTracking(False)
+        myParent.frameSlider.valueChanged.connect(myParent.sliderFrame)
+
+        # play button and rate
+        myParent.btnPlayFrames = QPushButton("Play")
+        myParent.btnPlayFrames.setMaximumWidth(150)
+        myParent.btnPlayFrames.clicked.connect(myParent.playFrames)
+        myParent.btnPlayFrames.resize(myParent.btnPlayFrames.minimumSizeHint())
+        playFpsLabel = QLabel("Frames per second")
+        myParent.playFpsLine = QLineEdit()
+        myParent.playFpsLine.setMaximumWidth(100)
+        myParent.playFpsLine.setMinimumWidth(50)
+        myParent.playFpsLine.setText(str(10))
 
         # set layout to tab 2
         tab2Frame1 = QFrame()
@@ -999,10 +1399,16 @@ class TabbedCtrlCanvas(QTabWidget):
         grid2.setColumnMinimumWidth(2, 1)
         grid2.setColumnMinimumWidth(3, 1)
         grid2.setColumnMinimumWidth(5, 1)
-        grid2.addWidget(tab2Frame1,0,0,5,7)
+        grid2.addWidget(tab2Frame1,0,0,7,7)
         grid2.addWidget(btnNextFrame, 1, 1)
         grid2.addWidget(btnPrevFrame, 1, 2)
         grid2.addWidget(myParent.frameNumberLine, 2, 1)
+        grid2.addWidget(btnGoToFrame, 2, 2)
+        grid2.addWidget(myParent.frameSlider, 3, 1, 1, 5)
+        grid2.addWidget(self.labelFrameNum, 4, 1, 1, 2)
+        grid2.addWidget(myParent.btnPlayFrames, 5, 1)
+        grid2.addWidget(playFpsLabel, 5, 2)
+        grid2.addWidget(myParent.playFpsLine, 5, 3)
 
         # complete tab2
         tab2.setLayout(grid2)
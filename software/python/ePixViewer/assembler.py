@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : offline frame assembly
+#-----------------------------------------------------------------------------
+# File       : assembler.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Offline equivalent of Camera.buildImageFrame for whole runs. The records
+# of the cameras that send an image in several packets (one per ASIC and
+# TOA/TOT) are grouped by acquisition number from the decoded header
+# columns and the complete acquisitions are gathered in one shot into an
+# (N, parts, words) array with the same layout Camera.buildImageFrame
+# produces (word 0 of every part is the valid flag, the packet follows),
+# so the camera descramblers can be applied directly.
+#
+# iterImages goes one step further and yields descrambled images of a run
+# in batches for the cameras with a batched descrambler.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+from ePixViewer.headers import decodeHeaders
+from ePixViewer.batcher import BatcherFile
+
+def _partTixel(asicNum, isTOA):
+    # same placement as Camera.fill_memory
+    return np.where(asicNum < 2, asicNum + 2*isTOA, -1)
+
+def _partByAsic(asicNum, isTOA):
+    return np.where(asicNum < 2, asicNum, -1)
+
+def _partHrAdc(asicNum, isTOA):
+    return np.where(asicNum == 1, 1, np.where((asicNum == 0) | (asicNum == 2), 0, -1))
+
+# camera : (header fields camera type, packet size in 32 bit words, number of parts, part function)
+ASSEMBLY_LAYOUTS = {
+    'Tixel48x48'   : ('Tixel48x48',   1155,  4, _partTixel),
+    'Cpix2'        : ('Cpix2',        1155,  4, _partTixel),
+    'ePixM32Array' : ('ePixM32Array', 1027,  2, _partByAsic),
+    'HrAdc32x32'   : ('HrAdc32x32',   515,   2, _partHrAdc),
+}
+
+INCOMPLETE_DTYPE = np.dtype([
+    ('acqNum',    '<u4'),
+    ('partsMask', '<u2'),   # bit n set if part n was found
+])
+
+
+################################################################################
+################################################################################
+#   Assembled frames class
+#
+################################################################################
+class AssembledFrames():
+    """result of assembleFrames
+
+    frames     : (N, parts, 1+words) uint32 complete acquisitions, None if not gathered
+    acqNums    : (N,) acquisition numbers of frames
+    records    : (N, parts) file records used for each part
+    incomplete : INCOMPLETE_DTYPE array of the acquisitions missing parts
+    duplicates : number of records dropped because the part was already seen
+    rejected   : number of records with a wrong size or part number
+    """
+    def __init__(self, frames, acqNums, records, incomplete, duplicates, rejected):
+        self.frames = frames
+        self.acqNums = acqNums
+        self.records = records
+        self.incomplete = incomplete
+        self.duplicates = duplicates
+        self.rejected = rejected
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def report(self):
+        return 'complete {} incomplete {} duplicates {} rejected {}'.format(len(self), len(self.incomplete), self.duplicates, self.rejected)
+
+
+def gatherFrames(dataFile, records, words):
+    """gathers the (N, parts) records of dataFile into an (N, parts, 1+words)
+    uint32 array, word 0 of every part is the valid flag"""
+    frames = np.empty(records.shape + (1+words,), dtype=np.uint32)
+    frames[..., 0] = 1
+    raw = gatherBytes(dataFile.data, dataFile.offsets[records.ravel()], 4*words)
+    frames[..., 1:] = raw.view('<u4').reshape(records.shape + (words,))
+    return frames
+
+
+def assembleFrames(dataFile, cameraType, channel = None, columns = None, gather = True):
+    """assembles the multi packet frames of cameraType found in dataFile (a
+    DataFile or file name), columns are the decodeHeaders output if already
+    available. Without gather only the records of the frames are returned."""
+    if not isinstance(dataFile, DataFile):
+        dataFile = DataFile(dataFile)
+    if cameraType not in ASSEMBLY_LAYOUTS:
+        raise ValueError("No assembly layout for camera %s" % (cameraType))
+    headerType, words, numParts, partOf = ASSEMBLY_LAYOUTS[cameraType]
+    if columns is None:
+        columns = decodeHeaders(dataFile, headerType, channel)
+
+    part = partOf(columns['asicNum'].astype(np.int64), columns['isTOA'].astype(np.int64))
+    accepted = columns['valid'] & (columns['frameSize'] == 4*words) & (part >= 0)
+    rejected = int(np.count_nonzero(~accepted))
+    cols = columns[accepted]
+    part = part[accepted]
+
+    # sort by acquisition then part, records stay in file order within a pair
+    order = np.lexsort((cols['record'], part, cols['acqNum']))
+    acq = cols['acqNum'][order]
+    part = part[order]
+    records = cols['record'][order]
+
+    # keep the first record of every (acquisition, part)
+    first = np.ones(acq.shape[0], dtype=bool)
+    first[1:] = (acq[1:] != acq[:-1]) | (part[1:] != part[:-1])
+    duplicates = int(np.count_nonzero(~first))
+    acq, part, records = acq[first], part[first], records[first]
+
+    acqNums, acqIdx = np.unique(acq, return_inverse=True)
+    slots = np.full((acqNums.shape[0], numParts), -1, dtype=np.int64)
+    slots[acqIdx, part] = records
+    found = slots >= 0
+    complete = found.all(axis=1)
+
+    incomplete = np.empty(np.count_nonzero(~complete), dtype=INCOMPLETE_DTYPE)
+    incomplete['acqNum'] = acqNums[~complete]
+    incomplete['partsMask'] = (found[~complete] * (1 << np.arange(numParts))).sum(axis=1)
+
+    slots = slots[complete]
+    frames = gatherFrames(dataFile, slots, words) if gather else None
+
+    return AssembledFrames(frames, acqNums[complete], slots, incomplete, duplicates, rejected)
+
+
+def _maskImages(images, camera):
+    mask = int(camera.bitMask)
+    if mask != 0xFFFF:
+        images = np.bitwise_and(images, mask)
+    return images
+
+
+def _singleRecordFrames(dataFile, cameraType, channel, camera):
+    """returns (columns, frameSize), the header columns of the records that
+    hold a whole frame of an ePixHr10kT or ePix100a/p/10ka run"""
+    columns = decodeHeaders(dataFile, cameraType, channel)
+    if cameraType == 'ePixHr10kT':
+        frameSize = 56076
+    else:
+        frameSize = 32 + camera.sensorHeight * camera._superRowSizeInBytes
+        # frames may carry a footer, use the most common size that holds an image
+        sizes = columns['frameSize'][columns['frameSize'] >= frameSize]
+        if sizes.shape[0]:
+            values, counts = np.unique(sizes, return_counts=True)
+            frameSize = int(values[np.argmax(counts)])
+    return columns[columns['frameSize'] == frameSize], frameSize
+
+
+def _camera(cameraType, camera):
+    if camera is None:
+        # imported here, the camera module pulls in the GUI side of the package
+        import ePixViewer.Cameras as cameras
+        camera = cameras.Camera(cameraType = cameraType)
+    return camera
+
+
+def countImages(dataFile, cameraType = 'ePixHr10kT', channel = None, camera = None):
+    """number of images iterImages yields for a run, from the headers only"""
+    if not isinstance(dataFile, DataFile):
+        dataFile = DataFile(dataFile)
+    if cameraType == 'ePixHr10kTBatcher':
+        batcherFile = BatcherFile(dataFile, channel)
+        return len(batcherFile.select(batcherFile.dataDest()))
+    elif cameraType in ('ePixHr10kT', 'ePix100a', 'ePix100p', 'ePix10ka'):
+        return _singleRecordFrames(dataFile, cameraType, channel, _camera(cameraType, camera))[0].shape[0]
+    elif cameraType in ASSEMBLY_LAYOUTS:
+        return len(assembleFrames(dataFile, cameraType, channel, gather=False).acqNums)
+    raise ValueError("No batched descrambler for camera %s" % (cameraType))
+
+
+def imageRanges(numImages, numChunks):
+    """splits numImages in numChunks contiguous (start, stop) ranges"""
+    bounds = np.linspace(0, numImages, numChunks+1).astype(np.int64)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def iterImages(dataFile, cameraType = 'ePixHr10kT', channel = None, batchSize = 256, camera = None, start = 0, stop = None):
+    """yields (acqNums, images) batches of descrambled images of a run, images
+    is (B, sensorHeight, sensorWidth) with the camera bit mask applied. start
+    and stop select a range of the images of the run (to split it between
+    processes, see countImages)"""
+    camera = _camera(cameraType, camera)
+    if not isinstance(dataFile, DataFile):
+        dataFile = DataFile(dataFile)
+
+    if cameraType == 'ePixHr10kTBatcher':
+        batcherFile = BatcherFile(dataFile, channel)
+        frames = batcherFile.frames(batcherFile.dataDest(), dtype=np.uint16)[start:stop]
+        for first in range(0, frames.shape[0], batchSize):
+            raw = frames[first:first+batchSize]
+            acqNums = raw[:, 2].astype(np.uint32) | (raw[:, 3].astype(np.uint32) << 16)
+            # hardware descrambled, the first row is not valid
+            yield acqNums, _maskImages(raw.reshape(raw.shape[0], -1, 384)[:, 1:, :], camera)
+
+    elif cameraType in ('ePixHr10kT', 'ePix100a', 'ePix100p', 'ePix10ka'):
+        columns, frameSize = _singleRecordFrames(dataFile, cameraType, channel, camera)
+        columns = columns[start:stop]
+        for first in range(0, columns.shape[0], batchSize):
+            cols = columns[first:first+batchSize]
+            raw = gatherBytes(dataFile.data, dataFile.offsets[cols['record']], frameSize)
+            if cameraType == 'ePixHr10kT':
+                images = np.empty((cols.shape[0], camera.sensorHeight, camera.sensorWidth), dtype=np.uint16)
+                camera._descrambleEpixHR10kTImageInto(raw.view('<u2')[:, 6:28038], images)
+            else:
+                images = camera._descrambleEPix100aImage(raw)
+            yield cols['acqNum'], _maskImages(images, camera)
+
+    elif cameraType in ASSEMBLY_LAYOUTS:
+        # frames are gathered batch by batch to bound the memory used
+        assembled = assembleFrames(dataFile, cameraType, channel, gather=False)
+        words = ASSEMBLY_LAYOUTS[cameraType][1]
+        if cameraType == 'Tixel48x48':
+            descramble = camera._descrambleTixel48x48ImageBatch
+        elif cameraType == 'Cpix2':
+            descramble = camera._descrambleCpix2ImageBatch
+        elif cameraType == 'ePixM32Array':
+            descramble = camera._descrambleEpixM32ImageBatch
+        elif cameraType == 'HrAdc32x32':
+            descramble = lambda stack: camera._quadrantsToImages(stack, 32, 32)
+        else:
+            raise ValueError("No batched descrambler for camera %s" % (cameraType))
+        records, acqNums = assembled.records[start:stop], assembled.acqNums[start:stop]
+        for first in range(0, records.shape[0], batchSize):
+            images = descramble(gatherFrames(dataFile, records[first:first+batchSize], words))
+            yield acqNums[first:first+batchSize], _maskImages(images, camera)
+
+    else:
+        raise ValueError("No batched descrambler for camera %s" % (cameraType))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : offline batcher v1 splitter
+#-----------------------------------------------------------------------------
+# File       : batcher.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Splits the batcher v1 super frames stored in a rogue data file into their
+# sub frames, the offline equivalent of rogue.protocols.batcher.SplitterV1.
+#
+# Super frame layout (little endian):
+#   header : byte 0 = version (bits 3:0) and width (bits 7:4), the header is
+#            2**(width+1) bytes long
+#   sub frame payload, padded to a multiple of the header size
+#   sub frame tail, max(8, header size) bytes long:
+#            uint32 size, uint8 dest, uint8 first user, uint8 last user
+#   ... repeated for every sub frame
+# The sub frames can only be found from the end of the super frame, the
+# tails of all super frames are walked together with numpy so the number
+# of python iterations is the number of sub frames per super frame.
+#
+# With LCLS-II timing the super frame carries the timing event header
+# (see TIMING_HEADER_DTYPE) and the camera data as separate sub frames.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+
+BATCHER_VERSION = 1
+
+# one entry per sub frame, offset is the byte offset of the payload in the file
+SUBFRAME_DTYPE = np.dtype([
+    ('record', '<i8'),
+    ('offset', '<i8'),
+    ('size',   '<i8'),
+    ('dest',   'u1'),
+    ('fUser',  'u1'),
+    ('lUser',  'u1'),
+])
+
+# LCLS-II timing event header
+#   bytes  0-7  : pulse id (bits 55:0)
+#   bytes  8-15 : time stamp
+#   bytes 16-17 : partitions
+#   bytes 18-19 : trigger info
+#   bytes 20-23 : count (bits 23:0), version (bits 31:24)
+TIMING_HEADER_SIZE = 24
+TIMING_HEADER_DTYPE = np.dtype([
+    ('pulseId',     '<u8'),
+    ('timeStamp',   '<u8'),
+    ('partitions',  '<u2'),
+    ('triggerInfo', '<u2'),
+    ('count',       '<u4'),
+    ('version',     'u1'),
+])
+
+
+def _readU32(data, pos):
+    """reads one little endian uint32 at each byte position of pos"""
+    b = data[pos[:, None] + np.arange(4)].astype(np.uint32)
+    return b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16) | (b[:, 3] << 24)
+
+
+def splitSuperFrames(data, offsets, sizes, records=None):
+    """splits the super frames found at offsets (sizes in bytes) of data
+
+    returns (subFrames, badRecords): a SUBFRAME_DTYPE array in file order and
+    the records that are not valid batcher v1 super frames. records gives the
+    record number stored in the sub frames (default 0..len(offsets)-1).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes   = np.asarray(sizes, dtype=np.int64)
+    if records is None:
+        records = np.arange(offsets.shape[0])
+    num = offsets.shape[0]
+
+    first      = data[offsets].astype(np.int64) if num else np.zeros(0, dtype=np.int64)
+    version    = first & 0xF
+    headerSize = np.left_shift(2, first >> 4)
+    tailSize   = np.maximum(headerSize, 8)
+    start      = offsets + headerSize
+    end        = offsets + sizes
+
+    bad    = (version != BATCHER_VERSION) | (sizes < headerSize + tailSize)
+    active = ~bad
+    pieces = []
+
+    while np.any(active):
+        idx  = np.nonzero(active)[0]
+        hs   = headerSize[idx]
+        tail = end[idx] - tailSize[idx]
+        size = _readU32(data, tail).astype(np.int64)
+        payload = tail - ((size + hs - 1) // hs) * hs
+
+        ok = payload >= start[idx]
+        bad[idx[~ok]]    = True
+        active[idx[~ok]] = False
+        idx, tail, size, payload = idx[ok], tail[ok], size[ok], payload[ok]
+
+        sub = np.empty(idx.shape[0], dtype=SUBFRAME_DTYPE)
+        sub['record'] = records[idx]
+        sub['offset'] = payload
+        sub['size']   = size
+        sub['dest']   = data[tail + 4]
+        sub['fUser']  = data[tail + 5]
+        sub['lUser']  = data[tail + 6]
+        pieces.append(sub)
+
+        end[idx] = payload
+        remaining = end[idx] - start[idx]
+        # left over bytes too small to hold a tail
+        short = (remaining > 0) & (remaining < tailSize[idx])
+        bad[idx[short]] = True
+        active[idx] = remaining >= tailSize[idx]
+
+    if len(pieces) == 0:
+        subFrames = np.zeros(0, dtype=SUBFRAME_DTYPE)
+    else:
+        subFrames = np.concatenate(pieces)
+        subFrames = subFrames[np.lexsort((subFrames['offset'], subFrames['record']))]
+
+    return subFrames, records[bad]
+
+
+def decodeTimingHeaders(raw):
+    """decodes a (N, >=24) uint8 array of timing headers into TIMING_HEADER_DTYPE"""
+    raw = np.ascontiguousarray(raw[:, :TIMING_HEADER_SIZE])
+    out = np.empty(raw.shape[0], dtype=TIMING_HEADER_DTYPE)
+    out['pulseId']     = raw[:, 0:8].view('<u8')[:, 0] & 0x00FFFFFFFFFFFFFF
+    out['timeStamp']   = raw[:, 8:16].view('<u8')[:, 0]
+    out['partitions']  = raw[:, 16:18].view('<u2')[:, 0]
+    out['triggerInfo'] = raw[:, 18:20].view('<u2')[:, 0]
+    out['count']       = raw[:, 20:24].view('<u4')[:, 0] & 0x00FFFFFF
+    out['version']     = raw[:, 23]
+    return out
+
+
+################################################################################
+################################################################################
+#   Batcher file class
+#
+################################################################################
+class BatcherFile():
+    """sub frame index of the batcher super frames of a rogue data file
+
+    dataFile is a DataFile or a file name, channel selects the file channel
+    holding the super frames (all channels if None).
+    """
+
+    def __init__(self, dataFile, channel=None):
+        if not isinstance(dataFile, DataFile):
+            dataFile = DataFile(dataFile)
+        self.dataFile = dataFile
+        self.data = dataFile.data
+        indices = dataFile.select(channel)
+        self.subFrames, self.badRecords = splitSuperFrames(self.data, dataFile.offsets[indices], dataFile.sizes[indices], indices)
+
+    def __len__(self):
+        return self.subFrames.shape[0]
+
+    def dests(self):
+        """returns the destinations found in the file"""
+        return np.unique(self.subFrames['dest'])
+
+    def select(self, dest=None):
+        """returns the indices of the sub frames of a destination (all if None)"""
+        if dest is None:
+            return np.arange(len(self))
+        return np.nonzero(self.subFrames['dest'] == dest)[0]
+
+    def subFrame(self, index, dtype=np.uint8):
+        """returns the payload of a sub frame as a view of the mapped file"""
+        start = self.subFrames['offset'][index]
+        return self.data[start:start+self.subFrames['size'][index]].view(dtype)
+
+    def frames(self, dest, dtype=np.uint8):
+        """returns the sub frames of dest as a (numFrames, frameSize) array
+
+        All sub frames of dest must have the same size. The result is a view
+        of the mapped file when the sub frames are evenly spaced (fixed size
+        super frames), a copy otherwise.
+        """
+        sub = self.subFrames[self.select(dest)]
+        if sub.shape[0] == 0:
+            return np.zeros((0, 0), dtype=dtype)
+        if np.any(sub['size'] != sub['size'][0]):
+            raise ValueError("Sub frames of dest %d do not have the same size" % (dest))
+        return gatherBytes(self.data, sub['offset'], int(sub['size'][0])).view(dtype)
+
+    def timingHeaders(self, dest):
+        """returns the timing headers carried by the sub frames of dest"""
+        if dest is None:
+            # select(None) would decode the camera data as timing headers too
+            raise ValueError("No timing destination given")
+        sub = self.subFrames[self.select(dest)]
+        if np.any(sub['size'] < TIMING_HEADER_SIZE):
+            raise ValueError("Sub frames of dest %d are too short for a timing header" % (dest))
+        return decodeTimingHeaders(gatherBytes(self.data, sub['offset'], TIMING_HEADER_SIZE))
+
+    def timingDest(self, dataDest=None):
+        """returns the destination carrying the timing headers, the destination
+        with the smallest sub frames that can hold one (other than dataDest),
+        None if there is none"""
+        sub = self.subFrames[(self.subFrames['dest'] != dataDest) & (self.subFrames['size'] >= TIMING_HEADER_SIZE)]
+        if sub.shape[0] == 0:
+            return None
+        return int(sub['dest'][np.argmin(sub['size'])])
+
+    def dataDest(self):
+        """returns the destination carrying the largest sub frames (camera data)"""
+        if len(self) == 0:
+            return None
+        return int(self.subFrames['dest'][np.argmax(self.subFrames['size'])])
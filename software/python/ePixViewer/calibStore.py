@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : calibration constant store
+#-----------------------------------------------------------------------------
+# File       : calibStore.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# On disk store of the per ASIC calibration maps (pedestal, noise, gain,
+# bad pixels). The maps are saved as .npy files, loaded memory mapped, and
+# keyed by a fingerprint of the configuration they were taken with (the
+# yml files loaded by the InitASIC routine, the ASIC clock and the pixel
+# bitmap) and by a time validity window, so the viewer and the converters
+# pick up the constants that match the current setup instead of deriving
+# them again.
+#
+# Layout:
+#   <directory>/index.json                             list of the entries
+#   <directory>/<fingerprint>/<validFrom>_<id>_asic<n>_<map>.npy
+#
+# validFrom is in microseconds and id is random, so two saves never share a
+# file.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import uuid
+import numpy as np
+
+CALIB_MAPS = ('pedestal', 'noise', 'gain', 'badPixels')
+
+# EpixHR device attributes holding the yml files of the InitASIC routine
+INIT_ASIC_FILE_ATTRS = (
+    'filenameMMCM',
+    'filenamePowerSupply',
+    'filenameRegisterControl',
+    'filenameASIC0',
+    'filenameASIC1',
+    'filenameASIC2',
+    'filenameASIC3',
+    'filenameSSP',
+    'filenamePacketReg',
+    'filenameTriggerReg',
+)
+
+
+def clockFromFilename(filename):
+    """ASIC clock in MHz encoded in a yml file name (ePixHr10kT_MMCM_320MHz.yml), None if absent"""
+    match = re.search(r'_(\d+)MHz', os.path.basename(str(filename)))
+    return None if match is None else int(match.group(1))
+
+
+def configFingerprint(ymlFiles = (), routine = None, clockMHz = None, pixelBitmap = None):
+    """returns the fingerprint of a configuration
+
+    ymlFiles are the yml presets loaded (their content is hashed, in the
+    given order), routine the InitASIC routine number, clockMHz the ASIC
+    clock (taken from the MMCM file name if None) and pixelBitmap the pixel
+    bitmap csv file or array.
+    """
+    sha = hashlib.sha1()
+    sha.update(('routine=%s;' % (routine)).encode())
+    if clockMHz is None:
+        for filename in ymlFiles:
+            if 'MMCM' in os.path.basename(str(filename)):
+                clockMHz = clockFromFilename(filename)
+    sha.update(('clock=%s;' % (clockMHz)).encode())
+    for filename in ymlFiles:
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    if pixelBitmap is not None:
+        if isinstance(pixelBitmap, (str, bytes, os.PathLike)):
+            pixelBitmap = np.genfromtxt(pixelBitmap, delimiter=',', dtype='uint16')
+        sha.update(np.ascontiguousarray(pixelBitmap, dtype=np.uint16).tobytes())
+    return sha.hexdigest()[:16]
+
+
+def deviceFingerprint(dev, routine = None, pixelBitmap = None):
+    """fingerprint of the yml files last loaded by the InitASIC command of an
+    EpixHR device"""
+    ymlFiles = [getattr(dev, name) for name in INIT_ASIC_FILE_ATTRS if hasattr(dev, name)]
+    return configFingerprint(ymlFiles, routine = routine, pixelBitmap = pixelBitmap)
+
+
+################################################################################
+################################################################################
+#   Calibration store class
+#
+################################################################################
+class CalibStore():
+    """directory of calibration maps keyed by fingerprint, ASIC and validity window"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _indexFile(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def entries(self):
+        """returns the list of entries of the store"""
+        try:
+            with open(self._indexFile(), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def save(self, fingerprint, asic, maps, validFrom = None, validTo = None, meta = None):
+        """saves the maps (dictionary name: array, names from CALIB_MAPS) of an
+        ASIC, valid from validFrom (now if None) to validTo (open if None)"""
+        if validFrom is None:
+            validFrom = time.time()
+        folder = os.path.join(self.directory, fingerprint)
+        os.makedirs(folder, exist_ok=True)
+        stamp = '%d_%s' % (int(validFrom * 1e6), uuid.uuid4().hex[:8])
+        files = {}
+        for name, array in maps.items():
+            if name not in CALIB_MAPS:
+                raise ValueError("Unknown calibration map %s" % (name))
+            files[name] = os.path.join(fingerprint, '%s_asic%d_%s.npy' % (stamp, asic, name))
+            np.save(os.path.join(self.directory, files[name]), np.ascontiguousarray(array))
+        entry = {
+            'fingerprint' : fingerprint,
+            'asic'        : int(asic),
+            'validFrom'   : float(validFrom),
+            'validTo'     : None if validTo is None else float(validTo),
+            'maps'        : files,
+            'meta'        : {} if meta is None else meta,
+        }
+        with self._lock:
+            entries = self.entries()
+            entries.append(entry)
+            # replaced in one step so a reader never sees a partial index
+            tmp = self._indexFile() + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(entries, f, indent=1)
+            os.replace(tmp, self._indexFile())
+        return entry
+
+    def find(self, fingerprint, asic, when = None):
+        """returns the newest entry of an ASIC valid at time when (now if None), None if there is none"""
+        if when is None:
+            when = time.time()
+        match = None
+        for entry in self.entries():
+            if entry['fingerprint'] != fingerprint or entry['asic'] != asic:
+                continue
+            if entry['validFrom'] > when or (entry['validTo'] is not None and entry['validTo'] <= when):
+                continue
+            if match is None or entry['validFrom'] >= match['validFrom']:
+                match = entry
+        return match
+
+    def load(self, fingerprint, asic, when = None, mmap = True):
+        """returns the maps (dictionary name: array) of the matching entry,
+        memory mapped unless mmap is False, None if no entry matches"""
+        entry = self.find(fingerprint, asic, when)
+        if entry is None:
+            return None
+        mode = 'r' if mmap else None
+        return {name: np.load(os.path.join(self.directory, filename), mmap_mode=mode) for name, filename in entry['maps'].items()}
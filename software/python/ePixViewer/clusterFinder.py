@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : photon cluster finder
+#-----------------------------------------------------------------------------
+# File       : clusterFinder.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Photon finding on batches of corrected frames. The pixels above the
+# neighbour threshold are taken as a sparse list, the links between
+# adjacent pixels of the list are found with sorted index lookups and the
+# connected clusters are labelled by min label propagation with pointer
+# jumping, all in numpy over the whole batch. Clusters that hold at least
+# one pixel above the seed threshold are kept and reduced with bincount
+# to a compact table (frame, sum, size, centroid, maximum).
+#
+# clusterRun splits a run between a pool of processes that read, correct
+# and reduce their part of the run, so only the cluster tables come back.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import multiprocessing
+import numpy as np
+from ePixViewer.assembler import iterImages, countImages, imageRanges
+from ePixViewer.correction import CorrectionPipeline
+
+CLUSTER_DTYPE = np.dtype([
+    ('frame',    '<u4'),   # index of the frame in the run
+    ('acqNum',   '<u4'),
+    ('sum',      '<f4'),
+    ('size',     '<u2'),
+    ('row',      '<f4'),   # centroid weighted by the pixel values
+    ('col',      '<f4'),
+    ('maxValue', '<f4'),
+])
+
+# (row, col) offsets linking a pixel to the neighbours that follow it in the image
+_NEIGHBOURS = {
+    4 : ((0, 1), (1, 0)),
+    8 : ((0, 1), (1, -1), (1, 0), (1, 1)),
+}
+
+
+def labelPixels(frame, row, col, shape, connectivity = 8):
+    """returns the cluster label (0..numClusters-1) of each of the sparse
+    pixels given by frame, row and col (sorted by frame, row, col) of
+    (rows, cols) images, and the number of clusters"""
+    rows, cols = shape
+    num = frame.shape[0]
+    if num == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    key = (frame.astype(np.int64) * rows + row) * cols + col
+    src, dst = [], []
+    for dr, dc in _NEIGHBOURS[connectivity]:
+        r, c = row + dr, col + dc
+        inside = (r < rows) & (c >= 0) & (c < cols)
+        nkey = key + dr * cols + dc
+        pos = np.minimum(np.searchsorted(key, nkey), num - 1)
+        linked = inside & (key[pos] == nkey)
+        src.append(np.flatnonzero(linked))
+        dst.append(pos[linked])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+
+    # every pixel takes the lowest label of its cluster
+    labels = np.arange(num)
+    while True:
+        new = labels.copy()
+        np.minimum.at(new, src, labels[dst])
+        np.minimum.at(new, dst, labels[src])
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    roots, labels = np.unique(labels, return_inverse=True)
+    return labels.reshape(-1), roots.shape[0]
+
+
+def findClusters(images, seedThreshold, neighbourThreshold = None, connectivity = 8, acqNums = None, firstFrame = 0):
+    """returns the CLUSTER_DTYPE table of the clusters of (N, rows, cols)
+    corrected images, sorted by frame. Pixels above neighbourThreshold
+    (seedThreshold if None) are clustered, the clusters without a pixel
+    above seedThreshold are dropped."""
+    images = np.asarray(images)
+    if images.ndim == 2:
+        images = images[None]
+    if neighbourThreshold is None:
+        neighbourThreshold = seedThreshold
+    frame, row, col = np.nonzero(images > neighbourThreshold)
+    values = images[frame, row, col].astype(np.float32)
+    labels, numClusters = labelPixels(frame, row, col, images.shape[1:], connectivity)
+    if numClusters == 0:
+        return np.zeros(0, dtype=CLUSTER_DTYPE)
+
+    maxValue = np.full(numClusters, -np.inf, dtype=np.float32)
+    np.maximum.at(maxValue, labels, values)
+    keep = maxValue > seedThreshold
+    total = np.bincount(labels, values, numClusters)
+    table = np.zeros(numClusters, dtype=CLUSTER_DTYPE)
+    # the label of a cluster is the index of its first pixel, the pixels are sorted by frame
+    table['frame'] = frame[np.unique(labels, return_index=True)[1]]
+    table['sum'] = total
+    table['size'] = np.minimum(np.bincount(labels, minlength=numClusters), 0xFFFF)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['row'] = np.bincount(labels, values * row, numClusters) / total
+        table['col'] = np.bincount(labels, values * col, numClusters) / total
+    table['maxValue'] = maxValue
+    table = table[keep]
+    if acqNums is not None:
+        table['acqNum'] = np.asarray(acqNums)[table['frame']]
+    table['frame'] += firstFrame
+    return table
+
+
+def clustersPerFrame(table, numFrames):
+    """(numFrames+1) offsets of the clusters of every frame in a table sorted by frame"""
+    return np.searchsorted(table['frame'], np.arange(numFrames + 1)).astype(np.int64)
+
+
+def _clusterWorker(task):
+    filename, cameraType, channel, start, stop, batchSize, correction, kwargs = task
+    pipeline = CorrectionPipeline(**correction)
+    tables = []
+    frame = start
+    for acqNums, images in iterImages(filename, cameraType, channel, batchSize, start=start, stop=stop):
+        tables.append(findClusters(pipeline.process(images), acqNums=acqNums, firstFrame=frame, **kwargs))
+        frame += images.shape[0]
+    return np.concatenate(tables) if tables else np.zeros(0, dtype=CLUSTER_DTYPE)
+
+
+def clusterRun(filename, cameraType = 'ePixHr10kT', channel = None, processes = None, batchSize = 256,
+               pedestal = None, gain = None, mask = None, commonMode = None, **kwargs):
+    """finds the clusters of the images of a run with a pool of processes,
+    the images are corrected with pedestal, gain, mask and commonMode (see
+    CorrectionPipeline), kwargs are the findClusters thresholds. Returns the
+    CLUSTER_DTYPE table of the run sorted by frame."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    correction = {'pedestal': pedestal, 'gain': gain, 'mask': mask, 'commonMode': commonMode}
+    ranges = imageRanges(countImages(filename, cameraType, channel), processes)
+    tasks = [(filename, cameraType, channel, start, stop, batchSize, correction, kwargs) for start, stop in ranges]
+    if len(tasks) <= 1:
+        parts = [_clusterWorker(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+            parts = pool.map(_clusterWorker, tasks)
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=CLUSTER_DTYPE)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : compressed data files
+#-----------------------------------------------------------------------------
+# File       : compressedFile.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Format, codecs and reader of the compressed data files written by the
+# epix_hr_single_10k CompressedStreamWriter. The records are the rogue
+# StreamWriter records (uint32 size, uint32 flags, payload), grouped in
+# blocks that are compressed independently:
+#
+#   block  : BLOCK_HEADER then compressedSize bytes, the block decompresses
+#            to numRecords complete records (rawSize bytes)
+#   index  : BLOCK_INDEX_DTYPE entry of every block, after the last block
+#   footer : FOOTER, the position of the index, at the end of the file
+#
+# A file without footer (writer not closed) is indexed by walking the block
+# headers. Blocks are decompressed on demand, so any record can be read
+# without decompressing the whole file, and toDat converts a file back to
+# a plain .dat file for the existing tools. CompressedFileWriter compresses
+# the blocks in a thread pool and writes them in order from its own thread.
+#
+# Codecs are registered by name with a one byte id stored in every block,
+# zlib and lzma from the standard library are built in (registerCodec adds
+# others). With the shuffle flag the bytes of the block are split in the
+# low and high bytes of the uint16 words before compression, which
+# compresses detector data much better.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import zlib
+import lzma
+import queue
+import struct
+import threading
+import concurrent.futures
+from collections import OrderedDict
+import numpy as np
+from ePixViewer.headers import RECORD_HEADER_DTYPE
+
+# magic, codec id, block flags, reserved, numRecords, rawSize, compressedSize
+BLOCK_HEADER = struct.Struct('<4sBBHIIQ')
+BLOCK_MAGIC = b'EPXB'
+BLOCK_SHUFFLE = 0x1
+
+# magic, index offset, number of blocks
+FOOTER = struct.Struct('<4sQQ')
+FOOTER_MAGIC = b'EPXI'
+
+BLOCK_INDEX_DTYPE = np.dtype([
+    ('offset',      '<u8'),   # file offset of the block header
+    ('firstRecord', '<u8'),   # index of the first record of the block
+    ('numRecords',  '<u4'),
+    ('rawSize',     '<u4'),
+])
+
+# name : (id, compress(data, level), decompress(data))
+CODECS = {}
+
+
+def registerCodec(name, codecId, compress, decompress):
+    """adds a codec, compress(data, level) and decompress(data) return bytes"""
+    for other, (otherId, _, _) in CODECS.items():
+        if otherId == codecId and other != name:
+            raise ValueError("Codec id %d already used by %s" % (codecId, other))
+    CODECS[name] = (codecId, compress, decompress)
+
+
+def codecById(codecId):
+    for name, codec in CODECS.items():
+        if codec[0] == codecId:
+            return name, codec
+    raise ValueError("Unknown codec id %d" % (codecId))
+
+
+registerCodec('none', 0, lambda data, level: bytes(data), bytes)
+registerCodec('zlib', 1, lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress)
+registerCodec('lzma', 2, lambda data, level: lzma.compress(data, preset=0 if level is None else level), lzma.decompress)
+
+
+def shuffleBytes(data):
+    """splits the uint16 words of data in their low then high bytes, an odd
+    last byte stays at the end"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    even = raw.shape[0] & ~1
+    return np.concatenate((raw[:even].reshape(-1, 2).T.ravel(), raw[even:])).tobytes()
+
+
+def unshuffleBytes(data):
+    raw = np.frombuffer(data, dtype=np.uint8)
+    even = raw.shape[0] & ~1
+    return np.concatenate((raw[:even].reshape(2, -1).T.ravel(), raw[even:])).tobytes()
+
+
+def encodeBlock(raw, numRecords, codec = 'zlib', level = None, shuffle = False):
+    """returns the block (header and compressed data) of raw records"""
+    codecId, compress, _ = CODECS[codec]
+    data = compress(shuffleBytes(raw) if shuffle else bytes(raw), level)
+    flags = BLOCK_SHUFFLE if shuffle else 0
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, codecId, flags, 0, numRecords, len(raw), len(data)) + data
+
+
+def decodeBlock(header, data):
+    """returns the raw records of a block from its header fields and compressed data"""
+    magic, codecId, flags, _, numRecords, rawSize, compressedSize = header
+    raw = codecById(codecId)[1][2](bytes(data))
+    if flags & BLOCK_SHUFFLE:
+        raw = unshuffleBytes(raw)
+    if len(raw) != rawSize:
+        raise ValueError("Block decompressed to %d bytes, expected %d" % (len(raw), rawSize))
+    return raw
+
+
+def recordOffsets(raw, numRecords):
+    """returns the byte offset of every record of the raw records of a block"""
+    offsets = np.zeros(numRecords, dtype=np.int64)
+    pos = 0
+    for i in range(numRecords):
+        offsets[i] = pos
+        pos += 4 + struct.unpack_from('<I', raw, pos)[0]
+    return offsets
+
+
+################################################################################
+################################################################################
+#   Compressed file writer class
+#
+################################################################################
+class CompressedFileWriter():
+    """writes records to a compressed data file
+
+    Records are appended to the current block, full blocks (blockSize raw
+    bytes) are compressed by a pool of threads and written in order by a
+    writer thread. At most 2*threads blocks are pending. When the disk or
+    the compression does not keep up, addRecord waits if blocking is set
+    (offline conversions, nothing is lost), otherwise the full block is
+    dropped and its records counted in droppedRecords (stream threads,
+    which must not stall). The records of a dropped block are not numbered.
+    """
+
+    def __init__(self, filename, codec = 'zlib', level = None, shuffle = True, blockSize = 4*1024*1024, threads = 4, blocking = True):
+        if codec not in CODECS:
+            raise ValueError("Unknown codec %s" % (codec))
+        self.filename = filename
+        self.codec = codec
+        self.level = level
+        self.shuffle = shuffle
+        self.blockSize = blockSize
+        self.blocking = blocking
+        self.numRecords = 0
+        self.droppedRecords = 0
+        self.rawBytes = 0
+        self.writtenBytes = 0
+        self._block = bytearray()
+        self._blockRecords = 0
+        self._index = []
+        self._error = None
+        self._lock = threading.Lock()
+        self._file = open(filename, 'wb')
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        self._queue = queue.Queue(maxsize=2*threads)
+        self._thread = threading.Thread(target=self._writeBlocks, daemon=True)
+        self._thread.start()
+
+    def addRecord(self, flags, payload):
+        """appends a record, flags is the record flags word (channel 31:24).
+        Returns False if the block it completed was dropped (not blocking),
+        droppedRecords counts the records of the dropped blocks."""
+        if self._error is not None:
+            raise self._error
+        with self._lock:
+            self._block += struct.pack('<II', len(payload) + 4, flags)
+            self._block += payload
+            self._blockRecords += 1
+            self.numRecords += 1
+            if len(self._block) >= self.blockSize:
+                return self._flushBlock(wait = self.blocking)
+        return True
+
+    def _flushBlock(self, wait = True):
+        # called with the lock held, so the blocks are queued in order
+        if self._blockRecords == 0:
+            return True
+        raw, numRecords = self._block, self._blockRecords
+        self._block = bytearray()
+        self._blockRecords = 0
+        if not wait and self._queue.full():
+            # blocks are only queued under the lock, the queue cannot fill up after the check
+            self.numRecords -= numRecords
+            self.droppedRecords += numRecords
+            return False
+        firstRecord = self.numRecords - numRecords
+        future = self._pool.submit(encodeBlock, raw, numRecords, self.codec, self.level, self.shuffle)
+        self._queue.put((future, firstRecord, numRecords, len(raw)))
+        return True
+
+    def _writeBlocks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, firstRecord, numRecords, rawSize = item
+            try:
+                block = future.result()
+                offset = self._file.tell()
+                self._file.write(block)
+            except Exception as e:
+                self._error = e
+                continue
+            self._index.append((offset, firstRecord, numRecords, rawSize))
+            self.rawBytes += rawSize
+            self.writtenBytes += len(block)
+
+    def flush(self):
+        """queues the current partial block"""
+        with self._lock:
+            self._flushBlock()
+
+    def close(self):
+        """writes the pending blocks, the block index and the footer"""
+        if self._file is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._pool.shutdown()
+        index = np.array(self._index, dtype=BLOCK_INDEX_DTYPE)
+        indexOffset = self._file.tell()
+        self._file.write(index.tobytes())
+        self._file.write(FOOTER.pack(FOOTER_MAGIC, indexOffset, index.shape[0]))
+        self._file.close()
+        self._file = None
+        if self._error is not None:
+            raise self._error
+
+    def compressionRatio(self):
+        return self.rawBytes / max(self.writtenBytes, 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+################################################################################
+################################################################################
+#   Compressed data file class
+#
+################################################################################
+class CompressedDataFile():
+    """reads a compressed data file block by block
+
+    blocks is the BLOCK_INDEX_DTYPE index, truncated is True if the file
+    ends with an incomplete block (the blocks before it are readable). The
+    last cacheBlocks decompressed blocks are kept.
+    """
+
+    def __init__(self, filename, cacheBlocks = 4):
+        self.filename = filename
+        self.cacheBlocks = cacheBlocks
+        self.truncated = False
+        self._file = open(filename, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.blocks = self._readIndex()
+        if self.blocks is None:
+            self.blocks = self._scanBlocks()
+        self._firstRecords = self.blocks['firstRecord'].astype(np.int64)
+
+    def _readIndex(self):
+        if self._size < FOOTER.size:
+            return None
+        self._file.seek(self._size - FOOTER.size)
+        magic, indexOffset, numBlocks = FOOTER.unpack(self._file.read(FOOTER.size))
+        if magic != FOOTER_MAGIC or indexOffset + numBlocks * BLOCK_INDEX_DTYPE.itemsize + FOOTER.size != self._size:
+            return None
+        self._file.seek(indexOffset)
+        return np.frombuffer(self._file.read(numBlocks * BLOCK_INDEX_DTYPE.itemsize), dtype=BLOCK_INDEX_DTYPE).copy()
+
+    def _scanBlocks(self):
+        """rebuilds the index of a file that was not closed from the block headers"""
+        blocks = []
+        pos = 0
+        first = 0
+        self._file.seek(0)
+        while pos + BLOCK_HEADER.size <= self._size:
+            header = BLOCK_HEADER.unpack(self._file.read(BLOCK_HEADER.size))
+            if header[0] != BLOCK_MAGIC:
+                break
+            if pos + BLOCK_HEADER.size + header[6] > self._size:
+                self.truncated = True
+                break
+            blocks.append((pos, first, header[4], header[5]))
+            first += header[4]
+            pos += BLOCK_HEADER.size + header[6]
+            self._file.seek(pos)
+        if pos < self._size and not self.truncated:
+            self.truncated = True
+        return np.array(blocks, dtype=BLOCK_INDEX_DTYPE)
+
+    def __len__(self):
+        if self.blocks.shape[0] == 0:
+            return 0
+        return int(self.blocks['firstRecord'][-1] + self.blocks['numRecords'][-1])
+
+    def block(self, index):
+        """returns (raw records, record offsets) of a block, decompressed on demand"""
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+            self._file.seek(int(self.blocks['offset'][index]))
+            header = BLOCK_HEADER.unpack(self._file.read(BLOCK_HEADER.size))
+            data = self._file.read(header[6])
+        # decompressed outside the lock, the codecs release the GIL
+        raw = decodeBlock(header, data)
+        entry = (raw, recordOffsets(raw, header[4]))
+        with self._lock:
+            self._cache[index] = entry
+            while len(self._cache) > self.cacheBlocks:
+                self._cache.popitem(last=False)
+        return entry
+
+    def record(self, index):
+        """returns (flags, payload) of a record, payload a uint8 array"""
+        if not 0 <= index < len(self):
+            raise IndexError("Record %d out of range" % (index))
+        blockIndex = int(np.searchsorted(self._firstRecords, index, side='right') - 1)
+        raw, offsets = self.block(blockIndex)
+        pos = int(offsets[index - self._firstRecords[blockIndex]])
+        size, flags = struct.unpack_from('<II', raw, pos)
+        return flags, np.frombuffer(raw, dtype=np.uint8, count=size-4, offset=pos+RECORD_HEADER_DTYPE.itemsize)
+
+    def iterRecords(self, channel = None):
+        """yields (flags, payload) of the records, of a channel if given"""
+        for blockIndex in range(self.blocks.shape[0]):
+            raw, offsets = self.block(blockIndex)
+            for pos in offsets:
+                size, flags = struct.unpack_from('<II', raw, int(pos))
+                if channel is None or (flags >> 24) == channel:
+                    yield flags, np.frombuffer(raw, dtype=np.uint8, count=size-4, offset=int(pos)+RECORD_HEADER_DTYPE.itemsize)
+
+    def toDat(self, filename):
+        """writes the records to a plain rogue .dat file"""
+        with open(filename, 'wb') as f:
+            for blockIndex in range(self.blocks.shape[0]):
+                f.write(self.block(blockIndex)[0])
+
+    def compressionRatio(self):
+        stored = self._size if self.blocks.shape[0] else 1
+        return float(np.sum(self.blocks['rawSize'], dtype=np.int64)) / stored
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
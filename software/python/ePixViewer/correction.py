@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : image correction pipeline
+#-----------------------------------------------------------------------------
+# File       : correction.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Pedestal, common mode, gain and bad pixel corrections of descrambled
+# images. The pipeline owns float32 work buffers that are allocated once
+# per image shape, every step runs in place on them with out= ufuncs, so
+# a live frame is corrected in a single pass without new allocations and
+# the result is shared by the display, the line plots and the exports.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+# columns of an ePixHr10kT ADC bank (6 banks of 32 columns, see
+# Cameras._descrambleEpixHR10kTImageInto), the common mode is computed per
+# row of a bank
+HR10KT_BANK_COLS = 32
+
+################################################################################
+################################################################################
+#   Correction pipeline class
+#
+################################################################################
+class CorrectionPipeline():
+    """corrects (rows, cols) images, or (N, rows, cols) stacks, as
+
+        out = ((raw - pedestal) - commonMode) * gain, bad pixels set to 0
+
+    Every step is optional, the steps are enabled by setting their constants.
+    commonMode is None, 'row' (median of each row of a bank of bankCols
+    columns) or 'bank' (median of each bank). The returned image is the
+    pipeline buffer, it is overwritten by the next call to process unless an
+    out array is given.
+    """
+
+    def __init__(self, pedestal = None, gain = None, mask = None, commonMode = None, bankCols = HR10KT_BANK_COLS):
+        self.pedestal = None
+        self.gain = None
+        self.bad = None
+        self.commonMode = commonMode
+        self.bankCols = bankCols
+        self._out = None
+        self._cm = None
+        if pedestal is not None:
+            self.setPedestal(pedestal)
+        if gain is not None:
+            self.setGain(gain)
+        if mask is not None:
+            self.setMask(mask)
+
+    def setPedestal(self, pedestal):
+        self.pedestal = None if pedestal is None else np.ascontiguousarray(pedestal, dtype=np.float32)
+
+    def setGain(self, gain):
+        """gain is the per pixel (or scalar) factor applied after the pedestal and common mode"""
+        self.gain = None if gain is None else np.ascontiguousarray(gain, dtype=np.float32)
+
+    def setMask(self, mask):
+        """mask is True (or non zero) for the good pixels"""
+        self.bad = None if mask is None else np.logical_not(mask)
+
+    def setCommonMode(self, commonMode, bankCols = HR10KT_BANK_COLS):
+        self.commonMode = commonMode
+        self.bankCols = bankCols
+
+    def _buffer(self, shape):
+        if self._out is None or self._out.shape != shape:
+            self._out = np.empty(shape, dtype=np.float32)
+        return self._out
+
+    def _subtractCommonMode(self, out):
+        rows, cols = out.shape[-2:]
+        if cols % self.bankCols:
+            raise ValueError("Image width %d is not a multiple of the bank width %d" % (cols, self.bankCols))
+        # (..., rows, banks, bankCols) view of the buffer
+        banks = out.reshape(out.shape[:-1] + (cols // self.bankCols, self.bankCols))
+        if self.commonMode == 'row':
+            axis = (-1,)
+        elif self.commonMode == 'bank':
+            axis = (-3, -1)
+        else:
+            raise ValueError("Unknown common mode %s" % (self.commonMode))
+        cmShape = tuple(1 if (d - banks.ndim) in axis else n for d, n in enumerate(banks.shape))
+        if self._cm is None or self._cm.shape != cmShape:
+            self._cm = np.empty(cmShape, dtype=np.float32)
+        np.median(banks, axis=axis, out=self._cm, keepdims=True)
+        np.subtract(banks, self._cm, out=banks)
+
+    def process(self, raw, out = None):
+        """returns the corrected float32 image(s) of raw"""
+        raw = np.asarray(raw)
+        if out is None:
+            out = self._buffer(raw.shape)
+        if self.pedestal is None:
+            np.copyto(out, raw, casting='unsafe')
+        else:
+            np.subtract(raw, self.pedestal, out=out, casting='unsafe')
+        if self.commonMode is not None:
+            self._subtractCommonMode(out)
+        if self.gain is not None:
+            np.multiply(out, self.gain, out=out)
+        if self.bad is not None:
+            np.copyto(out, 0, where=self.bad)
+        return out
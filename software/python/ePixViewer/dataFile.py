@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : rogue data file access
+#-----------------------------------------------------------------------------
+# File       : dataFile.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Memory mapped access to the .dat files written by the rogue StreamWriter.
+# Each record of the file is
+#   uint32 size  (number of bytes that follow, including the flags word)
+#   uint32 flags (channel in bits 31:24, error in bits 23:16, user flags 15:0)
+#   payload
+# The file is indexed once and records are returned as numpy views of the
+# mapped file, so nothing is read from disk until the data is used.
+#
+# Runs of records of the same size (the usual camera run) are validated
+# and indexed in blocks with numpy. A corrupt header does not end the scan,
+# the scanner looks for the next plausible header and records the byte
+# range it skipped, a record cut by the end of the file (crashed run) is
+# reported with the truncated flag.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import struct
+import numpy as np
+
+RECORD_HEADER_SIZE = 8
+MAX_RECORD_SIZE = 0x10000000
+# headers that must follow a resync candidate
+RESYNC_CHAIN = 3
+
+# byte range [start, end) of the file that does not hold valid records
+SKIPPED_DTYPE = np.dtype([
+    ('start', '<i8'),
+    ('end',   '<i8'),
+])
+
+################################################################################
+################################################################################
+#   Data file class
+#
+################################################################################
+class DataFile():
+    """memory mapped rogue data file with a record index
+
+    offsets  : byte offset of the payload of each record in the file
+    sizes    : payload size of each record in bytes
+    flags    : flags word of each record
+    channels : channel of each record (flags bits 31:24)
+    skipped  : SKIPPED_DTYPE byte ranges dropped while indexing
+    truncated: True if the file ends with an incomplete record
+
+    A record header is accepted if its payload fits in the file and is at
+    most maxRecordSize bytes, its channel is one of validChannels and its
+    payload size one of validSizes (any if None), and checkRecord(data,
+    offsets, sizes) returns True for it (vectorized camera specific check,
+    see headers.cameraRecordCheck). After a bad header the scanner searches
+    forward for the next header that is valid, has no error and the channel
+    and size of a record seen before the break, and is followed by
+    RESYNC_CHAIN such headers (or the end of the file), see _resync. An
+    empty file gives an empty index with the truncated flag.
+    """
+
+    def __init__(self, filename, validChannels = None, validSizes = None, checkRecord = None, maxRecordSize = MAX_RECORD_SIZE):
+        self.filename = filename
+        if os.path.getsize(filename) == 0:
+            # np.memmap can not map an empty file (run that crashed at start)
+            self.data = np.zeros(0, dtype=np.uint8)
+        else:
+            self.data = np.memmap(filename, dtype=np.uint8, mode='r')
+        self.validChannels = None if validChannels is None else np.asarray(validChannels)
+        self.validSizes = None if validSizes is None else np.asarray(validSizes)
+        self.checkRecord = checkRecord
+        self.maxRecordSize = maxRecordSize
+        self.truncated = False
+        self._buildIndex()
+        if self.data.shape[0] == 0:
+            self.truncated = True
+
+    def _readHeaders(self, pos):
+        """returns (size, flags) of the record headers at byte positions pos"""
+        words = np.ascontiguousarray(gatherBytes(self.data, pos, RECORD_HEADER_SIZE)).view('<u4')
+        return words[:, 0].astype(np.int64), words[:, 1]
+
+    def _validHeaders(self, pos, size, flags):
+        """vectorized header check, pos the header positions, size and flags its words"""
+        valid = (size >= 4) & (size - 4 <= self.maxRecordSize) & (pos + 4 + size <= self.data.shape[0])
+        if self.validChannels is not None:
+            valid &= np.isin(flags >> 24, self.validChannels)
+        if self.validSizes is not None:
+            valid &= np.isin(size - 4, self.validSizes)
+        if self.checkRecord is not None and np.any(valid):
+            idx = np.nonzero(valid)[0]
+            valid[idx] = self.checkRecord(self.data, pos[idx] + RECORD_HEADER_SIZE, size[idx] - 4)
+        return valid
+
+    def _validHeader(self, pos, size, flag):
+        """scalar version of _validHeaders for the record by record walk"""
+        if size < 4 or size - 4 > self.maxRecordSize or pos + 4 + size > self.data.shape[0]:
+            return False
+        if self.validChannels is not None and (flag >> 24) not in self.validChannels:
+            return False
+        if self.validSizes is not None and (size - 4) not in self.validSizes:
+            return False
+        if self.checkRecord is not None:
+            return bool(self.checkRecord(self.data, np.array([pos + RECORD_HEADER_SIZE]), np.array([size - 4]))[0])
+        return True
+
+    def _fixedRun(self, pos, size):
+        """number of consecutive valid records of payload size-4 starting at pos,
+        checked in growing blocks so a clean fixed size file is indexed in a few
+        numpy calls"""
+        stride = 4 + size
+        total = 0
+        block = 64
+        while True:
+            start = pos + total*stride
+            num = min(block, (self.data.shape[0] - start) // stride)
+            if num <= 0:
+                return total
+            cand = start + stride*np.arange(num, dtype=np.int64)
+            sizes, flags = self._readHeaders(cand)
+            ok = (sizes == size) & self._validHeaders(cand, sizes, flags)
+            good = num if ok.all() else int(np.argmin(ok))
+            total += good
+            if good < num:
+                return total
+            block = min(block*8, 1 << 20)
+
+    def _resyncHeaders(self, pos, size, flags, learned):
+        """header check used after a bad header, stricter than _validHeaders:
+        the error field must be 0 and, once clean records were indexed
+        (learned is (channels, sizes) of these records), the channel and the
+        size must be ones seen before the break. Returns (valid, cut), cut the
+        plausible headers whose record is cut by the end of the file"""
+        plausible = ((flags >> 16) & 0xFF == 0) & (size >= 4) & (size - 4 <= self.maxRecordSize)
+        if learned is not None:
+            plausible &= np.isin(flags >> 24, learned[0]) & np.isin(size - 4, learned[1])
+        fits = pos + 4 + size <= self.data.shape[0]
+        valid = plausible.copy()
+        if np.any(valid):
+            valid[valid] = self._validHeaders(pos[valid], size[valid], flags[valid])
+        return valid, plausible & ~fits
+
+    def _chained(self, pos, size, flags, learned, depth = RESYNC_CHAIN):
+        """True for the candidate headers followed by depth more plausible
+        headers, one of them with the channel and size of the candidate (a
+        fixed size run or interleaved channels repeat, the words of pixel data
+        rarely do). The chain may stop early at the end of the file"""
+        fileSize = self.data.shape[0]
+        ok = np.ones(pos.shape[0], dtype=bool)
+        done = np.zeros(pos.shape[0], dtype=bool)
+        repeat = np.zeros(pos.shape[0], dtype=bool)
+        nxt = pos + 4 + size
+        for _ in range(depth):
+            # at the end of the file, or too close to it for a header
+            done |= nxt + RECORD_HEADER_SIZE > fileSize
+            live = np.nonzero(ok & ~done)[0]
+            if live.shape[0] == 0:
+                break
+            nSize, nFlags = self._readHeaders(nxt[live])
+            valid, cut = self._resyncHeaders(nxt[live], nSize, nFlags, learned)
+            ok[live] = valid | cut
+            repeat[live] |= (nSize == size[live]) & (nFlags >> 24 == flags[live] >> 24)
+            done[live] = cut
+            nxt[live] += 4 + nSize
+        return ok & repeat
+
+    def _resync(self, pos, learned = None, stride = None, window = 1 << 20):
+        """returns the position of the next plausible record header after pos,
+        None if there is none
+
+        The candidates must pass _resyncHeaders and be followed by
+        RESYNC_CHAIN plausible headers (see _chained). In each window the candidates at a
+        multiple of stride (the dominant record size, the usual case being a
+        corrupt size word in a fixed size run) from pos are preferred. If the
+        records learned before the break are not found again the search is
+        repeated without them.
+        """
+        fileSize = self.data.shape[0]
+        start = pos + 1
+        while start + RECORD_HEADER_SIZE <= fileSize:
+            stop = min(start + window, fileSize - RECORD_HEADER_SIZE + 1)
+            cand = np.arange(start, stop, dtype=np.int64)
+            b = self.data[start:stop + RECORD_HEADER_SIZE - 1].astype(np.int64)
+            n = cand.shape[0]
+            size  = b[0:n] | (b[1:n+1] << 8) | (b[2:n+2] << 16) | (b[3:n+3] << 24)
+            flags = (b[4:n+4] | (b[5:n+5] << 8) | (b[6:n+6] << 16) | (b[7:n+7] << 24)).astype(np.uint32)
+            valid, _ = self._resyncHeaders(cand, size, flags, learned)
+            idx = np.nonzero(valid)[0]
+            if idx.shape[0]:
+                if stride is not None:
+                    aligned = idx[(cand[idx] - pos) % stride == 0]
+                    found = aligned[self._chained(cand[aligned], size[aligned], flags[aligned], learned)]
+                    if found.shape[0]:
+                        return int(cand[found[0]])
+                found = idx[self._chained(cand[idx], size[idx], flags[idx], learned)]
+                if found.shape[0]:
+                    return int(cand[found[0]])
+            start = stop
+        if learned is not None:
+            return self._resync(pos, None, stride, window)
+        return None
+
+    def _buildIndex(self):
+        offsets = []
+        sizes = []
+        flags = []
+        skipped = []
+        # channels and sizes (with their record counts) of the records indexed
+        # so far, they guide the resync after a bad header
+        channels = set()
+        sizeCounts = {}
+        fileSize = self.data.shape[0]
+        pos = 0
+        while pos + RECORD_HEADER_SIZE <= fileSize:
+            size, flag = struct.unpack_from('<II', self.data, pos)
+            if not self._validHeader(pos, size, flag):
+                learned = None
+                stride = None
+                if sizeCounts:
+                    learned = (np.array(sorted(channels)), np.array(sorted(sizeCounts)))
+                    stride = 4 + 4 + max(sizeCounts, key=sizeCounts.get)
+                if np.any(self._resyncHeaders(np.array([pos]), np.array([size]), np.array([flag], dtype=np.uint32), learned)[1]):
+                    # record cut by the end of the file, not a corrupt header
+                    break
+                nxt = self._resync(pos, learned, stride)
+                if nxt is None:
+                    # last record was not completely written, or garbage up to the end
+                    break
+                skipped.append((pos, nxt))
+                pos = nxt
+                continue
+            num = 1
+            nxt = pos + 4 + size
+            if nxt + 4 <= fileSize and struct.unpack_from('<I', self.data, nxt)[0] == size:
+                num = max(self._fixedRun(pos, size), 1)
+            offsets.append(pos + RECORD_HEADER_SIZE + (4 + size)*np.arange(num, dtype=np.int64))
+            sizes.append(np.full(num, size - 4, dtype=np.int64))
+            if num == 1:
+                flags.append(np.array([flag], dtype=np.uint32))
+            else:
+                flags.append(self._readHeaders(offsets[-1] - RECORD_HEADER_SIZE)[1].copy())
+            channels.update(np.unique(flags[-1] >> 24).tolist())
+            sizeCounts[size - 4] = sizeCounts.get(size - 4, 0) + num
+            pos += num*(4 + size)
+
+        if pos < fileSize:
+            self.truncated = True
+            skipped.append((pos, fileSize))
+
+        self.offsets  = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+        self.sizes    = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+        self.flags    = np.concatenate(flags) if flags else np.zeros(0, dtype=np.uint32)
+        self.channels = (self.flags >> 24).astype(np.uint8)
+        self.skipped  = np.array(skipped, dtype=SKIPPED_DTYPE)
+
+    def skippedBytes(self):
+        """number of bytes of the file that are not part of a valid record"""
+        return int(np.sum(self.skipped['end'] - self.skipped['start']))
+
+    def __len__(self):
+        return self.offsets.shape[0]
+
+    def record(self, index, dtype=np.uint8):
+        """returns the payload of a record as a view of the mapped file"""
+        start = self.offsets[index]
+        return self.data[start:start+self.sizes[index]].view(dtype)
+
+    def select(self, channel=None):
+        """returns the indices of the records of a channel (all if None)"""
+        if channel is None:
+            return np.arange(len(self))
+        return np.nonzero(self.channels == channel)[0]
+
+    def records(self, channel=None, dtype=np.uint8):
+        """returns the records of a channel as a (numRecords, recordSize) view
+
+        All selected records must have the same size. The view is zero copy
+        when the records are evenly spaced in the file, a copy otherwise.
+        """
+        indices = self.select(channel)
+        if indices.shape[0] == 0:
+            return np.zeros((0, 0), dtype=dtype)
+        sizes = self.sizes[indices]
+        if np.any(sizes != sizes[0]):
+            raise ValueError("Records of channel %s do not have the same size" % (channel))
+        return gatherBytes(self.data, self.offsets[indices], int(sizes[0])).view(dtype)
+
+    def close(self):
+        # the mapping is released once the views handed out are gone
+        self.data = None
+
+
+def gatherBytes(data, offsets, nbytes):
+    """returns the nbytes found at each of offsets in data as a 2D uint8 array
+
+    The result is a strided view of data when the offsets are evenly spaced
+    (always the case for a single entry) and a gathered copy otherwise.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num = offsets.shape[0]
+    if num == 0:
+        return np.zeros((0, nbytes), dtype=np.uint8)
+    base = data[offsets[0]:]
+    if num == 1:
+        return base[:nbytes].reshape(1, nbytes)
+    stride = offsets[1] - offsets[0]
+    if stride >= nbytes and np.all(np.diff(offsets) == stride):
+        return np.lib.stride_tricks.as_strided(base, shape=(num, nbytes), strides=(int(stride), 1), writeable=False)
+    return data[offsets[:, None] + np.arange(nbytes)]
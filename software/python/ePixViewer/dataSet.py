@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : multi file data set
+#-----------------------------------------------------------------------------
+# File       : dataSet.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# One logical run over the .dat files it was split in on disk: the
+# segments written by the segmented writer (listed in its manifest), the
+# files of a scan (<name>_SDrst_<x>_SDclk_<y>.dat), the _refData/_testData
+# files of a reference acquisition or any glob of files. The files are
+# indexed in parallel (see dataFile.DataFile) and the records and images of
+# the segments are numbered with global indices, so the analysis does not
+# depend on how the run was split.
+#
+# Every segment has a metadata dictionary: file, the scan parameters parsed
+# from its name (name_value pairs, for example SDrst and SDclk), dataType
+# (ref/test for _refData/_testData), segment (the .<n> rollover number) and
+# the manifest entries of the file when there is a manifest (a file written
+# again after a reopen has several entries, it is indexed once and its
+# records are checked against the entries).
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import re
+import glob
+import concurrent.futures
+import numpy as np
+from ePixViewer.dataFile import DataFile
+from ePixViewer.segmentWriter import readManifest, manifestName
+from ePixViewer.assembler import iterImages, countImages
+
+# <name>_<value> pairs of the file names, the name starts with a letter
+SCAN_PARAM_RE = re.compile(r'_([A-Za-z][A-Za-z0-9]*)_(-?\d+(?:\.\d+)?)(?=_|\.|$)')
+DATA_TYPE_RE = re.compile(r'_(ref|test)Data(?=_|\.|$)')
+SEGMENT_RE = re.compile(r'\.dat\.(\d+)$')
+
+
+def parseScanParams(filename):
+    """returns the metadata found in a file name
+
+    run_SDrst_3_SDclk_12.dat -> {'SDrst': 3, 'SDclk': 12}
+    run_refData.dat          -> {'dataType': 'ref'}
+    run.dat.7                -> {'segment': 7}
+    """
+    name = os.path.basename(filename)
+    params = {}
+    for key, value in SCAN_PARAM_RE.findall(name):
+        params[key] = float(value) if '.' in value else int(value)
+    match = DATA_TYPE_RE.search(name)
+    if match is not None:
+        params['dataType'] = match.group(1)
+    match = SEGMENT_RE.search(name)
+    if match is not None:
+        params['segment'] = int(match.group(1))
+    return params
+
+
+def _naturalKey(filename):
+    # numbers compare by value so _SDclk_10 comes after _SDclk_9 and .dat.10 after .dat.9
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', filename)]
+
+
+def findSegments(source):
+    """returns (files, manifest entries of every file or None) of a source: a
+    manifest, a data file with a manifest, a glob pattern or a list of files"""
+    if isinstance(source, (list, tuple)):
+        return list(source), None
+    manifestFile = source if source.endswith('.manifest.json') else manifestName(source)
+    if os.path.exists(manifestFile):
+        # the segments are next to the manifest, in the order they were opened
+        entries = {}
+        for segment in readManifest(manifestFile)['segments']:
+            entries.setdefault(os.path.join(os.path.dirname(manifestFile), segment['file']), []).append(segment)
+        return list(entries), list(entries.values())
+    files = sorted(glob.glob(source), key=_naturalKey)
+    return [f for f in files if not f.endswith(('.manifest.json', '.tmp'))], None
+
+
+################################################################################
+################################################################################
+#   Data set class
+#
+################################################################################
+class DataSet():
+    """the files of a run as one data set
+
+    source is a manifest (or a data file written with one), a glob pattern
+    or a list of files. The files are indexed by a pool of threads, the
+    dataFileArgs are passed to every DataFile. cameraType and channel are
+    used for the image functions.
+    """
+
+    def __init__(self, source, cameraType = 'ePixHr10kT', channel = None, threads = None, **dataFileArgs):
+        self.cameraType = cameraType
+        self.channel = channel
+        files, entries = findSegments(source)
+        if not files:
+            raise ValueError("No data files found for %s" % (source,))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+            self.files = list(pool.map(lambda f: DataFile(f, **dataFileArgs), files))
+        metadata = []
+        for n, filename in enumerate(files):
+            meta = {'file': filename}
+            meta.update(parseScanParams(filename))
+            if entries is not None:
+                meta['manifest'] = entries[n]
+                self._checkManifest(self.files[n], entries[n])
+            metadata.append(meta)
+        self._camera = None
+        self._setSegments(self.files, metadata)
+
+    @staticmethod
+    def _checkManifest(dataFile, entries):
+        records = sum(entry['records'] for entry in entries)
+        # a segment that was never closed (writer stopped) may hold more records
+        closed = all(entry.get('closed') is not None for entry in entries)
+        if len(dataFile) < records or (closed and len(dataFile) != records):
+            raise ValueError("%s has %d records, %d in the manifest" % (dataFile.filename, len(dataFile), records))
+
+    def _setSegments(self, files, metadata):
+        self.files = files
+        self.metadata = metadata
+        # first global record of every segment
+        self.recordOffsets = np.concatenate(([0], np.cumsum([len(f) for f in files]))).astype(np.int64)
+        self._imageOffsets = None
+
+    def __len__(self):
+        return int(self.recordOffsets[-1])
+
+    @property
+    def numSegments(self):
+        return len(self.files)
+
+    def locate(self, index):
+        """returns (segment, record in the segment) of a global record index"""
+        if not 0 <= index < len(self):
+            raise IndexError("Record %d out of range" % (index))
+        segment = int(np.searchsorted(self.recordOffsets, index, side='right') - 1)
+        return segment, int(index - self.recordOffsets[segment])
+
+    def record(self, index, dtype=np.uint8):
+        """returns the payload of a record from its global index"""
+        segment, local = self.locate(index)
+        return self.files[segment].record(local, dtype)
+
+    def channels(self):
+        """channel of every record of the data set"""
+        return np.concatenate([f.channels for f in self.files])
+
+    def param(self, name, default = None):
+        """value of a metadata entry for every segment"""
+        return [meta.get(name, default) for meta in self.metadata]
+
+    def select(self, **params):
+        """returns the data set of the segments whose metadata match params,
+        for example select(SDrst=3) or select(dataType='ref')"""
+        keep = [n for n, meta in enumerate(self.metadata) if all(meta.get(k) == v for k, v in params.items())]
+        # the segments are shared, nothing is indexed again
+        subset = DataSet.__new__(DataSet)
+        subset.cameraType = self.cameraType
+        subset.channel = self.channel
+        subset._camera = self._camera
+        subset._setSegments([self.files[n] for n in keep], [self.metadata[n] for n in keep])
+        return subset
+
+    def _getCamera(self):
+        if self._camera is None:
+            import ePixViewer.Cameras as cameras
+            self._camera = cameras.Camera(cameraType = self.cameraType)
+        return self._camera
+
+    def imageOffsets(self):
+        """first global image of every segment, the image counts are taken from the headers"""
+        if self._imageOffsets is None:
+            camera = self._getCamera()
+            counts = [countImages(f, self.cameraType, self.channel, camera) for f in self.files]
+            self._imageOffsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return self._imageOffsets
+
+    def numImages(self):
+        return int(self.imageOffsets()[-1])
+
+    def iterImages(self, batchSize = 256, start = 0, stop = None):
+        """yields (segment, first global image, acqNums, images) batches of
+        the images [start, stop) of the data set, the batches do not cross
+        segments"""
+        offsets = self.imageOffsets()
+        stop = offsets[-1] if stop is None else min(stop, offsets[-1])
+        camera = self._getCamera()
+        for segment in range(self.numSegments):
+            first, last = max(start, offsets[segment]), min(stop, offsets[segment+1])
+            if first >= last:
+                continue
+            index = first
+            for acqNums, images in iterImages(self.files[segment], self.cameraType, self.channel, batchSize, camera,
+                                              start = int(first - offsets[segment]), stop = int(last - offsets[segment])):
+                yield segment, index, acqNums, images
+                index += images.shape[0]
+
+    def close(self):
+        for f in self.files:
+            f.close()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : decoded frame cache
+#-----------------------------------------------------------------------------
+# File       : frameCache.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# LRU cache of decoded (descrambled) images bounded by the number of bytes
+# it holds, and a background thread that fills it with the frames around the
+# one being displayed so that stepping or playing through a file does not
+# wait for the descrambler.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import threading
+from collections import OrderedDict
+
+################################################################################
+################################################################################
+#   Frame cache class
+#
+################################################################################
+class FrameCache():
+    """thread safe LRU cache of numpy images bounded by maxBytes
+
+    generation is incremented by clear(), an image decoded before a clear
+    (put with the generation read before decoding it) is dropped.
+    """
+
+    def __init__(self, maxBytes = 512*1024*1024):
+        self.maxBytes = maxBytes
+        self.numBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key):
+        """returns the cached image (marked as most recently used) or None"""
+        with self._lock:
+            image = self._frames.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._frames.move_to_end(key)
+            return image
+
+    def put(self, key, image, generation = None):
+        """adds an image, returns False if it was decoded before the last clear"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.numBytes -= old.nbytes
+            self._frames[key] = image
+            self.numBytes += image.nbytes
+            # evict least recently used frames, always keeps the newest one
+            while self.numBytes > self.maxBytes and len(self._frames) > 1:
+                key, old = self._frames.popitem(last=False)
+                self.numBytes -= old.nbytes
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.numBytes = 0
+            self.generation += 1
+
+
+################################################################################
+################################################################################
+#   Frame prefetcher class
+#
+################################################################################
+class FramePrefetcher(threading.Thread):
+    """decodes the frames around the cursor into a FrameCache
+
+    decode(index) returns the image of frame index (or None if it cannot be
+    decoded), numFrames is the number of frames, valid indices are
+    1..numFrames as in the viewer. Frames ahead of the cursor are decoded
+    first, then the ones behind it. Moving the cursor restarts the work
+    around the new position, refill() restarts it after the cache was
+    cleared.
+    """
+
+    def __init__(self, cache, decode, numFrames, ahead = 16, behind = 4):
+        super(FramePrefetcher, self).__init__(daemon=True)
+        self.cache = cache
+        self.decode = decode
+        self.numFrames = numFrames
+        self.ahead = ahead
+        self.behind = behind
+        self._cursor = None
+        self._running = True
+        self._cond = threading.Condition()
+
+    def setCursor(self, index):
+        with self._cond:
+            self._cursor = index
+            self._cond.notify()
+
+    def refill(self):
+        """decodes the frames around the cursor again, to call after cache.clear()"""
+        with self._cond:
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _wanted(self, cursor):
+        for i in range(1, self.ahead+1):
+            yield cursor + i
+        for i in range(1, self.behind+1):
+            yield cursor - i
+
+    def run(self):
+        cursor = None
+        generation = None
+        while True:
+            with self._cond:
+                while self._running and (self._cursor is None or (self._cursor == cursor and self.cache.generation == generation)):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                cursor = self._cursor
+                generation = self.cache.generation
+
+            for index in self._wanted(cursor):
+                # the cursor moved or the cache was cleared, start again
+                if self._cursor != cursor or self.cache.generation != generation or not self._running:
+                    cursor = None
+                    break
+                if index < 1 or index > self.numFrames or index in self.cache:
+                    continue
+                image = self.decode(index)
+                if image is not None:
+                    # dropped if the cache was cleared while decoding
+                    self.cache.put(index, image, generation)
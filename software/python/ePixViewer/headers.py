@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : record and frame header decoding
+#-----------------------------------------------------------------------------
+# File       : headers.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Structured dtypes for the rogue file record header and the camera frame
+# headers, and a decoder that turns the headers of every record of an
+# indexed run (see dataFile.DataFile) into columns in a single pass.
+#
+# Camera frame header (first three 32 bit words of the frame):
+#   word 0 : VC in bits 3:0
+#   word 1 : acquisition number
+#   word 2 : ASIC number (and TOA flag for Tixel/Cpix2), see CAMERA_HEADER_FIELDS
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+
+# rogue StreamWriter record header
+RECORD_HEADER_DTYPE = np.dtype([
+    ('size',  '<u4'),   # bytes that follow, including the flags word
+    ('flags', '<u4'),   # channel 31:24, error 23:16, user flags 15:0
+])
+
+# camera frame header
+CAMERA_HEADER_SIZE = 12
+CAMERA_HEADER_DTYPE = np.dtype([
+    ('vc',       '<u4'),
+    ('acqNum',   '<u4'),
+    ('asicInfo', '<u4'),
+])
+
+# per camera (ASIC number mask, TOA flag bit or None) of header word 2
+CAMERA_HEADER_FIELDS = {
+    'ePix100a'          : (0x0, None),
+    'ePix100p'          : (0x0, None),
+    'ePix10ka'          : (0x0, None),
+    'Tixel48x48'        : (0x7, 3),
+    'Cpix2'             : (0x7, 3),
+    'ePixM32Array'      : (0xF, None),
+    'HrAdc32x32'        : (0x7, None),
+    'cryo64xN'          : (0x0, None),
+    'ePixHrePixM'       : (0x0, None),
+    'ePixHr10kT'        : (0xF, None),
+    'ePixHr10kTBatcher' : (0xF, None),
+}
+
+# payload sizes in bytes of the camera frames (None if not fixed)
+CAMERA_FRAME_SIZES = {
+    'Tixel48x48'        : (4620,),
+    'Cpix2'             : (4620,),
+    'ePixM32Array'      : (4108,),
+    'HrAdc32x32'        : (2060,),
+    'ePixHr10kT'        : (56076, 56112),
+    'ePixHr10kTBatcher' : None,
+}
+
+# columns returned by decodeHeaders, one entry per record
+HEADER_COLUMNS_DTYPE = np.dtype([
+    ('record',    '<i8'),
+    ('channel',   'u1'),
+    ('error',     'u1'),
+    ('vc',        'u1'),
+    ('acqNum',    '<u4'),
+    ('asicNum',   'u1'),
+    ('isTOA',     'u1'),
+    ('frameSize', '<i8'),
+    ('valid',     '?'),   # False if the record is too short for a camera header
+])
+
+
+def flagsChannel(flags):
+    """channel of a record flags word (scalar or array)"""
+    return (flags >> 24) & 0xFF
+
+
+def flagsError(flags):
+    """error field of a record flags word (scalar or array)"""
+    return (flags >> 16) & 0xFF
+
+
+def decodeFrameHeader(rawData, cameraType = 'ePixHr10kT'):
+    """decodes the header of a single frame (bytes or numpy array), returns
+    (vc, acqNum, asicNum, isTOA)"""
+    header = np.frombuffer(rawData, dtype=CAMERA_HEADER_DTYPE, count=1)[0]
+    asicMask, toaBit = CAMERA_HEADER_FIELDS.get(cameraType, (0x0, None))
+    isTOA = 0 if toaBit is None else int((header['asicInfo'] >> toaBit) & 0x1)
+    return int(header['vc'] & 0xF), int(header['acqNum']), int(header['asicInfo'] & asicMask), isTOA
+
+
+def cameraRecordCheck(cameraType, vcs = None):
+    """returns a DataFile checkRecord function accepting the records that hold
+    a frame of cameraType: known frame size and, if vcs is given, one of the
+    virtual channels vcs in the frame header"""
+    frameSizes = CAMERA_FRAME_SIZES.get(cameraType)
+    def check(data, offsets, sizes):
+        valid = sizes >= CAMERA_HEADER_SIZE
+        if frameSizes is not None:
+            valid &= np.isin(sizes, frameSizes)
+        if vcs is not None and np.any(valid):
+            idx = np.nonzero(valid)[0]
+            valid[idx] = np.isin(data[offsets[idx]] & 0xF, vcs)
+        return valid
+    return check
+
+
+def decodeHeaders(dataFile, cameraType = 'ePixHr10kT', channel = None):
+    """decodes the record and camera headers of every record of dataFile (a
+    DataFile or a file name), or of the records of channel only, into a
+    HEADER_COLUMNS_DTYPE array"""
+    if not isinstance(dataFile, DataFile):
+        dataFile = DataFile(dataFile)
+    records = dataFile.select(channel)
+    asicMask, toaBit = CAMERA_HEADER_FIELDS.get(cameraType, (0x0, None))
+
+    columns = np.zeros(records.shape[0], dtype=HEADER_COLUMNS_DTYPE)
+    columns['record']    = records
+    columns['channel']   = flagsChannel(dataFile.flags[records])
+    columns['error']     = flagsError(dataFile.flags[records])
+    columns['frameSize'] = dataFile.sizes[records]
+
+    valid = dataFile.sizes[records] >= CAMERA_HEADER_SIZE
+    columns['valid'] = valid
+    raw = gatherBytes(dataFile.data, dataFile.offsets[records[valid]], CAMERA_HEADER_SIZE)
+    header = np.ascontiguousarray(raw).view(CAMERA_HEADER_DTYPE)[:, 0]
+
+    columns['vc'][valid]      = header['vc'] & 0xF
+    columns['acqNum'][valid]  = header['acqNum']
+    columns['asicNum'][valid] = header['asicInfo'] & asicMask
+    if toaBit is not None:
+        columns['isTOA'][valid] = (header['asicInfo'] >> toaBit) & 0x1
+    return columns
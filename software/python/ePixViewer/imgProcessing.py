@@ -30,6 +30,7 @@ import rogue.interfaces.stream
 import pyrogue    
 import time
 import numpy as np
+from ePixViewer.correction import CorrectionPipeline
 
 try:
     from PyQt5.QtWidgets import *
@@ -65,6 +66,15 @@ class ImageProcessing():
     imgDark_isSet = False
     imgDark_isRequested = False
 
+    # calibration store the dark images are saved to and loaded from
+    calibStore = None
+    calibFingerprint = None
+    calibAsic = 0
+
+    # 16 to 8 bit display lookup table and the settings it was built for
+    _displayLUT = None
+    _displayLUTKey = None
+
 
     def __init__(self, parent) :
         # pointer to the parent class        
@@ -73,6 +83,8 @@ class ImageProcessing():
         self.calcImgWidth()
         # creates the placehold for the dark images to be stored
         self.createDarkImageSet()
+        # corrections applied to the live images once the dark image is set
+        self.correction = CorrectionPipeline()
 
     def calcImgWidth(self):
         self.imgWidth = self.imgNumAsicsPerSide * self.imgNumAdcChPerAsic * self.imgNumColPerAdcCh      
@@ -91,36 +103,103 @@ class ImageProcessing():
         self.numSavedDarkImg = self.numSavedDarkImg + 1
         #checks for end condition
         if (self.numSavedDarkImg == self.numDarkImages):
-            self.imgDark = np.average(self._imgDarkSet,axis=0)
+            self.imgDark = np.average(self._imgDarkSet,axis=0).astype('float32')
+            self.correction.setPedestal(self.imgDark)
             self.imgDark_isSet = True
             self.imgDark_isRequested = False
             self.numSavedDarkImg = 0
             print("Dark image set.")
+            if (self.calibStore is not None):
+                self.saveDarkImg()
+
+    def setCalibStore(self, store, fingerprint, asic = 0):
+        """uses the constants of a calibStore.CalibStore matching fingerprint,
+        the dark image is loaded from it when available and saved to it when set"""
+        self.calibStore = store
+        self.calibFingerprint = fingerprint
+        self.calibAsic = asic
+        return self.loadDarkImg()
+
+    def loadDarkImg(self, when = None):
+        """loads the pedestal, gain and bad pixel maps matching the calibration
+        fingerprint, returns False if the store has none"""
+        maps = self.calibStore.load(self.calibFingerprint, self.calibAsic, when)
+        if maps is None or 'pedestal' not in maps:
+            return False
+        self.imgDark = np.array(maps['pedestal'], dtype='float32')
+        self.correction.setPedestal(self.imgDark)
+        self.correction.setGain(maps.get('gain'))
+        self.correction.setMask(None if 'badPixels' not in maps else np.logical_not(maps['badPixels']))
+        self.imgDark_isSet = True
+        print("Dark image loaded from the calibration store.")
+        return True
+
+    def saveDarkImg(self, meta = None):
+        """saves the dark image (pedestal) and the noise of the dark set to the calibration store"""
+        noise = np.std(self._imgDarkSet, axis=0).astype('float32')
+        self.calibStore.save(self.calibFingerprint, self.calibAsic, {'pedestal': self.imgDark, 'noise': noise}, meta = meta)
 
     def unsetDarkImg(self):
         """performs the ePix100A image descrambling"""
         self.imgDark_isSet = False
 
     def getDarkSubtractedImg(self, rawImg):
+        """returns the corrected image, a float32 buffer of the correction
+        pipeline that is reused by the next frame"""
         if (rawImg.shape == self.imgDark.shape):
-            return rawImg - self.imgDark
+            return self.correction.process(rawImg)
         print("Warning: Could not perform dark image subtraction.")
         return rawImg
 
-    def reScaleImgTo8bit(self, rawImage, scaleMax=20000, scaleMin=-200):
+    def reScaleImgTo8bit(self, rawImage, scaleMax=20000, scaleMin=-200, out=None, darkOffset=0, gamma=1.0):
+        """converts the image to 8 bit for display, scaleMin maps to 0 and
+        scaleMax to 255. 16 bit images go through the display lookup table
+        (dark offset, clip, scale and gamma in a single np.take into out),
+        other types are converted with numpy arithmetic. The camera bit mask
+        is already applied by descrambleImage."""
+        rawImage = np.asarray(rawImage)
+        if rawImage.dtype in (np.uint16, np.int16):
+            lut = self.displayLUT(scaleMax, scaleMin, darkOffset, gamma, signed = (rawImage.dtype == np.int16))
+            if out is None:
+                out = np.empty(rawImage.shape, dtype='uint8')
+            # indices always fit the 65536 entries, clip mode avoids the bounds check buffer
+            return np.take(lut, rawImage.view(np.uint16), out=out, mode='clip')
+
         #init
-        image = np.clip(rawImage, scaleMin, scaleMax)
+        image = np.clip(rawImage - darkOffset, scaleMin, scaleMax)
         
         #re-scale
         deltaScale = abs(scaleMax - scaleMin)
         if (deltaScale == 0):
             deltaScale = 1
         imageRS = np.array(((image-scaleMin) * (255 / (deltaScale))))     
+        if (gamma != 1.0):
+            imageRS = 255 * (imageRS / 255) ** gamma
         image8b = imageRS.astype('uint8')
 
         #return results
         return image8b
 
+    def displayLUT(self, scaleMax=20000, scaleMin=-200, darkOffset=0, gamma=1.0, signed=False):
+        """returns the 65536 entry uint8 display table of 16 bit pixels, rebuilt
+        only when the display settings change"""
+        key = (scaleMax, scaleMin, darkOffset, gamma, signed)
+        if self._displayLUTKey != key:
+            values = np.arange(65536, dtype=np.uint32).astype(np.uint16)
+            if signed:
+                values = values.view(np.int16)
+            values = values.astype(np.float64) - darkOffset
+            image = np.clip(values, scaleMin, scaleMax)
+            deltaScale = abs(scaleMax - scaleMin)
+            if (deltaScale == 0):
+                deltaScale = 1
+            imageRS = (image-scaleMin) * (255 / (deltaScale))
+            if (gamma != 1.0):
+                imageRS = 255 * (imageRS / 255) ** gamma
+            self._displayLUT = imageRS.astype('uint8')
+            self._displayLUTKey = key
+        return self._displayLUT
+
     """Uses the bitwise and function to apply a bit mask into the descrabled image"""
     def applyBitMask(self, image, mask = 0xFFFF):
         return np.bitwise_and(image, mask)
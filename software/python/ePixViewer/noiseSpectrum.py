@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : noise power spectrum analysis
+#-----------------------------------------------------------------------------
+# File       : noiseSpectrum.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Averaged power spectra (Welch method) for pickup noise diagnosis. The
+# frames of a run are taken as time series sampled at the frame rate:
+#   pixel   : every pixel
+#   column  : mean of every column
+#   bank    : mean of every ADC bank (common mode)
+# the spectra are returned per pixel/column and averaged per ADC bank of the
+# ePixHr10kT layout (banks of 32 columns). The pseudo scope traces are
+# analysed the same way at the ADC sample rate, every trace on its own.
+# The series are cut in overlapping segments that are detrended, windowed
+# and transformed with one batched rfft per group of segments, only the
+# last partial segment is carried from one batch to the next so a run of
+# any length is analysed in constant memory.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+from ePixViewer.assembler import iterImages
+from ePixViewer.correction import HR10KT_BANK_COLS
+
+# pseudo scope records: 8 32 bit header words, 5 32 bit footer words (as _ePixViewer)
+SCOPE_CHANNEL = 2
+SCOPE_HEADER_WORDS = 16
+SCOPE_FOOTER_WORDS = 14
+
+
+def welchWindow(window, nperseg):
+    """returns the window of a segment, window is 'hann', 'boxcar' or an array"""
+    if isinstance(window, str):
+        if window == 'hann':
+            # periodic Hann window, the usual choice for spectral averaging
+            return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nperseg) / nperseg)).astype(np.float32)
+        elif window == 'boxcar':
+            return np.ones(nperseg, dtype=np.float32)
+        raise ValueError("Unknown window %s" % (window))
+    window = np.asarray(window, dtype=np.float32)
+    if window.shape != (nperseg,):
+        raise ValueError("Window length %d, expected %d" % (window.shape[0], nperseg))
+    return window
+
+
+################################################################################
+################################################################################
+#   Welch accumulator class
+#
+################################################################################
+class WelchAccumulator():
+    """streaming Welch average of the power spectra of the series along axis 0
+    of (T, ...) chunks
+
+    Segments of nperseg samples overlapping by overlap (fraction) are
+    detrended (mean removed), windowed and transformed. spectrum() returns
+    the one sided power spectral density in units**2/Hz, the channels of the
+    chunks (the axes after the first) are kept.
+    """
+
+    def __init__(self, nperseg = 256, overlap = 0.5, window = 'hann', fs = 1.0, maxBytes = 64*1024*1024):
+        self.nperseg = nperseg
+        self.step = max(1, nperseg - int(nperseg * overlap))
+        self.window = welchWindow(window, nperseg)
+        self.fs = fs
+        self.maxBytes = maxBytes
+        self.numSegments = 0
+        self._sum = None
+        self._tail = None
+
+    def _accumulate(self, segments):
+        """adds the power of (S, ..., nperseg) segments, S grouped to stay under maxBytes"""
+        segBytes = max(1, segments[0].size * 16)
+        group = max(1, self.maxBytes // segBytes)
+        for s0 in range(0, segments.shape[0], group):
+            seg = np.array(segments[s0:s0+group], dtype=np.float32)
+            seg -= seg.mean(axis=-1, keepdims=True)
+            seg *= self.window
+            spec = np.fft.rfft(seg, axis=-1)
+            power = (spec.real**2 + spec.imag**2).sum(axis=0, dtype=np.float64)
+            if self._sum is None:
+                self._sum = power
+            else:
+                self._sum += power
+            self.numSegments += seg.shape[0]
+
+    def update(self, chunk):
+        """adds the next samples, (T, ...) with the same channels every call"""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        data = chunk if self._tail is None else np.concatenate((self._tail, chunk))
+        numSeg = 0 if data.shape[0] < self.nperseg else (data.shape[0] - self.nperseg) // self.step + 1
+        if numSeg:
+            segments = np.lib.stride_tricks.sliding_window_view(data, self.nperseg, axis=0)[::self.step][:numSeg]
+            self._accumulate(segments)
+        # only the samples of the segments still to come are carried over
+        self._tail = data[numSeg*self.step:].copy()
+
+    def updateRecords(self, records):
+        """adds (N, T, ...) independent records (scope traces), the records are
+        segmented one by one and nothing is carried to the next call"""
+        records = np.asarray(records)
+        if records.shape[1] < self.nperseg:
+            raise ValueError("Records of %d samples are shorter than a segment of %d" % (records.shape[1], self.nperseg))
+        segments = np.lib.stride_tricks.sliding_window_view(records, self.nperseg, axis=1)[:, ::self.step]
+        self._accumulate(segments.reshape((-1,) + segments.shape[2:]))
+
+    def frequencies(self):
+        return np.fft.rfftfreq(self.nperseg, 1.0 / self.fs)
+
+    def spectrum(self):
+        """(..., nfreq) averaged one sided power spectral density, None before the first segment"""
+        if self._sum is None:
+            return None
+        psd = self._sum / (self.numSegments * self.fs * np.sum(self.window.astype(np.float64)**2))
+        # fold the negative frequencies, DC and Nyquist appear once
+        psd[..., 1:(self.nperseg + 1) // 2] *= 2
+        return psd
+
+
+def bankAverage(spectrum, bankCols = HR10KT_BANK_COLS):
+    """averages (..., cols, nfreq) spectra over the columns of every ADC bank,
+    returns (banks, nfreq)"""
+    cols = spectrum.shape[-2]
+    if cols % bankCols:
+        raise ValueError("Image width %d is not a multiple of the bank width %d" % (cols, bankCols))
+    banks = spectrum.reshape(-1, cols // bankCols, bankCols, spectrum.shape[-1])
+    return banks.mean(axis=(0, 2))
+
+
+################################################################################
+################################################################################
+#   Noise spectrum class
+#
+################################################################################
+class NoiseSpectrum():
+    """averaged power spectra of the frame to frame series of (N, rows, cols)
+    image batches, frameRate in Hz sets the frequency axis
+
+    pixels enables the per pixel spectra (rows*cols series, the most
+    expensive part), the column and bank mean spectra are always computed.
+    """
+
+    def __init__(self, nperseg = 256, overlap = 0.5, window = 'hann', frameRate = 1.0, bankCols = HR10KT_BANK_COLS, pixels = True, maxBytes = 64*1024*1024):
+        self.bankCols = bankCols
+        self.numFrames = 0
+        self.columns = WelchAccumulator(nperseg, overlap, window, frameRate, maxBytes)
+        self.banks = WelchAccumulator(nperseg, overlap, window, frameRate, maxBytes)
+        self.pixels = WelchAccumulator(nperseg, overlap, window, frameRate, maxBytes) if pixels else None
+
+    def update(self, images):
+        images = np.asarray(images)
+        if images.ndim == 2:
+            images = images[None]
+        numFrames, rows, cols = images.shape
+        if cols % self.bankCols:
+            raise ValueError("Image width %d is not a multiple of the bank width %d" % (cols, self.bankCols))
+        data = images.astype(np.float32)
+        colMeans = data.mean(axis=1)
+        self.columns.update(colMeans)
+        self.banks.update(colMeans.reshape(numFrames, cols // self.bankCols, self.bankCols).mean(axis=-1))
+        if self.pixels is not None:
+            self.pixels.update(data)
+        self.numFrames += numFrames
+
+    def frequencies(self):
+        return self.columns.frequencies()
+
+    def pixelSpectrum(self):
+        """(rows, cols, nfreq) spectrum of every pixel"""
+        return None if self.pixels is None else self.pixels.spectrum()
+
+    def columnSpectrum(self):
+        """(cols, nfreq) spectrum of every column mean"""
+        return self.columns.spectrum()
+
+    def bankSpectrum(self):
+        """(banks, nfreq) spectrum of every bank mean (common mode noise)"""
+        return self.banks.spectrum()
+
+    def bankPixelSpectrum(self):
+        """(banks, nfreq) pixel spectrum averaged over the pixels of every bank"""
+        spectrum = self.pixelSpectrum()
+        return None if spectrum is None else bankAverage(spectrum, self.bankCols)
+
+    def bankColumnSpectrum(self):
+        """(banks, nfreq) column mean spectrum averaged over the columns of every bank"""
+        spectrum = self.columnSpectrum()
+        return None if spectrum is None else bankAverage(spectrum, self.bankCols)
+
+    def summary(self):
+        summary = {
+            'numFrames'          : self.numFrames,
+            'numSegments'        : self.columns.numSegments,
+            'frequencies'        : self.frequencies(),
+            'columnSpectrum'     : self.columnSpectrum(),
+            'bankSpectrum'       : self.bankSpectrum(),
+            'bankColumnSpectrum' : self.bankColumnSpectrum(),
+        }
+        if self.pixels is not None:
+            summary['pixelSpectrum'] = self.pixelSpectrum()
+            summary['bankPixelSpectrum'] = self.bankPixelSpectrum()
+        return summary
+
+    def saveHdf5(self, filename):
+        """writes the summary to an HDF5 file, one dataset per entry"""
+        import h5py
+        with h5py.File(filename, 'w') as f:
+            for name, value in self.summary().items():
+                if value is not None:
+                    f[name] = value
+
+
+def scopeTraces(records):
+    """(N, 2, samples) channel A and B traces of (N, words) uint16 pseudo scope records"""
+    data = records[:, SCOPE_HEADER_WORDS:records.shape[1]-SCOPE_FOOTER_WORDS]
+    samples = data.shape[1] // 2
+    return data[:, :2*samples].reshape(data.shape[0], 2, samples)
+
+
+def noiseRun(filename, cameraType = 'ePixHr10kT', channel = None, batchSize = 256, h5File = None, **kwargs):
+    """computes the noise spectra of the images of a run, streaming them, and
+    writes the HDF5 summary to h5File if given, kwargs go to NoiseSpectrum"""
+    spectrum = NoiseSpectrum(**kwargs)
+    for acqNums, images in iterImages(filename, cameraType, channel, batchSize):
+        spectrum.update(images)
+    if h5File is not None:
+        spectrum.saveHdf5(h5File)
+    return spectrum
+
+
+def scopeRun(filename, channel = SCOPE_CHANNEL, nperseg = 256, overlap = 0.5, window = 'hann', sampleRate = 1.0, batchSize = 256):
+    """averaged spectrum of the pseudo scope traces of a run, returns a
+    WelchAccumulator with (2, nfreq) spectra (channel A and B). The traces of
+    the most common record size are used."""
+    dataFile = filename if isinstance(filename, DataFile) else DataFile(filename)
+    indices = dataFile.select(channel)
+    accumulator = WelchAccumulator(nperseg, overlap, window, sampleRate)
+    if indices.shape[0] == 0:
+        return accumulator
+    sizes, counts = np.unique(dataFile.sizes[indices], return_counts=True)
+    size = int(sizes[np.argmax(counts)])
+    indices = indices[dataFile.sizes[indices] == size]
+    for first in range(0, indices.shape[0], batchSize):
+        records = gatherBytes(dataFile.data, dataFile.offsets[indices[first:first+batchSize]], size).view('<u2')
+        # (N, samples, 2) so the traces are segmented along the samples
+        accumulator.updateRecords(scopeTraces(records).transpose(0, 2, 1))
+    return accumulator
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : per pixel histograms
+#-----------------------------------------------------------------------------
+# File       : pixelHistogram.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Accumulates the ADC value distribution of every pixel of a (rows, cols)
+# image into a uint32 (rows, cols, bins) array, for noise and gain
+# calibration. Whole chunks of frames are histogrammed with one bincount
+# per block of pixels (the bin index is offset by the pixel index), the
+# blocks are sized so the working memory stays under maxBytes. Partial
+# histograms of the same configuration add up, so a run can be split
+# between processes (histogramRun) and the results merged.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import multiprocessing
+import numpy as np
+from ePixViewer.assembler import iterImages, countImages, imageRanges
+
+################################################################################
+################################################################################
+#   Pixel histogram class
+#
+################################################################################
+class PixelHistogram():
+    """histograms of the values of every pixel of (rows, cols) images
+
+    Bin b of pixel (r, c) counts the values v with
+        lo + b*binWidth <= v - origin[r, c] < lo + (b+1)*binWidth
+    origin (per pixel integer array, for example the pedestal) lets a few
+    bins follow every pixel instead of covering the whole ADC range. Values
+    outside the bins are counted in underflow and overflow.
+    """
+
+    def __init__(self, shape, bins = 1024, lo = 0, binWidth = 1, origin = None, maxBytes = 64*1024*1024):
+        self.shape = tuple(shape)
+        self.bins = bins
+        self.lo = lo
+        self.binWidth = binWidth
+        self.origin = None if origin is None else np.asarray(origin, dtype=np.int64).reshape(self.shape)
+        self.maxBytes = maxBytes
+        self.hist = np.zeros(self.shape + (bins,), dtype=np.uint32)
+        self.underflow = np.zeros(self.shape, dtype=np.uint32)
+        self.overflow = np.zeros(self.shape, dtype=np.uint32)
+        self.numFrames = 0
+
+    def fill(self, frames):
+        """adds a frame or an (N, rows, cols) stack of frames"""
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+        numFrames = frames.shape[0]
+        numPixels = self.underflow.size
+        flat = frames.reshape(numFrames, numPixels)
+        hist = self.hist.reshape(numPixels, self.bins)
+        under = self.underflow.reshape(numPixels)
+        over = self.overflow.reshape(numPixels)
+        origin = None if self.origin is None else self.origin.reshape(numPixels)
+
+        # pixels per block, bounded by the bincount output and the index array
+        block = max(1, min(numPixels, self.maxBytes // (8*self.bins), self.maxBytes // (24*max(numFrames, 1))))
+        for p0 in range(0, numPixels, block):
+            p1 = min(p0 + block, numPixels)
+            idx = flat[:, p0:p1].astype(np.int64)
+            if origin is not None:
+                idx -= origin[p0:p1]
+            idx -= self.lo
+            np.floor_divide(idx, self.binWidth, out=idx)
+            low = idx < 0
+            high = idx >= self.bins
+            under[p0:p1] += np.count_nonzero(low, axis=0).astype(np.uint32)
+            over[p0:p1] += np.count_nonzero(high, axis=0).astype(np.uint32)
+            # offset the bins of every pixel so one bincount covers the block
+            idx += np.arange(p1 - p0, dtype=np.int64) * self.bins
+            counts = np.bincount(idx[~(low | high)], minlength=(p1 - p0)*self.bins)
+            np.add(hist[p0:p1], counts.reshape(p1 - p0, self.bins), out=hist[p0:p1], casting='unsafe')
+        self.numFrames += numFrames
+
+    def _checkCompatible(self, other):
+        same = (self.shape == other.shape and self.bins == other.bins and self.lo == other.lo and self.binWidth == other.binWidth)
+        if same and (self.origin is None) != (other.origin is None):
+            same = False
+        if same and self.origin is not None:
+            same = np.array_equal(self.origin, other.origin)
+        if not same:
+            raise ValueError("Histograms do not have the same binning")
+
+    def __iadd__(self, other):
+        self._checkCompatible(other)
+        self.hist += other.hist
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.numFrames += other.numFrames
+        return self
+
+    def binCenters(self):
+        """(rows, cols, bins) value of the center of every bin, or (bins,) without origin"""
+        centers = self.lo + np.arange(self.bins) * self.binWidth + (self.binWidth - 1) / 2
+        if self.origin is None:
+            return centers
+        return self.origin[..., None] + centers
+
+    def mean(self):
+        """per pixel mean of the values inside the bins"""
+        counts = self.hist.sum(axis=-1)
+        total = (self.hist * self.binCenters()).sum(axis=-1)
+        return total / np.maximum(counts, 1)
+
+    def std(self):
+        """per pixel standard deviation of the values inside the bins"""
+        counts = np.maximum(self.hist.sum(axis=-1), 1)
+        centers = self.binCenters()
+        mean = (self.hist * centers).sum(axis=-1) / counts
+        return np.sqrt(np.maximum((self.hist * centers**2).sum(axis=-1) / counts - mean**2, 0))
+
+    def peak(self):
+        """per pixel center of the most populated bin"""
+        centers = np.broadcast_to(self.binCenters(), self.hist.shape)
+        return np.take_along_axis(centers, self.hist.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+
+    def toSparse(self):
+        """returns (pixel, bin, count) of the non empty bins, pixel the flat pixel index"""
+        pixel, bins = np.nonzero(self.hist.reshape(-1, self.bins))
+        return pixel.astype(np.uint32), bins.astype(np.uint32), self.hist.reshape(-1, self.bins)[pixel, bins]
+
+    def save(self, filename, sparse = False):
+        """saves the histogram to a .npz file, only the non empty bins if sparse"""
+        arrays = {
+            'shape'     : np.array(self.shape),
+            'binning'   : np.array([self.bins, self.lo, self.binWidth]),
+            'underflow' : self.underflow,
+            'overflow'  : self.overflow,
+            'numFrames' : np.array(self.numFrames),
+        }
+        if self.origin is not None:
+            arrays['origin'] = self.origin
+        if sparse:
+            arrays['pixel'], arrays['bin'], arrays['count'] = self.toSparse()
+        else:
+            arrays['hist'] = self.hist
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            bins, lo, binWidth = (int(v) for v in data['binning'])
+            hist = cls(tuple(data['shape']), bins, lo, binWidth, data['origin'] if 'origin' in data else None)
+            if 'hist' in data:
+                hist.hist[...] = data['hist']
+            else:
+                hist.hist.reshape(-1, bins)[data['pixel'], data['bin']] = data['count']
+            hist.underflow[...] = data['underflow']
+            hist.overflow[...] = data['overflow']
+            hist.numFrames = int(data['numFrames'])
+        return hist
+
+
+def _histogramWorker(task):
+    filename, cameraType, channel, start, stop, batchSize, kwargs = task
+    hist = None
+    for acqNums, images in iterImages(filename, cameraType, channel, batchSize, start=start, stop=stop):
+        if hist is None:
+            hist = PixelHistogram(images.shape[1:], **kwargs)
+        hist.fill(images)
+    return hist
+
+
+def histogramRun(filename, cameraType = 'ePixHr10kT', channel = None, processes = None, batchSize = 256, **kwargs):
+    """histograms every pixel of the images of a run with a pool of processes,
+    kwargs are the PixelHistogram binning arguments"""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    ranges = imageRanges(countImages(filename, cameraType, channel), processes)
+    tasks = [(filename, cameraType, channel, start, stop, batchSize, kwargs) for start, stop in ranges]
+    if len(tasks) <= 1:
+        parts = [_histogramWorker(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+            parts = pool.map(_histogramWorker, tasks)
+    result = None
+    for part in parts:
+        if part is None:
+            continue
+        if result is None:
+            result = part
+        else:
+            result += part
+    return result
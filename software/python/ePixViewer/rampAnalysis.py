@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : ADC ramp test analysis
+#-----------------------------------------------------------------------------
+# File       : rampAnalysis.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Streaming analysis of ADC ramp tests. The frames of the run are taken in
+# batches and reduced on the fly, only the per frame column statistics and
+# the per ADC channel code histograms are kept:
+#   averages, noises : per frame mean and std of every column (ramp curve)
+#   steps            : averages[n+1] - averages[n], the step of the ramp
+#   codeHist         : per ADC channel code histogram (code density test)
+#   dnl, inl         : per ADC channel DNL/INL from the code density
+# Every column of the image is read out by its own ADC channel.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.assembler import iterImages
+
+################################################################################
+################################################################################
+#   Ramp analysis class
+#
+################################################################################
+class RampAnalysis():
+    """accumulates the ramp test statistics of (N, rows, cols) image batches,
+    codeBits is the number of bits of the ADC codes (after the bit mask)"""
+
+    def __init__(self, numCols = 192, codeBits = 14):
+        self.numCols = numCols
+        self.numCodes = 1 << codeBits
+        self.codeHist = np.zeros((numCols, self.numCodes), dtype=np.uint64)
+        self.numFrames = 0
+        self._averages = []
+        self._noises = []
+        # run wide per column mean and variance (Chan's parallel update)
+        self._count = 0
+        self._mean = np.zeros(numCols)
+        self._m2 = np.zeros(numCols)
+
+    def update(self, images):
+        images = np.asarray(images)
+        if images.ndim == 2:
+            images = images[None]
+        if images.shape[-1] != self.numCols:
+            raise ValueError("Images have %d columns, expected %d" % (images.shape[-1], self.numCols))
+        numFrames, rows = images.shape[0], images.shape[1]
+
+        data = images.astype(np.float32)
+        averages = data.mean(axis=1)
+        self._averages.append(averages)
+        self._noises.append(data.std(axis=1))
+
+        count = numFrames * rows
+        mean = averages.mean(axis=0, dtype=np.float64)
+        m2 = ((data - mean.astype(np.float32))**2).sum(axis=(0, 1), dtype=np.float64)
+        delta = mean - self._mean
+        total = self._count + count
+        self._mean += delta * count / total
+        self._m2 += m2 + delta**2 * self._count * count / total
+        self._count = total
+
+        # code histogram of every column in one bincount, the code offset by the column
+        codes = np.minimum(images, self.numCodes - 1).astype(np.int64)
+        codes += np.arange(self.numCols, dtype=np.int64) * self.numCodes
+        self.codeHist += np.bincount(codes.ravel(), minlength=self.numCols*self.numCodes).reshape(self.numCols, self.numCodes).astype(np.uint64)
+        self.numFrames += numFrames
+
+    def averages(self):
+        """(numFrames, numCols) mean of every column of every frame"""
+        return np.concatenate(self._averages) if self._averages else np.zeros((0, self.numCols), dtype=np.float32)
+
+    def noises(self):
+        """(numFrames, numCols) standard deviation of every column of every frame"""
+        return np.concatenate(self._noises) if self._noises else np.zeros((0, self.numCols), dtype=np.float32)
+
+    def steps(self):
+        """(numFrames-1, numCols) frame to frame step of the column averages"""
+        return np.diff(self.averages(), axis=0)
+
+    def columnMean(self):
+        return self._mean.copy()
+
+    def columnStd(self):
+        return np.sqrt(self._m2 / max(self._count, 1))
+
+    def dnl(self):
+        """(numCols, numCodes) DNL in LSB from the code density, NaN outside the
+        codes covered by the ramp (the first and last code hit are excluded,
+        they collect the out of range samples)"""
+        dnl = np.full(self.codeHist.shape, np.nan)
+        hit = self.codeHist > 0
+        for col in range(self.numCols):
+            codes = np.flatnonzero(hit[col])
+            if codes.shape[0] < 3:
+                continue
+            first, last = codes[0] + 1, codes[-1]
+            hist = self.codeHist[col, first:last].astype(np.float64)
+            dnl[col, first:last] = hist / hist.mean() - 1
+        return dnl
+
+    def inl(self, dnl = None):
+        """(numCols, numCodes) INL in LSB, the cumulative sum of the DNL"""
+        if dnl is None:
+            dnl = self.dnl()
+        inl = np.nancumsum(dnl, axis=1)
+        inl[np.isnan(dnl)] = np.nan
+        return inl
+
+    def missingCodes(self, dnl = None):
+        """number of codes of every ADC channel inside the ramp range that were never hit"""
+        if dnl is None:
+            dnl = self.dnl()
+        return np.count_nonzero(dnl == -1, axis=1)
+
+    def summary(self):
+        dnl = self.dnl()
+        inl = self.inl(dnl)
+        return {
+            'numFrames'    : self.numFrames,
+            'averages'     : self.averages(),
+            'noises'       : self.noises(),
+            'steps'        : self.steps(),
+            'columnMean'   : self.columnMean(),
+            'columnStd'    : self.columnStd(),
+            'codeHist'     : self.codeHist,
+            'dnl'          : dnl,
+            'inl'          : inl,
+            'maxDnl'       : np.max(np.abs(np.nan_to_num(dnl, nan=0)), axis=1),
+            'maxInl'       : np.max(np.abs(np.nan_to_num(inl, nan=0)), axis=1),
+            'missingCodes' : self.missingCodes(dnl),
+        }
+
+    def saveHdf5(self, filename):
+        """writes the summary to an HDF5 file, one dataset per entry"""
+        import h5py
+        with h5py.File(filename, 'w') as f:
+            for name, value in self.summary().items():
+                f[name] = value
+
+
+def rampRun(filename, cameraType = 'ePixHr10kT', channel = None, codeBits = 14, batchSize = 256, h5File = None):
+    """runs the ramp analysis over a run, streaming its images, and writes the
+    HDF5 summary to h5File if given"""
+    analysis = None
+    for acqNums, images in iterImages(filename, cameraType, channel, batchSize):
+        if analysis is None:
+            analysis = RampAnalysis(images.shape[-1], codeBits)
+        analysis.update(images)
+    if analysis is not None and h5File is not None:
+        analysis.saveHdf5(h5File)
+    return analysis
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : run integrity check
+#-----------------------------------------------------------------------------
+# File       : runCheck.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Whole run validation from the record and frame headers only, nothing but
+# the headers is read from the mapped file. Reports the records of every
+# channel, the frame size distribution against the expected sizes, the
+# acquisition number gaps and duplicates of every lane (channel, ASIC and
+# TOA packet for Tixel/Cpix2) and how balanced the lanes are. The summary
+# is a dictionary of plain python types so it can be dumped as json for
+# the run database.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+from ePixViewer.headers import decodeHeaders, flagsChannel, flagsError, CAMERA_HEADER_SIZE, CAMERA_HEADER_DTYPE, CAMERA_HEADER_FIELDS, CAMERA_FRAME_SIZES
+from ePixViewer.batcher import BatcherFile
+
+
+def _batcherColumns(dataFile, cameraType):
+    """channel, error, asicNum, isTOA, acqNum and frameSize of the camera data
+    sub frames of the batcher super frames of dataFile"""
+    batcherFile = BatcherFile(dataFile)
+    sub = batcherFile.subFrames[batcherFile.select(batcherFile.dataDest())]
+    sub = sub[sub['size'] >= CAMERA_HEADER_SIZE]
+    header = np.ascontiguousarray(gatherBytes(dataFile.data, sub['offset'], CAMERA_HEADER_SIZE)).view(CAMERA_HEADER_DTYPE)[:, 0]
+    asicMask, toaBit = CAMERA_HEADER_FIELDS.get(cameraType, (0x0, None))
+    isTOA = np.zeros(sub.shape[0], dtype=np.uint32) if toaBit is None else (header['asicInfo'] >> toaBit) & 0x1
+    flags = dataFile.flags[sub['record']]
+    return flagsChannel(flags), flagsError(flags), header['asicInfo'] & asicMask, isTOA, header['acqNum'], sub['size'], batcherFile.badRecords.shape[0]
+
+
+def _laneStats(acqNums):
+    """gap and duplicate statistics of the acquisition numbers of a lane"""
+    unique = np.unique(acqNums)
+    step = np.diff(unique.astype(np.int64))
+    return {
+        'records'    : int(acqNums.shape[0]),
+        'firstAcq'   : int(unique[0]),
+        'lastAcq'    : int(unique[-1]),
+        'gaps'       : int(np.count_nonzero(step > 1)),
+        'missing'    : int(np.sum(step[step > 1] - 1)),
+        'duplicates' : int(acqNums.shape[0] - unique.shape[0]),
+    }
+
+
+def checkRun(dataFile, cameraType = 'ePixHr10kT', expectedSizes = None, batcher = False, balanceTolerance = 0):
+    """returns the integrity summary of a run
+
+    dataFile is a DataFile or a file name. expectedSizes are the frame sizes
+    in bytes the stream is configured for (DigitalAsicStreamAxi frame size),
+    CAMERA_FRAME_SIZES of cameraType if None. With batcher the records are
+    batcher super frames and the camera data sub frames are checked.
+    The run is healthy when the file is clean, every frame has an expected
+    size and no error, the lanes have no gaps or duplicates and their record
+    counts differ by at most balanceTolerance.
+    """
+    if not isinstance(dataFile, DataFile):
+        dataFile = DataFile(dataFile)
+    if expectedSizes is None:
+        expectedSizes = CAMERA_FRAME_SIZES.get(cameraType)
+
+    summary = {
+        'file'         : str(dataFile.filename),
+        'cameraType'   : cameraType,
+        'fileSize'     : int(dataFile.data.shape[0]),
+        'records'      : len(dataFile),
+        'truncated'    : bool(dataFile.truncated),
+        'skippedBytes' : dataFile.skippedBytes(),
+        'skippedRanges': int(dataFile.skipped.shape[0]),
+        'expectedSizes': None if expectedSizes is None else [int(s) for s in expectedSizes],
+        'channels'     : {},
+    }
+
+    if batcher:
+        channel, error, asicNum, isTOA, acqNum, frameSize, badRecords = _batcherColumns(dataFile, cameraType)
+        summary['badSuperFrames'] = int(badRecords)
+    else:
+        columns = decodeHeaders(dataFile, cameraType)
+        columns = columns[columns['valid']]
+        channel, error, asicNum, isTOA, acqNum, frameSize = columns['channel'], columns['error'], columns['asicNum'], columns['isTOA'], columns['acqNum'], columns['frameSize']
+
+    # records of every channel from the record index, frames from the headers
+    channels, counts = np.unique(dataFile.channels, return_counts=True)
+    for ch, count in zip(channels, counts):
+        summary['channels'][str(int(ch))] = {'records': int(count), 'lanes': {}}
+
+    # one lane per (channel, asic, TOA packet), sorted once for all the lane statistics
+    lane = (channel.astype(np.int64) * 256 + asicNum) * 2 + isTOA
+    order = np.lexsort((acqNum, lane))
+    lane, acqNum = lane[order], acqNum[order]
+    bounds = np.flatnonzero(np.diff(lane)) + 1
+    laneRecords = []
+    for start, stop in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [lane.shape[0]]))):
+        if stop == start:
+            continue
+        ch, asic = divmod(int(lane[start]) // 2, 256)
+        name = str(asic) + ('-toa' if int(lane[start]) % 2 else '')
+        stats = _laneStats(acqNum[start:stop])
+        summary['channels'].setdefault(str(ch), {'records': 0, 'lanes': {}})['lanes'][name] = stats
+        laneRecords.append(stats['records'])
+
+    for ch, info in summary['channels'].items():
+        sel = channel == int(ch)
+        sizes, sizeCounts = np.unique(frameSize[sel], return_counts=True)
+        info['frameSizes'] = {str(int(s)): int(c) for s, c in zip(sizes, sizeCounts)}
+        info['errors'] = int(np.count_nonzero(error[sel]))
+        if expectedSizes is None:
+            info['unexpectedSizes'] = 0
+        else:
+            info['unexpectedSizes'] = int(np.count_nonzero(~np.isin(frameSize[sel], expectedSizes)))
+
+    summary['laneImbalance'] = int(max(laneRecords) - min(laneRecords)) if laneRecords else 0
+
+    lanes = [stats for info in summary['channels'].values() for stats in info['lanes'].values()]
+    summary['healthy'] = bool(
+        not summary['truncated'] and summary['skippedBytes'] == 0 and summary.get('badSuperFrames', 0) == 0
+        and len(lanes) > 0
+        and all(info['unexpectedSizes'] == 0 and info['errors'] == 0 for info in summary['channels'].values())
+        and all(stats['gaps'] == 0 and stats['duplicates'] == 0 for stats in lanes)
+        and summary['laneImbalance'] <= balanceTolerance)
+    return summary
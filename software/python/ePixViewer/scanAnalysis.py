@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : scan analysis
+#-----------------------------------------------------------------------------
+# File       : scanAnalysis.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Analysis of the files of a parameter scan (for example the SDrst/SDclk
+# scan of _ePixFpga, one <name>_SDrst_<x>_SDclk_<y>.dat file per point) in
+# a single pool of processes. Every point file is streamed once (see
+# assembler.iterImages) and reduced to a few summary metrics, the metrics
+# of all points are assembled in one (SDrst, SDclk, metric) table.
+#
+# The metrics of a point are computed against a per pixel reference, the
+# median of the first batch of images (the scans are taken with a static
+# input): mean, noise (median over the pixels of the pixel standard
+# deviation), the samples, pixels and frames further than errorThreshold
+# from the reference and the records with an error flag. The bits in which
+# the error samples differ from the reference (bitErrors) tell a bit slip
+# of the deserializer from a noisy point.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import multiprocessing
+import numpy as np
+from ePixViewer.dataFile import DataFile
+from ePixViewer.headers import flagsChannel, flagsError
+from ePixViewer.assembler import iterImages
+from ePixViewer.dataSet import findSegments, parseScanParams
+
+SCAN_METRICS = ('numImages', 'mean', 'noise', 'errorSamples', 'errorPixels', 'errorFrames', 'errorRecords')
+NUM_BITS = 16
+
+
+################################################################################
+################################################################################
+#   Scan point statistics class
+#
+################################################################################
+class ScanPointStats():
+    """streaming summary metrics of the images of one scan point
+
+    errorThreshold is the distance (ADU) from the reference of an error
+    sample. The sums are kept as integers relative to the reference so
+    they are exact for any number of images.
+    """
+
+    def __init__(self, errorThreshold = 100):
+        self.errorThreshold = errorThreshold
+        self.numImages = 0
+        self.reference = None
+        self.errorFrames = 0
+        self.errorSamples = 0
+        self.bitErrors = np.zeros(NUM_BITS, dtype=np.int64)
+
+    def update(self, images):
+        """adds a (B, rows, cols) batch of images"""
+        if images.shape[0] == 0:
+            return
+        if self.reference is None:
+            self.reference = np.round(np.median(images, axis=0)).astype(np.uint16)
+            self.sum = np.zeros(self.reference.shape, dtype=np.int64)
+            self.sumSq = np.zeros(self.reference.shape, dtype=np.int64)
+            self.pixelErrors = np.zeros(self.reference.shape, dtype=np.int64)
+        delta = images.astype(np.int32) - self.reference
+        self.sum += delta.sum(axis=0)
+        self.sumSq += np.einsum('ijk,ijk->jk', delta, delta, dtype=np.int64)
+        errors = np.abs(delta) > self.errorThreshold
+        self.pixelErrors += errors.sum(axis=0)
+        self.errorFrames += int(np.count_nonzero(errors.any(axis=(1, 2))))
+        self.errorSamples += int(np.count_nonzero(errors))
+        if errors.any():
+            # bits in which the error samples differ from the reference
+            pattern = (images ^ self.reference)[errors]
+            for bit in range(NUM_BITS):
+                self.bitErrors[bit] += np.count_nonzero(pattern & (1 << bit))
+        self.numImages += images.shape[0]
+
+    def mean(self):
+        """mean of every pixel"""
+        return self.reference + self.sum / self.numImages
+
+    def std(self):
+        """standard deviation of every pixel"""
+        mean = self.sum / self.numImages
+        return np.sqrt(np.maximum(self.sumSq / self.numImages - mean * mean, 0))
+
+    def metrics(self):
+        """values of the SCAN_METRICS"""
+        if self.numImages == 0:
+            return {'numImages': 0}
+        return {
+            'numImages'    : self.numImages,
+            'mean'         : float(self.mean().mean()),
+            'noise'        : float(np.median(self.std())),
+            'errorSamples' : self.errorSamples,
+            'errorPixels'  : int(np.count_nonzero(self.pixelErrors)),
+            'errorFrames'  : self.errorFrames,
+        }
+
+
+def pointMetrics(filename, cameraType = 'ePixHr10kT', channel = None, batchSize = 256, maxImages = None, errorThreshold = 100):
+    """returns (metrics, bitErrors) of a scan point file, maxImages limits the
+    images used"""
+    dataFile = DataFile(filename)
+    try:
+        stats = ScanPointStats(errorThreshold)
+        for acqNums, images in iterImages(dataFile, cameraType, channel, batchSize, stop=maxImages):
+            stats.update(images)
+        metrics = stats.metrics()
+        flags = dataFile.flags if channel is None else dataFile.flags[flagsChannel(dataFile.flags) == channel]
+        metrics['errorRecords'] = int(np.count_nonzero(flagsError(flags)))
+        return metrics, stats.bitErrors
+    finally:
+        dataFile.close()
+
+
+def _pointWorker(task):
+    index, filename, kwargs = task
+    try:
+        return index, pointMetrics(filename, **kwargs), None
+    except Exception as e:
+        # a bad point does not stop the scan
+        return index, None, '%s: %s' % (type(e).__name__, e)
+
+
+################################################################################
+################################################################################
+#   Scan summary class
+#
+################################################################################
+class ScanSummary():
+    """metrics of the points of a scan
+
+    axes are the names of the scan parameters and values the sorted values
+    of every axis. metrics is (len(values[0]), ..., len(SCAN_METRICS)) and
+    bitErrors (..., NUM_BITS), NaN and -1 for the points without a file (or
+    whose file could not be read, see errors).
+    """
+
+    def __init__(self, axes, values, names = SCAN_METRICS):
+        self.axes = tuple(axes)
+        self.values = [np.asarray(v) for v in values]
+        self.names = tuple(names)
+        shape = tuple(len(v) for v in self.values)
+        self.metrics = np.full(shape + (len(self.names),), np.nan)
+        self.bitErrors = np.full(shape + (NUM_BITS,), -1, dtype=np.int64)
+        self.files = np.full(shape, '', dtype=object)
+        self.errors = {}
+
+    def metric(self, name):
+        """values of a metric at every point"""
+        return self.metrics[..., self.names.index(name)]
+
+    def table(self):
+        """one (axis values..., metrics...) row per point with a file"""
+        points = np.argwhere(self.files != '')
+        columns = [self.values[axis][points[:, axis]] for axis in range(len(self.axes))]
+        return np.column_stack(columns + [self.metrics[tuple(points.T)]])
+
+    def save(self, filename):
+        """writes the summary to an HDF5 file or a .npz file"""
+        data = {
+            'axes'      : np.array(self.axes, dtype='S'),
+            'names'     : np.array(self.names, dtype='S'),
+            'metrics'   : self.metrics,
+            'bitErrors' : self.bitErrors,
+            'files'     : self.files.astype('S'),
+        }
+        for axis, values in zip(self.axes, self.values):
+            data['axis_' + axis] = values
+        if filename.endswith('.npz'):
+            np.savez(filename, **data)
+        else:
+            import h5py
+            with h5py.File(filename, 'w') as f:
+                for name, value in data.items():
+                    f[name] = value
+
+    @classmethod
+    def load(cls, filename):
+        if filename.endswith('.npz'):
+            data = np.load(filename)
+        else:
+            import h5py
+            with h5py.File(filename, 'r') as f:
+                data = {name: f[name][()] for name in f.keys()}
+        axes = [a.decode() for a in data['axes']]
+        summary = cls(axes, [data['axis_' + axis] for axis in axes], [n.decode() for n in data['names']])
+        summary.metrics[...] = data['metrics']
+        summary.bitErrors[...] = data['bitErrors']
+        summary.files[...] = np.char.decode(data['files'])
+        return summary
+
+
+def scanRun(source, axes = ('SDrst', 'SDclk'), processes = None, output = None, **kwargs):
+    """computes the metrics of every point of a scan with a pool of processes
+
+    source is a glob pattern or a list of the point files, the point of a
+    file is given by the axes parameters of its name (see
+    dataSet.parseScanParams), files without them are ignored. kwargs go to
+    pointMetrics. Returns a ScanSummary, written to output if given.
+    """
+    files, _ = findSegments(source)
+    points = []
+    for filename in files:
+        params = parseScanParams(filename)
+        if all(axis in params for axis in axes):
+            points.append((filename, tuple(params[axis] for axis in axes)))
+    if not points:
+        raise ValueError("No scan points found for %s" % (source,))
+    values = [sorted(set(point[axis] for _, point in points)) for axis in range(len(axes))]
+    summary = ScanSummary(axes, values)
+
+    tasks = []
+    for filename, point in points:
+        index = tuple(values[axis].index(point[axis]) for axis in range(len(axes)))
+        summary.files[index] = filename
+        tasks.append((index, filename, kwargs))
+    # the largest files first, so the pool does not wait for one at the end
+    tasks.sort(key=lambda task: os.path.getsize(task[1]) if os.path.exists(task[1]) else 0, reverse=True)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(tasks) <= 1:
+        results = map(_pointWorker, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        results = pool.imap_unordered(_pointWorker, tasks)
+    try:
+        for index, result, error in results:
+            if error is not None:
+                summary.errors[summary.files[index]] = error
+                continue
+            metrics, bitErrors = result
+            summary.metrics[index] = [metrics.get(name, np.nan) for name in summary.names]
+            summary.bitErrors[index] = bitErrors
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if output is not None:
+        summary.save(output)
+    return summary
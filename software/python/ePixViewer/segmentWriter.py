@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : asynchronous segmented data writer
+#-----------------------------------------------------------------------------
+# File       : segmentWriter.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Writer of rogue .dat records (uint32 size, uint32 flags, payload) for
+# long runs. The records are copied into large page aligned buffers and a
+# background thread writes the full buffers, opens and closes the files,
+# so adding a record never waits for the disk: when every buffer is in
+# flight a new one is allocated (counted in extraBuffers) instead of
+# blocking the stream thread, up to maxBuffers buffers in flight (the
+# records that do not fit then are dropped and counted, the disk does not
+# keep up with the data rate).
+#
+# The run is split in segments at a size (maxFileSize bytes) or time
+# (maxFileTime seconds) limit, always at a record boundary so no record is
+# lost or cut. As the rogue StreamWriter, the segments of <name> are named
+# <name>.1, <name>.2, ... when a limit is set and <name> otherwise. Opening
+# and closing are queued like the data, a scan can switch files at every
+# point without stalling the stream.
+#
+# Every segment is listed in the manifest (<name>.manifest.json, rewritten
+# atomically when a segment is opened or closed) with its file name, its
+# byte offset in the file, its first record in the run, its number of
+# records and bytes and its times. Reopening a run continues it: the
+# numbering goes on after the last segment of the manifest and a file
+# written again (no limit set) is appended to, at the offset of its entry.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import json
+import time
+import queue
+import struct
+import threading
+import numpy as np
+
+PAGE_SIZE = 4096
+
+
+def alignedBuffer(size, align = PAGE_SIZE):
+    """returns a uint8 array of size bytes starting on an align boundary"""
+    raw = np.empty(size + align, dtype=np.uint8)
+    start = (-raw.ctypes.data) % align
+    return raw[start:start+size]
+
+
+def manifestName(dataFile):
+    return dataFile + '.manifest.json'
+
+
+def readManifest(filename):
+    """returns the manifest of a run, filename is the manifest or the run data file name"""
+    if not filename.endswith('.manifest.json'):
+        filename = manifestName(filename)
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+################################################################################
+################################################################################
+#   Segmented file writer class
+#
+################################################################################
+class SegmentedFileWriter():
+    """writes records to segmented .dat files from a background thread
+
+    bufferSize is the size of a write buffer (rounded up to a page),
+    numBuffers the buffers kept allocated and maxBuffers the most buffers
+    waiting to be written. maxFileSize and maxFileTime (0
+    for no limit) start a new segment before a record that would pass
+    them. open, close and addRecord only queue work and return at once,
+    stop waits for everything queued to be written.
+    """
+
+    def __init__(self, bufferSize = 16*1024*1024, numBuffers = 4, maxBuffers = 64, maxFileSize = 0, maxFileTime = 0):
+        self.bufferSize = -(-bufferSize // PAGE_SIZE) * PAGE_SIZE
+        self.numBuffers = numBuffers
+        self.maxBuffers = max(maxBuffers, numBuffers)
+        self.maxFileSize = maxFileSize
+        self.maxFileTime = maxFileTime
+        self.dataFile = None
+        self.isOpen = False
+        self.numRecords = 0
+        self.numBytes = 0
+        self.droppedRecords = 0
+        self.extraBuffers = 0
+        self.segmentCount = 0
+        self.error = None
+        self._lock = threading.Lock()
+        self._free = queue.SimpleQueue()
+        for _ in range(numBuffers):
+            self._free.put(alignedBuffer(self.bufferSize))
+        self._buffer = None
+        self._fill = 0
+        self._bufferRecords = 0
+        self._pending = 0
+        self._segmentBytes = 0
+        self._segmentStart = 0.0
+        self._work = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    #---------------------------------------------------------------------
+    # producer side, called from the stream and control threads
+    #---------------------------------------------------------------------
+    def _takeBuffer(self):
+        """returns a free buffer, None if maxBuffers are waiting to be written"""
+        if self._pending >= self.maxBuffers:
+            return None
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            self.extraBuffers += 1
+            return alignedBuffer(self.bufferSize)
+
+    def _handOff(self):
+        # queues the current buffer, called with the lock held
+        if self._buffer is not None and self._fill:
+            self._work.put(('data', self._buffer, self._fill, self._bufferRecords))
+            self._pending += 1
+            self._buffer = None
+        self._fill = 0
+        self._bufferRecords = 0
+
+    def _startSegment(self):
+        self._handOff()
+        self._segmentBytes = 0
+        self._segmentStart = time.monotonic()
+        self.segmentCount += 1
+        # the segment is named by the writer thread, from the manifest
+        self._work.put(('open', self.dataFile, bool(self.maxFileSize or self.maxFileTime)))
+
+    def open(self, dataFile):
+        """starts writing to dataFile, the current file is closed if it is another one"""
+        with self._lock:
+            if self.isOpen:
+                if dataFile == self.dataFile:
+                    return
+                self._handOff()
+                self._work.put(('close',))
+            self.dataFile = dataFile
+            self.isOpen = True
+            self._startSegment()
+
+    def rollover(self):
+        """starts a new segment of the current file at the next record"""
+        with self._lock:
+            if self.isOpen:
+                self._startSegment()
+
+    def close(self):
+        """queues the end of the current file, the records added after are dropped"""
+        with self._lock:
+            if not self.isOpen:
+                return
+            self._handOff()
+            self._work.put(('close',))
+            self.isOpen = False
+
+    def addRecord(self, flags, payload):
+        """adds a record, flags is the record flags word (channel 31:24).
+        Returns False if the record was dropped (writer closed)."""
+        size = len(payload) + 8
+        with self._lock:
+            if not self.isOpen:
+                self.droppedRecords += 1
+                return False
+            if self._segmentBytes and ((self.maxFileSize and self._segmentBytes + size > self.maxFileSize) or
+                                       (self.maxFileTime and time.monotonic() - self._segmentStart >= self.maxFileTime)):
+                self._startSegment()
+            if size > self.bufferSize:
+                # larger than a buffer, queued on its own
+                self._handOff()
+                if self._pending >= self.maxBuffers:
+                    self.droppedRecords += 1
+                    return False
+                record = np.empty(size, dtype=np.uint8)
+                struct.pack_into('<II', record, 0, size - 4, flags)
+                record[8:] = np.frombuffer(payload, dtype=np.uint8)
+                self._work.put(('data', record, size, 1))
+                self._pending += 1
+            else:
+                if self._buffer is None or self._fill + size > self.bufferSize:
+                    self._handOff()
+                    self._buffer = self._takeBuffer()
+                    if self._buffer is None:
+                        self.droppedRecords += 1
+                        return False
+                struct.pack_into('<II', self._buffer, self._fill, size - 4, flags)
+                self._buffer[self._fill+8:self._fill+size] = np.frombuffer(payload, dtype=np.uint8)
+                self._fill += size
+                self._bufferRecords += 1
+            self._segmentBytes += size
+            self.numRecords += 1
+            self.numBytes += size
+        return True
+
+    def stop(self):
+        """closes the file and waits for the writer thread to write everything"""
+        self.close()
+        self._work.put(None)
+        self._thread.join()
+
+    #---------------------------------------------------------------------
+    # writer thread
+    #---------------------------------------------------------------------
+    def _segmentName(self, dataFile, segments, numbered):
+        """name of the next segment of dataFile, numbered after the manifest segments"""
+        if not numbered:
+            return dataFile
+        prefix = os.path.basename(dataFile) + '.'
+        numbers = [int(s['file'][len(prefix):]) for s in segments
+                   if s['file'].startswith(prefix) and s['file'][len(prefix):].isdigit()]
+        return '%s.%d' % (dataFile, max(numbers, default=0) + 1)
+
+    def _writeManifest(self, dataFile, segments):
+        filename = manifestName(dataFile)
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'dataFile': dataFile, 'segments': segments}, f, indent=1)
+        os.replace(tmp, filename)
+
+    def _run(self):
+        f = None
+        segment = None
+        dataFile = None
+        manifests = {}
+        while True:
+            item = self._work.get()
+            if item is None:
+                return
+            try:
+                if item[0] == 'data':
+                    _, buf, nbytes, numRecords = item
+                    with self._lock:
+                        self._pending -= 1
+                    if f is not None:
+                        f.write(memoryview(buf)[:nbytes])
+                        segment['records'] += numRecords
+                        segment['bytes'] += nbytes
+                    # the extra buffers are released, the others go back to the pool
+                    if buf.shape[0] == self.bufferSize and self._free.qsize() < self.numBuffers:
+                        self._free.put(buf)
+                    continue
+                if f is not None:
+                    f.close()
+                    f = None
+                    segment['closed'] = time.time()
+                    self._writeManifest(dataFile, manifests[dataFile])
+                if item[0] == 'open':
+                    _, dataFile, numbered = item
+                    if dataFile not in manifests:
+                        # files are appended to, so are their manifests
+                        try:
+                            manifests[dataFile] = readManifest(dataFile)['segments']
+                        except (OSError, ValueError, KeyError):
+                            manifests[dataFile] = []
+                    segments = manifests[dataFile]
+                    name = self._segmentName(dataFile, segments, numbered)
+                    # large writes straight from the buffers, appended as the rogue writer does
+                    f = open(name, 'ab', buffering=0)
+                    segment = {
+                        'file'        : os.path.basename(name),
+                        'offset'      : f.tell(),
+                        'firstRecord' : sum(s['records'] for s in segments),
+                        'records'     : 0,
+                        'bytes'       : 0,
+                        'opened'      : time.time(),
+                        'closed'      : None,
+                    }
+                    segments.append(segment)
+                    self._writeManifest(dataFile, segments)
+            except Exception as e:
+                self.error = e
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : zero suppressed sparse frames
+#-----------------------------------------------------------------------------
+# File       : sparseFrames.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Sparse storage of low occupancy runs. Only the pixels of every frame
+# above a per pixel threshold are kept, in CSR layout:
+#   <name>Offsets : (N+1,) int64, pixels of frame n are [offsets[n], offsets[n+1])
+#   <name>Index   : (nnz,) uint32 flat pixel index (row * cols + col)
+#   <name>Value   : (nnz,) pixel value, dtype of the frames
+#   <name>Shape   : (2,) rows and cols of the frames
+# in an HDF5 file (or group) or a .npz file. The default name is adcData so
+# a converter can write adcDataOffsets/Index/Value in place of the dense
+# adcData dataset. SparseFrames reads the datasets back, rebuilding dense
+# frames or handing out the pixels frame by frame, the HDF5 datasets are
+# only read for the frames requested.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import numpy as np
+
+
+def sparsify(images, threshold):
+    """returns (counts, index, value) of the pixels of (N, rows, cols) images
+    above threshold (scalar or (rows, cols) array), counts per frame"""
+    images = np.asarray(images)
+    if images.ndim == 2:
+        images = images[None]
+    numPixels = images.shape[1] * images.shape[2]
+    mask = images > threshold
+    counts = np.count_nonzero(mask.reshape(images.shape[0], numPixels), axis=1)
+    index = (np.flatnonzero(mask) % numPixels).astype(np.uint32)
+    return counts, index, images[mask]
+
+
+def _isHdf5(target):
+    return not (isinstance(target, (str, os.PathLike)) and os.fspath(target).endswith('.npz'))
+
+
+################################################################################
+################################################################################
+#   Sparse writer class
+#
+################################################################################
+class SparseWriter():
+    """appends zero suppressed frames to an HDF5 file or group (growing
+    datasets) or to a .npz file (written on close)
+
+    target is a file name (.npz for numpy, HDF5 otherwise) or an open h5py
+    File/Group. threshold is the scalar or (rows, cols) per pixel threshold,
+    saved with the data as <name>Threshold.
+    """
+
+    def __init__(self, target, shape, threshold, dtype = np.uint16, name = 'adcData', chunk = 1 << 16):
+        self.shape = tuple(shape)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.dtype = np.dtype(dtype)
+        self.name = name
+        self.numFrames = 0
+        self.numPixels = 0
+        self._file = None
+        self._parts = None
+        if not _isHdf5(target):
+            self._filename = target
+            self._parts = {'counts': [], 'index': [], 'value': []}
+            return
+        import h5py
+        if isinstance(target, (str, os.PathLike)):
+            target = self._file = h5py.File(target, 'w')
+        self._offsets = target.create_dataset(name + 'Offsets', shape=(1,), maxshape=(None,), dtype='<i8', chunks=(4096,), data=[0])
+        self._index = target.create_dataset(name + 'Index', shape=(0,), maxshape=(None,), dtype='<u4', chunks=(chunk,))
+        self._value = target.create_dataset(name + 'Value', shape=(0,), maxshape=(None,), dtype=self.dtype, chunks=(chunk,))
+        target[name + 'Shape'] = np.array(self.shape)
+        target[name + 'Threshold'] = self.threshold
+
+    def append(self, images):
+        """zero suppresses and appends (N, rows, cols) frames"""
+        images = np.asarray(images)
+        if images.shape[-2:] != self.shape:
+            raise ValueError("Frames are %s, expected %s" % (images.shape[-2:], self.shape))
+        counts, index, value = sparsify(images, self.threshold)
+        value = value.astype(self.dtype, copy=False)
+        if self._parts is not None:
+            self._parts['counts'].append(counts)
+            self._parts['index'].append(index)
+            self._parts['value'].append(value)
+        else:
+            offsets = self.numPixels + np.cumsum(counts)
+            self._offsets.resize((self.numFrames + 1 + counts.shape[0],))
+            self._offsets[self.numFrames+1:] = offsets
+            self._index.resize((self.numPixels + index.shape[0],))
+            self._index[self.numPixels:] = index
+            self._value.resize((self.numPixels + value.shape[0],))
+            self._value[self.numPixels:] = value
+        self.numFrames += counts.shape[0]
+        self.numPixels += index.shape[0]
+
+    def close(self):
+        if self._parts is not None:
+            counts = np.concatenate(self._parts['counts']) if self._parts['counts'] else np.zeros(0, dtype=np.int64)
+            arrays = {
+                self.name + 'Offsets'   : np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+                self.name + 'Index'     : np.concatenate(self._parts['index']) if self._parts['index'] else np.zeros(0, dtype=np.uint32),
+                self.name + 'Value'     : np.concatenate(self._parts['value']) if self._parts['value'] else np.zeros(0, dtype=self.dtype),
+                self.name + 'Shape'     : np.array(self.shape),
+                self.name + 'Threshold' : self.threshold,
+            }
+            np.savez(self._filename, **arrays)
+            self._parts = None
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def writeSparse(target, images, threshold, name = 'adcData'):
+    """writes (N, rows, cols) frames zero suppressed in one call"""
+    images = np.asarray(images)
+    with SparseWriter(target, images.shape[-2:], threshold, images.dtype, name) as writer:
+        writer.append(images)
+    return writer
+
+
+################################################################################
+################################################################################
+#   Sparse frames reader class
+#
+################################################################################
+class SparseFrames():
+    """reads zero suppressed frames written by SparseWriter
+
+    source is a file name (.npz or HDF5) or an open h5py File/Group. The
+    frames behave as an (N, rows, cols) array of the pixels above threshold,
+    the suppressed pixels get fill (scalar or (rows, cols) array, for
+    example the pedestal).
+    """
+
+    def __init__(self, source, name = 'adcData', fill = 0):
+        self.name = name
+        self.fill = fill
+        self._file = None
+        if not _isHdf5(source):
+            data = np.load(source)
+            self._file = data
+        else:
+            import h5py
+            if isinstance(source, (str, os.PathLike)):
+                source = self._file = h5py.File(source, 'r')
+            data = source
+        # the offsets are small and read once, index and value stay on disk
+        self.offsets = np.asarray(data[name + 'Offsets'][...], dtype=np.int64)
+        self.shape = tuple(int(n) for n in data[name + 'Shape'][...])
+        self.index = data[name + 'Index']
+        self.value = data[name + 'Value']
+        self.threshold = np.asarray(data[name + 'Threshold'][...]) if (name + 'Threshold') in data else None
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def occupancy(self):
+        """fraction of the pixels of every frame above threshold"""
+        return np.diff(self.offsets) / float(self.shape[0] * self.shape[1])
+
+    def pixels(self, frame):
+        """returns (index, value) of the pixels of a frame above threshold"""
+        start, stop = self.offsets[frame], self.offsets[frame+1]
+        return np.asarray(self.index[start:stop]), np.asarray(self.value[start:stop])
+
+    def dense(self, start = 0, stop = None, out = None):
+        """returns the frames [start, stop) as a dense (N, rows, cols) array"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        num = max(stop - start, 0)
+        if out is None:
+            out = np.empty((num,) + self.shape, dtype=self.value.dtype)
+        elif not out.flags.c_contiguous:
+            # the pixels are scattered through a flat view of out
+            raise ValueError("out must be C contiguous")
+        out[...] = self.fill
+        if num == 0:
+            # empty range, start may be past the last frame
+            return out
+        first, last = self.offsets[start], self.offsets[start+num]
+        index = np.asarray(self.index[first:last], dtype=np.int64)
+        # frame of every pixel from the offsets, then one scatter for the whole range
+        frame = np.repeat(np.arange(num), np.diff(self.offsets[start:start+num+1]))
+        out.reshape(num, -1)[frame, index] = self.value[first:last]
+        return out
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return self.dense(start, stop)[::step]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("Frame %d out of range" % (key))
+        return self.dense(key, key+1)[0]
+
+    def iterFrames(self, batchSize = 256):
+        """yields (first frame, dense frames) batches"""
+        for start in range(0, len(self), batchSize):
+            yield start, self.dense(start, start + batchSize)
+
+    def iterPixels(self, batchSize = 256):
+        """yields (frame, index, value) of the pixels above threshold, read
+        batchSize frames at a time, frame the frame of each pixel"""
+        for start in range(0, len(self), batchSize):
+            stop = min(start + batchSize, len(self))
+            first, last = self.offsets[start], self.offsets[stop]
+            frame = np.repeat(np.arange(start, stop), np.diff(self.offsets[start:stop+1]))
+            yield frame, np.asarray(self.index[first:last]), np.asarray(self.value[first:last])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : LCLS-II timing index
+#-----------------------------------------------------------------------------
+# File       : timingIndex.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Index of the LCLS-II timing headers of a run and pulse id join across the
+# ASIC lanes. The DAQ writes lane n on file channel 0x10*n + 0x01, each
+# record a batcher super frame with a timing header sub frame and a camera
+# data sub frame. The timing headers of a lane are sorted by pulse id once,
+# the lanes are then joined with sorted array intersections and the joined
+# events are handed out in batches.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from ePixViewer.dataFile import DataFile, gatherBytes
+from ePixViewer.batcher import BatcherFile
+
+# one entry per event of a lane, sorted by pulse id
+TIMING_INDEX_DTYPE = np.dtype([
+    ('pulseId',   '<u8'),
+    ('timeStamp', '<u8'),
+    ('count',     '<u4'),
+    ('record',    '<i8'),
+    ('subFrame',  '<i8'),
+])
+
+
+def laneChannel(lane):
+    """file channel written by the DAQ for a lane"""
+    return 0x10*lane + 0x01
+
+
+################################################################################
+################################################################################
+#   Lane timing index class
+#
+################################################################################
+class LaneTimingIndex():
+    """timing index of one lane
+
+    index      : TIMING_INDEX_DTYPE array sorted by pulse id, subFrame is the
+                 camera data sub frame of the event in batcherFile
+    duplicates : number of events dropped because their pulse id was seen before
+    unmatched  : number of super frames with a timing header and no data (or
+                 the other way around)
+    """
+
+    def __init__(self, dataFile, lane, timingDest=None, dataDest=None):
+        self.lane = lane
+        self.batcherFile = BatcherFile(dataFile, channel=laneChannel(lane))
+        bf = self.batcherFile
+
+        self.dataDest   = bf.dataDest() if dataDest is None else dataDest
+        self.timingDest = bf.timingDest(self.dataDest) if timingDest is None else timingDest
+        if self.timingDest is None:
+            raise ValueError("No timing destination found for lane %d" % (lane))
+
+        timingIdx = bf.select(self.timingDest)
+        dataIdx   = bf.select(self.dataDest)
+        timing    = bf.timingHeaders(self.timingDest)
+
+        # pairs the timing and data sub frames of the same super frame
+        common, ti, di = np.intersect1d(bf.subFrames['record'][timingIdx], bf.subFrames['record'][dataIdx], assume_unique=True, return_indices=True)
+        self.unmatched = (timingIdx.shape[0] - ti.shape[0]) + (dataIdx.shape[0] - di.shape[0])
+
+        index = np.empty(common.shape[0], dtype=TIMING_INDEX_DTYPE)
+        index['pulseId']   = timing['pulseId'][ti]
+        index['timeStamp'] = timing['timeStamp'][ti]
+        index['count']     = timing['count'][ti]
+        index['record']    = common
+        index['subFrame']  = dataIdx[di]
+
+        index = index[np.argsort(index['pulseId'], kind='stable')]
+        keep = np.ones(index.shape[0], dtype=bool)
+        keep[1:] = index['pulseId'][1:] != index['pulseId'][:-1]
+        self.duplicates = int(index.shape[0] - np.count_nonzero(keep))
+        self.index = index[keep]
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def frames(self, positions, dtype=np.uint16):
+        """returns the camera data of the index entries at positions as (N, size)"""
+        sub = self.batcherFile.subFrames[self.index['subFrame'][positions]]
+        if sub.shape[0] and np.any(sub['size'] != sub['size'][0]):
+            raise ValueError("Camera frames of lane %d do not have the same size" % (self.lane))
+        size = int(sub['size'][0]) if sub.shape[0] else 0
+        return gatherBytes(self.batcherFile.data, sub['offset'], size).view(dtype)
+
+
+################################################################################
+################################################################################
+#   Timing index class
+#
+################################################################################
+class TimingIndex():
+    """pulse id index and join of the lanes of an LCLS-II run"""
+
+    def __init__(self, dataFile, lanes=(0, 1, 2), timingDest=None, dataDest=None):
+        if not isinstance(dataFile, DataFile):
+            dataFile = DataFile(dataFile)
+        self.dataFile = dataFile
+        self.lanes = {}
+        for lane in lanes:
+            self.lanes[lane] = LaneTimingIndex(dataFile, lane, timingDest=timingDest, dataDest=dataDest)
+
+    def join(self, lanes=None):
+        """merge joins the lanes on pulse id
+
+        returns (pulseIds, positions) where positions[lane] holds, for every
+        joined pulse id, the position of the event in self.lanes[lane].index
+        """
+        lanes = list(self.lanes.keys()) if lanes is None else list(lanes)
+        pulseIds  = self.lanes[lanes[0]].index['pulseId']
+        positions = {lanes[0]: np.arange(pulseIds.shape[0])}
+        for lane in lanes[1:]:
+            pulseIds, prev, cur = np.intersect1d(pulseIds, self.lanes[lane].index['pulseId'], assume_unique=True, return_indices=True)
+            for key in positions:
+                positions[key] = positions[key][prev]
+            positions[lane] = cur
+        return pulseIds, positions
+
+    def missing(self, lanes=None):
+        """returns the number of events of each lane that are absent from the join"""
+        pulseIds, positions = self.join(lanes)
+        return {lane: len(self.lanes[lane]) - pulseIds.shape[0] for lane in positions}
+
+    def iterEvents(self, batchSize=1000, lanes=None, dtype=np.uint16):
+        """yields the joined events in batches of batchSize
+
+        each batch is (pulseIds, timing, frames): timing[lane] the
+        TIMING_INDEX_DTYPE entries and frames[lane] the (N, size) camera data
+        """
+        pulseIds, positions = self.join(lanes)
+        for start in range(0, pulseIds.shape[0], batchSize):
+            timing = {}
+            frames = {}
+            for lane, pos in positions.items():
+                pos = pos[start:start+batchSize]
+                timing[lane] = self.lanes[lane].index[pos]
+                frames[lane] = self.lanes[lane].frames(pos, dtype)
+            yield pulseIds[start:start+batchSize], timing, frames
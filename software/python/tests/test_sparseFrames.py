@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : sparse frames tests
+#-----------------------------------------------------------------------------
+# File       : test_sparseFrames.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Round trip of zero suppressed frames through a .npz file, run with
+#   python -m pytest software/python/tests
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ePixViewer.sparseFrames import SparseFrames, SparseWriter, writeSparse
+
+SHAPE = (4, 6)
+
+
+def _frames(num):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 20, (num,) + SHAPE).astype(np.uint16)
+
+
+def test_dense(tmp_path):
+    images = _frames(10)
+    filename = str(tmp_path / 'frames.npz')
+    writeSparse(filename, images, threshold=15)
+    frames = SparseFrames(filename)
+    expected = np.where(images > 15, images, 0)
+    assert len(frames) == 10
+    assert np.array_equal(frames.dense(), expected)
+    assert np.array_equal(frames[2:7:2], expected[2:7:2])
+    assert np.array_equal(frames[3], expected[3])
+
+
+def test_dense_empty_range(tmp_path):
+    filename = str(tmp_path / 'frames.npz')
+    writeSparse(filename, _frames(10), threshold=15)
+    frames = SparseFrames(filename)
+    for empty in (frames[10:10], frames[len(frames):], frames[5:5], frames.dense(12, 20)):
+        assert empty.shape == (0,) + SHAPE
+
+
+def test_dense_no_frames(tmp_path):
+    filename = str(tmp_path / 'frames.npz')
+    SparseWriter(filename, SHAPE, threshold=15).close()
+    frames = SparseFrames(filename)
+    assert len(frames) == 0
+    assert frames.dense().shape == (0,) + SHAPE
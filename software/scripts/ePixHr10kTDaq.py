@@ -83,6 +83,14 @@ parser.add_argument(
     help     = "true to show gui",
 )  
 
+parser.add_argument(
+    "--mosaic", 
+    type     = str,
+    required = False,
+    default  = 'False',
+    help     = "true to show all ASICs in a single mosaic viewer instead of one viewer per ASIC",
+)  
+
 parser.add_argument(
     "--verbose", 
     type     = str,
@@ -107,6 +115,14 @@ parser.add_argument(
     help     = "same port defined in the vhdl testbench",
 )  
 
+parser.add_argument(
+    "--calibDir", 
+    type     = str,
+    required = False,
+    default  = '',
+    help     = "calibration store directory, the viewers reuse the dark images taken with the configuration loaded by InitASIC",
+)
+
 # Get the arguments
 args = parser.parse_args()
 # string to boolean
@@ -256,6 +272,9 @@ class Board(pr.Root):
         @self.command()
         def DisplayViewer3():
             self.onlineViewer3.show()
+        @self.command()
+        def DisplayMosaicViewer():
+            self.mosaicViewer.show()
 
         # Add Devices
         #if ( args.type == 'kcu1500' ):
@@ -303,39 +322,58 @@ with Board(guiTop, cmd, dataWriter, srp, pollEn=pollEn, timeout=timeout) as ePix
     #    guiTop.resize(800,800)
 
     # Viewer gui
-    ePixHrBoard.onlineViewer0 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose)
+    calibDir = args.calibDir if args.calibDir != '' else None
+    ePixHrBoard.onlineViewer0 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose, calibDir=calibDir, calibAsic=0)
     ePixHrBoard.onlineViewer0.eventReader.frameIndex = 0
     ePixHrBoard.onlineViewer0.setReadDelay(0)
     ePixHrBoard.onlineViewer0.setWindowTitle("ePix image viewer ASIC 0")
     ePixHrBoard.onlineViewer0.eventReader.setDataDisplayParameters(0,0)
     pyrogue.streamTap(pgpL0Vc1, ePixHrBoard.onlineViewer0.eventReader)
-    ePixHrBoard.onlineViewer1 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose)
+    ePixHrBoard.onlineViewer1 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose, calibDir=calibDir, calibAsic=1)
     ePixHrBoard.onlineViewer1.eventReader.frameIndex = 0 
     ePixHrBoard.onlineViewer1.setReadDelay(0)
     ePixHrBoard.onlineViewer1.setWindowTitle("ePix image viewer ASIC 1")
     ePixHrBoard.onlineViewer1.eventReader.setDataDisplayParameters(0,1)
     pyrogue.streamTap(pgpL1Vc1, ePixHrBoard.onlineViewer1.eventReader)
-    ePixHrBoard.onlineViewer2 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose)
+    ePixHrBoard.onlineViewer2 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose, calibDir=calibDir, calibAsic=2)
     ePixHrBoard.onlineViewer2.eventReader.frameIndex = 0
     ePixHrBoard.onlineViewer2.setReadDelay(0)
     ePixHrBoard.onlineViewer2.setWindowTitle("ePix image viewer ASIC 2")
     ePixHrBoard.onlineViewer2.eventReader.setDataDisplayParameters(0,2)
     pyrogue.streamTap(pgpL2Vc1, ePixHrBoard.onlineViewer2.eventReader)
-    ePixHrBoard.onlineViewer3 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose)
+    ePixHrBoard.onlineViewer3 = vi.Window(cameraType='ePixHr10kT', verbose=args.verbose, calibDir=calibDir, calibAsic=3)
     ePixHrBoard.onlineViewer3.eventReader.frameIndex = 0
     ePixHrBoard.onlineViewer3.setReadDelay(0)
     ePixHrBoard.onlineViewer3.setWindowTitle("ePix image viewer ASIC 3")
     ePixHrBoard.onlineViewer3.eventReader.setDataDisplayParameters(0,3)
     pyrogue.streamTap(pgpL3Vc1, ePixHrBoard.onlineViewer3.eventReader)
+    # Mosaic viewer, assembles the four lanes into a single detector image
+    ePixHrBoard.mosaicViewer = vi.MosaicWindow(cameraType='ePixHr10kT', numLanes=4, verbose=args.verbose)
+    ePixHrBoard.mosaicViewer.setWindowTitle("ePix mosaic viewer ASIC 0-3")
+    if (args.type != 'dataFile'):
+        pyrogue.streamTap(pgpL0Vc1, ePixHrBoard.mosaicViewer.laneReaders[0])
+        pyrogue.streamTap(pgpL1Vc1, ePixHrBoard.mosaicViewer.laneReaders[1])
+        pyrogue.streamTap(pgpL2Vc1, ePixHrBoard.mosaicViewer.laneReaders[2])
+        pyrogue.streamTap(pgpL3Vc1, ePixHrBoard.mosaicViewer.laneReaders[3])
     if (args.type != 'dataFile'):
         pyrogue.streamTap(pgpL0Vc2, ePixHrBoard.onlineViewer0.eventReaderScope)# PseudoScope
         pyrogue.streamTap(pgpL0Vc3, ePixHrBoard.onlineViewer0.eventReaderMonitoring) # Slow Monitoring
 
-    if (args.start_viewer == 'False'):
+    # the viewers use the dark images taken with the configuration loaded by InitASIC
+    def updateCalibFingerprint(path, value):
+        fingerprint = vi.deviceFingerprint(ePixHrBoard.EpixHR, routine=ePixHrBoard.EpixHR.InitAsicRoutine.value())
+        for viewer in (ePixHrBoard.onlineViewer0, ePixHrBoard.onlineViewer1, ePixHrBoard.onlineViewer2, ePixHrBoard.onlineViewer3):
+            viewer.setCalibFingerprint(fingerprint)
+    if (calibDir is not None):
+        ePixHrBoard.EpixHR.InitAsicRoutine.addListener(updateCalibFingerprint)
+
+    if (args.start_viewer == 'False' or args.mosaic != 'False'):
         ePixHrBoard.onlineViewer0.hide()
         ePixHrBoard.onlineViewer1.hide()
         ePixHrBoard.onlineViewer2.hide()
         ePixHrBoard.onlineViewer3.hide()
+    if (args.start_viewer == 'False' or args.mosaic == 'False'):
+        ePixHrBoard.mosaicViewer.hide()
 
 
     if ( args.type == 'dataFile' or args.type == 'SIM'):
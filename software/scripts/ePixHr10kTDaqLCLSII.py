@@ -32,6 +32,7 @@ import surf
 import surf.axi
 import surf.protocols.ssi
 import epix_hr_core as epixHr
+import epix_hr_single_10k as epixHrRoot
 
 
 import threading
@@ -94,6 +95,14 @@ parser.add_argument(
     help     = "true to show gui",
 )  
 
+parser.add_argument(
+    "--eventBuilder", 
+    type     = str,
+    required = False,
+    default  = 'False',
+    help     = "true to align the ASIC lanes by timing pulse id before the viewers",
+)  
+
 parser.add_argument(
     "--verbose", 
     type     = str,
@@ -118,6 +127,14 @@ parser.add_argument(
     help     = "same port defined in the vhdl testbench",
 )  
 
+parser.add_argument(
+    "--calibDir", 
+    type     = str,
+    required = False,
+    default  = '',
+    help     = "calibration store directory, the viewers reuse the dark images taken with the configuration loaded by InitASIC",
+)
+
 # Get the arguments
 args = parser.parse_args()
 # string to boolean
@@ -170,7 +187,7 @@ class DataDebug(rogue.interfaces.stream.Slave):
             ba = bytearray(frameSize)
             frame.read(ba, 0)
             if self.enPrint:
-                print(f"Raw timing data channel 2 - {len(ba)} bytes")
+                print(f"Raw camera data channel 2 - {len(ba)} bytes")
                 print(frame.getNumpy(0, frameSize))
                 print('-------------------------')
 
@@ -179,7 +196,7 @@ class DataDebug(rogue.interfaces.stream.Slave):
             ba = bytearray(frameSize)
             frame.read(ba, 0)
             if self.enPrint:
-                print(f"Raw camera data channel 3- {len(ba)} bytes")
+                print(f"Raw data channel 3 - {len(ba)} bytes")
                 print(frame.getNumpy(0, frameSize))
                 print('-------------------------')            
             
@@ -212,6 +229,21 @@ class Board(pr.Root):
         self._dbg       = [DataDebug(name='DataDebug',enPrint=True) for lane in range(3)]
         self.unbatchers = [rogue.protocols.batcher.SplitterV1() for lane in range(3)]
         self.dataFilter = [rogue.interfaces.stream.Filter(False, dataCh+3) for dataCh in range(3)]
+        # unbatched stream shared by the debug printout and the viewers, each with its own rate
+        self.fanout     = [epixHrRoot.StreamFanout(name=f'Fanout{lane}', expand=False) for lane in range(3)]
+        self.add(self.fanout)
+        if (self.args.eventBuilder != 'False'):
+            # channel map in epix_hr_single_10k._EventBuilder
+            self.add(epixHrRoot.EventBuilder(name='EventBuilder', numLanes=3, keyMode='pulseId',
+                                             dataChannel=epixHrRoot.LCLSII_DATA_CHANNEL, timingChannel=epixHrRoot.LCLSII_TIMING_CHANNEL))
+            for lane in range(3):
+                self.unbatchers[lane] >> self.EventBuilder.lane[lane]
+                self.EventBuilder.out[lane] >> self.fanout[lane].input
+        else:
+            for lane in range(3):
+                self.unbatchers[lane] >> self.fanout[lane].input
+        for lane in range(3):
+            self.fanout[lane].addConsumer('DataDebug', mode='All') >> self._dbg[lane]
 
         
         # Add PGP virtual channels
@@ -219,7 +251,7 @@ class Board(pr.Root):
             # Connect the streams
             for lane in range(3):
                 self.dmaStreams[lane] = rogue.hardware.axi.AxiStreamDma(dev,(0x100*lane)+dataVc,1)
-                self.dmaStreams[lane] >> self.unbatchers[lane] >> self._dbg[lane]
+                self.dmaStreams[lane] >> self.unbatchers[lane]
             # connect
             self.dmaCtrlStreams[0] = rogue.hardware.axi.AxiStreamDma(dev,(0x100*0)+0,1)# Registers  
             self.dmaCtrlStreams[1] = rogue.hardware.axi.AxiStreamDma(dev,(0x100*0)+2,1)# PseudoScope
@@ -233,7 +265,7 @@ class Board(pr.Root):
             # Connect the streams
             for lane in range(3):
                 self.dmaStreams[lane] = rogue.interfaces.stream.TcpClient('localhost',args.tcpPort+(34*lane)+2*1) # VC1
-                self.dmaStreams[lane] >> self.unbatchers[lane] >> self._dbg[lane]
+                self.dmaStreams[lane] >> self.unbatchers[lane]
             # connect
             self.dmaCtrlStreams[0] = rogue.interfaces.stream.TcpClient('localhost',args.tcpPort+(34*0)+2*0) # VC0, Registers  
             self.dmaCtrlStreams[1] = rogue.interfaces.stream.TcpClient('localhost',args.tcpPort+(34*0)+2*2) # VC2, PseudoScope
@@ -260,13 +292,18 @@ class Board(pr.Root):
         # Viewer gui
         self.onlineViewers = [None for lane in range(3)]
         for viewerNum in range(3):
-            self.onlineViewers[viewerNum] = vi.Window(cameraType='ePixHr10kTBatcher', verbose=self.args.verbose)
+            self.onlineViewers[viewerNum] = vi.Window(cameraType='ePixHr10kTBatcher', verbose=self.args.verbose, calibDir=(self.args.calibDir if self.args.calibDir != '' else None), calibAsic=viewerNum)
             self.onlineViewers[viewerNum].eventReader.frameIndex = 0
             self.onlineViewers[viewerNum].setReadDelay(0)
             self.onlineViewers[viewerNum].setWindowTitle("ePix image viewer ASIC %d" % (viewerNum))
             self.onlineViewers[viewerNum].eventReader.setDataDisplayParameters(2,viewerNum)
 #            self.unbatchers[viewerNum]  >> self.dataFilter[viewerNum] >> self.onlineViewers[viewerNum].eventReader
-            self.unbatchers[viewerNum]  >> self.onlineViewers[viewerNum].eventReader
+            # the event builder only forwards its data channel
+            if (self.args.eventBuilder != 'False'):
+                viewerChannel = epixHrRoot.LCLSII_DATA_CHANNEL
+            else:
+                viewerChannel = self.onlineViewers[viewerNum].eventReader.VIEW_DATA_CHANNEL_ID
+            self.fanout[viewerNum].addConsumer('Viewer', mode='Period', period=0.2, channel=viewerChannel) >> self.onlineViewers[viewerNum].eventReader
             self.dmaCtrlStreams[1] >> self.onlineViewers[viewerNum].eventReaderScope
             self.dmaCtrlStreams[2] >> self.onlineViewers[viewerNum].eventReaderMonitoring
 
@@ -293,8 +330,15 @@ class Board(pr.Root):
         if ( self.args.type == 'kcu1500' ):
             self.add(epixHr.SysReg(name='Core', memBase=self._srp, offset=0x00000000, sim=self._sim, expand=False, pgpVersion=4,numberOfLanes=3))
         self.add(fpga.EpixHR10kT(name='EpixHR', memBase=self._srp, offset=0x80000000, hidden=False, enabled=True, asicVersion=args.asicVersion))
+        # the viewers use the dark images taken with the configuration loaded by InitASIC
+        if (self.args.calibDir != ''):
+            self.EpixHR.InitAsicRoutine.addListener(self._updateCalibFingerprint)
         self.add(pyrogue.RunControl(name = 'runControl', description='Run Controller hr', cmd=self.Trigger, rates={1:'1 Hz', 2:'2 Hz', 4:'4 Hz', 8:'8 Hz', 10:'10 Hz', 30:'30 Hz', 60:'60 Hz', 120:'120 Hz'}))
 
+    def _updateCalibFingerprint(self, path, value):
+        fingerprint = vi.deviceFingerprint(self.EpixHR, routine=self.EpixHR.InitAsicRoutine.value())
+        for viewer in self.onlineViewers:
+            viewer.setCalibFingerprint(fingerprint)
 
         
 
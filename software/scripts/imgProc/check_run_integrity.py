@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : run integrity check script
+#-----------------------------------------------------------------------------
+# File       : check_run_integrity.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Checks a run from its headers only before launching the conversions and
+# writes the json summary (records per channel, frame sizes, acquisition
+# number gaps and duplicates, lane balance) to stdout or to a file.
+# The exit code is 0 for a healthy run and 1 otherwise.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import sys
+import json
+import argparse
+from ePixViewer.runCheck import checkRun
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
+# Add arguments
+parser.add_argument(
+    "filenames",
+    nargs    = '+',
+    help     = "rogue .dat files to check",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = 'ePixHr10kT',
+    help     = "camera type used to decode the frame headers",
+)
+
+parser.add_argument(
+    "--frameSize",
+    type     = int,
+    nargs    = '+',
+    required = False,
+    default  = None,
+    help     = "expected frame sizes in bytes (default from the camera type)",
+)
+
+parser.add_argument(
+    "--batcher",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "true if the records are batcher super frames (LCLS-II timing runs)",
+)
+
+parser.add_argument(
+    "--balanceTolerance",
+    type     = int,
+    required = False,
+    default  = 0,
+    help     = "allowed difference between the record counts of the lanes",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "json file to write the summary to (stdout if not given)",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+summaries = []
+for filename in args.filenames:
+    summaries.append(checkRun(filename, cameraType = args.cameraType, expectedSizes = args.frameSize, batcher = args.batcher, balanceTolerance = args.balanceTolerance))
+
+result = summaries[0] if len(summaries) == 1 else summaries
+if args.output is None:
+    json.dump(result, sys.stdout, indent=2)
+    print()
+else:
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+sys.exit(0 if all(s['healthy'] for s in summaries) else 1)
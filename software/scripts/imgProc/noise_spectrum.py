@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : noise power spectrum script
+#-----------------------------------------------------------------------------
+# File       : noise_spectrum.py
+# Created    : 2026-10-19
+#-----------------------------------------------------------------------------
+# Description:
+# Computes the averaged noise power spectra of a run (pixel, column mean and
+# ADC bank mean series at the frame rate) or of its pseudo scope traces and
+# writes them to an HDF5 file, replacing the _traces.csv export and the
+# FFTs done by hand.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os
+import h5py
+import argparse
+from ePixViewer.noiseSpectrum import noiseRun, scopeRun, SCOPE_CHANNEL
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Convert str to bool
+argBool = lambda s: s.lower() in ['true', 't', 'yes', '1']
+
+# Add arguments
+parser.add_argument(
+    "filename",
+    type     = str,
+    help     = "rogue .dat file to analyse",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = 'ePixHr10kT',
+    help     = "camera type of the images",
+)
+
+parser.add_argument(
+    "--channel",
+    type     = int,
+    required = False,
+    default  = None,
+    help     = "channel of the records (images: all, scope: %d)" % (SCOPE_CHANNEL),
+)
+
+parser.add_argument(
+    "--scope",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "true to analyse the pseudo scope traces instead of the images",
+)
+
+parser.add_argument(
+    "--nperseg",
+    type     = int,
+    required = False,
+    default  = 256,
+    help     = "samples per Welch segment",
+)
+
+parser.add_argument(
+    "--overlap",
+    type     = float,
+    required = False,
+    default  = 0.5,
+    help     = "overlap of the segments (fraction)",
+)
+
+parser.add_argument(
+    "--rate",
+    type     = float,
+    required = False,
+    default  = 1.0,
+    help     = "frame rate (images) or sample rate (scope) in Hz",
+)
+
+parser.add_argument(
+    "--pixels",
+    type     = argBool,
+    required = False,
+    default  = True,
+    help     = "true to compute the spectrum of every pixel",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "HDF5 output file (default <filename>_noise.hdf5)",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+output = args.output
+if output is None:
+    output = os.path.splitext(args.filename)[0] + "_noise.hdf5"
+
+if args.scope:
+    channel = SCOPE_CHANNEL if args.channel is None else args.channel
+    accumulator = scopeRun(args.filename, channel, nperseg = args.nperseg, overlap = args.overlap, sampleRate = args.rate)
+    with h5py.File(output, 'w') as f:
+        f['numSegments'] = accumulator.numSegments
+        f['frequencies'] = accumulator.frequencies()
+        if accumulator.numSegments:
+            f['traceSpectrum'] = accumulator.spectrum()
+    print("Scope spectra of %d segments written to %s" % (accumulator.numSegments, output))
+else:
+    spectrum = noiseRun(args.filename, args.cameraType, args.channel, h5File = output, nperseg = args.nperseg, overlap = args.overlap, frameRate = args.rate, pixels = args.pixels)
+    print("Noise spectra of %d frames written to %s" % (spectrum.numFrames, output))
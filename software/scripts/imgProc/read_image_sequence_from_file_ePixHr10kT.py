@@ -19,17 +19,30 @@
 # contained in the LICENSE.txt file.
 #-----------------------------------------------------------------------------
 
-import os, sys, time
+import setupLibPaths
+import sys
+import numpy as np
+from ePixViewer.scanAnalysis import scanRun
 
+# frames used per scan point, -1 for all (as the single file script)
+MAX_NUMBER_OF_FRAMES_PER_POINT = 1000
 
-if (len(sys.argv[1])>0):
+if (len(sys.argv) > 1 and len(sys.argv[1])>0):
     rootFilename = sys.argv[1]
 else:
     rootFilename = "/data/10kTHR/externalVoltage/125MHz/ePix10kT_clk125MHz_hsDAC_static_8000h_10fps"
 
-for SDrstValue  in range(16):
-    for SDclkValue  in range(16):
-        currentFilename = rootFilename +"_SDrst_"+ str(SDrstValue)+"_SDclk_"+ str(SDclkValue)+".dat"
-        command = 'python3 scripts/imgProc/read_image_from_file_ePixHr10kT.py ' + currentFilename
-        print(command)
-        os.system(command)
+if __name__ == '__main__':
+    # all the points are analysed by one pool of processes, each file is read once
+    maxImages = None if MAX_NUMBER_OF_FRAMES_PER_POINT == -1 else MAX_NUMBER_OF_FRAMES_PER_POINT
+    summary = scanRun(rootFilename + "_SDrst_*_SDclk_*.dat", axes = ('SDrst', 'SDclk'), maxImages = maxImages,
+                      output = rootFilename + "_scan.hdf5")
+    for filename, error in summary.errors.items():
+        print("Failed %s: %s" % (filename, error))
+
+    np.set_printoptions(linewidth = 200)
+    print("SDrst %s, SDclk %s" % (summary.values[0], summary.values[1]))
+    for name in ('noise', 'errorFrames'):
+        print(name)
+        print(summary.metric(name))
+    print("Summary saved to %s" % (rootFilename + "_scan.hdf5"))
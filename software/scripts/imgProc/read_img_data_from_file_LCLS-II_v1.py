@@ -23,6 +23,9 @@ import os, sys, time
 import numpy as np
 import ePixViewer.Cameras as cameras
 import ePixViewer.imgProcessing as imgPr
+from ePixViewer.batcher import BatcherFile
+from ePixViewer.calibStore import CalibStore
+from ePixViewer.sparseFrames import SparseWriter
 # 
 import matplotlib   
 #matplotlib.use('QT4Agg')
@@ -51,45 +54,16 @@ PLOT_IMAGE_HEATMAP    = False
 PLOT_SET_HISTOGRAM    = False
 PLOT_ADC_VS_N         = False
 SAVEHDF5              = True
+# calibration store and fingerprint of the configuration, the matching
+# pedestal and noise maps are saved with the images when both are set
+CALIB_DIR             = None
+CALIB_FINGERPRINT     = None
+CALIB_ASIC            = 0
+# zero suppression threshold (number or .npy file of the per pixel threshold),
+# the images are saved sparse (adcDataOffsets/Index/Value) instead of adcData if set
+SPARSE_THRESHOLD      = None
 
 
-##################################################
-# Dark images
-##################################################
-def getData(localFile):
-
-    file_header = [0]
-    numberOfFrames = 0
-    previousSize = 0
-    while ((len(file_header)>0) and ((numberOfFrames<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-        try:
-            # reads file header [the number of bytes to read, EVIO]
-            file_header = np.fromfile(localFile, dtype='uint32', count=2)
-            payloadSize = int(file_header[0]/2)-2 #-1 is need because size info includes the second word from the header
-            newPayload = np.fromfile(f, dtype='uint16', count=58) #(frame size splited by four to read 32 bit 
-            newPayload = np.fromfile(f, dtype='uint16', count=payloadSize-58) #(frame size splited by four to read 32 bit 
-            #save only serial data frames
-            if (numberOfFrames == 0):
-                allFrames = [newPayload.copy()]
-            else:
-                newFrame  = [newPayload.copy()]
-                allFrames = np.append(allFrames, newFrame, axis = 0)
-            numberOfFrames = numberOfFrames + 1 
-            #print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-            previousSize = file_header
-       
-            if (numberOfFrames%1000==0):
-                print("Read %d frames" % numberOfFrames)
-                print("Payload size %d " % payloadSize)
-
-        except Exception: 
-            e = sys.exc_info()[0]
-            #print ("Message\n", e)
-            print ('size', file_header, 'previous size', previousSize)
-            print("numberOfFrames read: " ,numberOfFrames)
-
-    return allFrames
-
 def getDescImaData(localAllFrames):
 ##################################################
 # image descrambling
@@ -137,22 +111,28 @@ else:
 
 currentCam = cameras.Camera(cameraType = cameraType)
 
-f = open(filename, mode = 'rb')
+# splits the batcher super frames, the camera data is the largest sub frame
+batcherFile = BatcherFile(filename)
+dataDest = batcherFile.dataDest()
+print("Batcher destinations", batcherFile.dests(), "camera data on", dataDest, "bad super frames", len(batcherFile.badRecords))
+allFrames = batcherFile.frames(dataDest, dtype=np.uint16)
+headers = allFrames[:,0:6]
+print("all Frames", allFrames.shape)
+
+# timing header sub frames, if any
+timingHeaders = None
+for dest in batcherFile.dests():
+    if dest != dataDest and len(batcherFile.select(dest)) == allFrames.shape[0]:
+        timingHeaders = batcherFile.timingHeaders(dest)
+
 imgDesc = []
-for i in range(200):
-    print("Starting to get data set %d" % (i))
-    allFrames = currentCam.getData(f,8)
-    print("all Frames", allFrames.shape)
-    
-    imgDesc2 = getDescImaData(allFrames[:,:-8])
+for i in range(0, allFrames.shape[0], MAX_NUMBER_OF_FRAMES_PER_BATCH):
+    print("Starting to get data set %d" % (i//MAX_NUMBER_OF_FRAMES_PER_BATCH))
+    imgDesc2 = getDescImaData(allFrames[i:i+MAX_NUMBER_OF_FRAMES_PER_BATCH])
     if i == 0:
-        headers = allFrames[:,0:6]
         imgDesc = imgDesc2
     else:
-        headers = np.concatenate((headers, allFrames[:,0:6]),0)
         imgDesc = np.concatenate((imgDesc, imgDesc2),0)
-    if allFrames.shape[0] != MAX_NUMBER_OF_FRAMES_PER_BATCH:
-        break
 
 
 numberOfFrames = allFrames.shape[0]
@@ -165,7 +145,23 @@ if(SAVEHDF5):
     f = h5py.File(h5_filename, "w")
     for i in range(0,6):
         f['header_%d'%i] = headers[:,i]
-    f['adcData'] = imgDesc.astype('uint16')
+    if timingHeaders is not None:
+        f['pulseId']   = timingHeaders['pulseId']
+        f['timeStamp'] = timingHeaders['timeStamp']
+    if SPARSE_THRESHOLD is None:
+        f['adcData'] = imgDesc.astype('uint16')
+    else:
+        threshold = np.load(SPARSE_THRESHOLD) if isinstance(SPARSE_THRESHOLD, str) else SPARSE_THRESHOLD
+        sparseWriter = SparseWriter(f, imgDesc.shape[1:], threshold)
+        sparseWriter.append(imgDesc)
+        print("Sparse adcData, %d pixels above threshold in %d frames" % (sparseWriter.numPixels, sparseWriter.numFrames))
+    if (CALIB_DIR is not None) and (CALIB_FINGERPRINT is not None):
+        calibMaps = CalibStore(CALIB_DIR).load(CALIB_FINGERPRINT, CALIB_ASIC, when = os.path.getmtime(filename))
+        if calibMaps is None:
+            print("No calibration constants for", CALIB_FINGERPRINT)
+        else:
+            for name, calibMap in calibMaps.items():
+                f[name] = calibMap
     f.close()
 
     np.savetxt(os.path.splitext(filename)[0] + "_traces" + ".csv", imgDesc[0,:,:], fmt='%d', delimiter=',', newline='\n')